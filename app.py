@@ -1,7 +1,13 @@
-from flask import Flask, request, render_template, jsonify, send_file
+from flask import Flask, request, render_template, jsonify, send_file, send_from_directory, abort
 import sys,subprocess, openai, argparse, re, os, urllib.request, threading
 app= Flask(__name__)
 
+# `python app.py --hls` has the final video written as HLS: a playlist and
+# its segments in HLS_DIR, served by /video/<name>.
+HLS = "--hls" in sys.argv
+HLS_DIR = "hls"
+HLS_TYPES = {".m3u8": "application/vnd.apple.mpegurl", ".ts": "video/mp2t"}
+
 @app.route('/')
 def home():
     return render_template('index.html')
@@ -17,15 +23,22 @@ def text_gen():
 
 @app.route("/video_gen" , methods=['POST', 'GET'])
 def video_gen():
-    cmd2 = ['python', 'video_generator.py']
+    cmd2 = ['python', 'video_generator.py'] + (['--hls'] if HLS else [])
     process2 = subprocess.Popen(cmd2, stdout=subprocess.PIPE)
     output, error = process2.communicate()
-    return jsonify({'htmlresponse': render_template('videover.html')})
+    return jsonify({'htmlresponse': render_template('videover.html', hls=HLS)})
 
 @app.route('/video')
-def serve_video():
-    video_path = "final_video.mp4"
-    return send_file(video_path)
+@app.route('/video/<name>')
+def serve_video(name=None):
+    if name is None:
+        video_path = "final_video.mp4"
+        return send_file(video_path)
+    # The HLS playlist (final_video.m3u8) and its segments.
+    mimetype = HLS_TYPES.get(os.path.splitext(name)[1])
+    if mimetype is None:
+        abort(404)
+    return send_from_directory(HLS_DIR, name, mimetype=mimetype, max_age=0)
 
 if __name__=='__main__':
     app.run()
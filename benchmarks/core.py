@@ -0,0 +1,334 @@
+"""Benchmarks of the moviepy core, with results saved as JSON.
+
+    python benchmarks/core.py                          # runs everything
+    python benchmarks/core.py blit composite -o results.json
+    python benchmarks/core.py --save-baseline          # stores the baseline
+    python benchmarks/core.py --baseline benchmarks/baseline.json
+
+The test media are generated in a temporary directory with the ``lavfi``
+sources of ffmpeg, and the clips are built from ColorClip, ImageClip and
+TextClip, so no file has to be provided. Each benchmark is repeated and
+the best time is kept. With a baseline, the times are compared to it and
+the script exits with status 1 when one is slower than ``--tolerance``.
+"""
+
+import argparse, json, os, platform, shutil, subprocess, sys, tempfile, time
+from collections import OrderedDict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+from moviepy.config import get_setting
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(name):
+    """Registers a benchmark. The function takes the media directory and
+    returns a list of ``(case, run, units)``, where ``run()`` does the timed
+    work on ``units`` items (frames, samples...)."""
+
+    def register(f):
+        BENCHMARKS[name] = f
+        return f
+
+    return register
+
+
+def lavfi(directory, filename, video=None, audio=None, duration=10):
+    """Generates ``filename`` with ffmpeg's test sources, once."""
+    path = os.path.join(directory, filename)
+    if os.path.exists(path):
+        return path
+    cmd = [get_setting("FFMPEG_BINARY"), "-y", "-loglevel", "error"]
+    if video:
+        cmd += ["-f", "lavfi", "-i", video]
+    if audio:
+        cmd += ["-f", "lavfi", "-i", audio]
+    cmd += ["-t", "%d" % duration]
+    if video:
+        cmd += ["-pix_fmt", "yuv420p", "-g", "48"]
+    cmd += [path]
+    subprocess.run(cmd, check=True)
+    return path
+
+
+def test_video(directory):
+    return lavfi(
+        directory,
+        "testsrc.mp4",
+        video="testsrc=size=640x360:rate=24",
+        audio="sine=frequency=440:sample_rate=44100",
+    )
+
+
+def test_audio(directory):
+    return lavfi(directory, "sine.wav", audio="sine=frequency=440:sample_rate=44100", duration=30)
+
+
+def test_image(directory):
+    path = os.path.join(directory, "image.png")
+    if not os.path.exists(path):
+        from PIL import Image
+
+        y, x = np.mgrid[0:720, 0:1280]
+        img = np.dstack([x % 256, y % 256, (x + y) % 256]).astype("uint8")
+        Image.fromarray(img).save(path)
+    return path
+
+
+def text_clip(txt, fontsize=40):
+    from moviepy.video.VideoClip import ColorClip, TextClip
+
+    try:
+        return TextClip(txt, fontsize=fontsize, color="white")
+    except IOError:  # neither the font nor ImageMagick is available
+        return ColorClip((10 * len(txt), fontsize), (255, 255, 255))
+
+
+@benchmark("get_frame")
+def bench_get_frame(directory):
+    from moviepy.video.VideoClip import ColorClip, ImageClip, VideoClip
+
+    frame = np.zeros((360, 640, 3), dtype="uint8")
+    clips = [
+        ("VideoClip", VideoClip(lambda t: frame)),
+        ("ColorClip", ColorClip((640, 360), (0, 0, 255))),
+        ("ImageClip", ImageClip(test_image(directory))),
+    ]
+
+    def case(clip):
+        def run():
+            for i in range(1000):
+                clip.get_frame(i / 24.0)
+
+        return run
+
+    return [(name, case(clip), 1000) for name, clip in clips]
+
+
+@benchmark("blit")
+def bench_blit(directory):
+    from moviepy.video.tools.drawing import blit, mask_dtype
+
+    cases = []
+    for w, h in [(640, 360), (1920, 1080), (3840, 2160)]:
+        picture = np.zeros((h, w, 3), dtype="uint8")
+        img = np.full((h // 2, w // 2, 3), 200, dtype="uint8")
+        mask = np.full((h // 2, w // 2), 0.5 if mask_dtype() != np.uint8 else 128)
+        mask = mask.astype(mask_dtype())
+
+        def run(img=img, picture=picture, mask=mask, pos=(w // 4, h // 4)):
+            for _ in range(10):
+                blit(img, picture, pos, mask=mask)
+
+        def run_opaque(img=img, picture=picture, pos=(w // 4, h // 4)):
+            for _ in range(10):
+                blit(img, picture, pos)
+
+        cases.append(("%dx%d" % (w, h), run_opaque, 10))
+        cases.append(("%dx%d masked" % (w, h), run, 10))
+    return cases
+
+
+@benchmark("composite")
+def bench_composite(directory):
+    from moviepy.video.compositing.CompositeVideoClip import CompositeVideoClip
+    from moviepy.video.VideoClip import ImageClip
+
+    image = ImageClip(test_image(directory)).set_duration(10)
+    thumbnail = ImageClip(image.img[::2, ::2])
+    cases = []
+    for n in [1, 4, 16]:
+        layers = [image]
+        for i in range(n):
+            layer = text_clip("Layer %d" % i) if i % 2 else thumbnail
+            layers.append(layer.set_duration(10).set_position((40 * i, 30 * i)))
+        clip = CompositeVideoClip(layers, size=image.size)
+
+        def run(clip=clip):
+            for i in range(24):
+                clip.get_frame(i / 24.0)
+
+        cases.append(("%d layers" % n, run, 24))
+    return cases
+
+
+@benchmark("concatenate")
+def bench_concatenate(directory):
+    from moviepy.video.compositing.concatenate import concatenate_videoclips
+    from moviepy.video.VideoClip import ColorClip
+
+    cases = []
+    for n in [10, 100]:
+        segments = [
+            ColorClip((640, 360), (i % 256, 0, 0)).set_duration(0.5) for i in range(n)
+        ]
+        clip = concatenate_videoclips(segments)
+        times = np.linspace(0, clip.duration, 240, endpoint=False)
+
+        def run(clip=clip, times=times):
+            for t in times:
+                clip.get_frame(t)
+
+        cases.append(("%d segments" % n, run, len(times)))
+    return cases
+
+
+@benchmark("video_reader")
+def bench_video_reader(directory):
+    from moviepy.video.io.ffmpeg_reader import FFMPEG_VideoReader
+
+    filename = test_video(directory)
+
+    def sequential():
+        reader = FFMPEG_VideoReader(filename)
+        for i in range(240):
+            reader.get_frame(i / 24.0)
+        reader.close()
+
+    times = np.random.RandomState(0).uniform(0, 9.5, 30)
+
+    def random_access():
+        reader = FFMPEG_VideoReader(filename)
+        for t in times:
+            reader.get_frame(t)
+        reader.close()
+
+    return [("sequential", sequential, 240), ("random access", random_access, 30)]
+
+
+@benchmark("audio_reader")
+def bench_audio_reader(directory):
+    from moviepy.audio.io.readers import FFMPEG_AudioReader
+
+    filename = test_audio(directory)
+
+    def chunks():
+        reader = FFMPEG_AudioReader(filename, buffersize=200000, readahead=False)
+        while len(reader.read_chunk(44100)):
+            pass
+        reader.close_proc()
+
+    def get_frame():
+        reader = FFMPEG_AudioReader(filename, buffersize=200000)
+        for i in range(30):
+            reader.get_frame(np.arange(i * 44100, (i + 1) * 44100) / 44100.0)
+        reader.close_proc()
+
+    nframes = 30 * 44100
+    return [("read_chunk", chunks, nframes), ("get_frame", get_frame, nframes)]
+
+
+@benchmark("write_videofile")
+def bench_write_videofile(directory):
+    from moviepy.video.compositing.CompositeVideoClip import CompositeVideoClip
+    from moviepy.video.io.VideoFileClip import VideoFileClip
+
+    source = VideoFileClip(test_video(directory)).set_duration(4)
+    title = text_clip("Title").set_duration(4).set_position("center")
+    composite = CompositeVideoClip([source, title])
+    output = os.path.join(directory, "output.mp4")
+
+    def case(clip, **kwargs):
+        def run():
+            clip.write_videofile(output, fps=24, logger=None, preset="ultrafast", **kwargs)
+
+        return run
+
+    return [
+        ("file", case(source), 96),
+        ("composite", case(composite), 96),
+        ("composite without audio", case(composite, audio=False), 96),
+    ]
+
+
+def run_benchmarks(names, repeat, directory):
+    results = OrderedDict()
+    for name in names:
+        for case, run, units in BENCHMARKS[name](directory):
+            run()  # warm-up
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                run()
+                times.append(time.perf_counter() - start)
+            best = min(times)
+            key = "%s: %s" % (name, case)
+            results[key] = {
+                "best": best,
+                "median": float(np.median(times)),
+                "units": units,
+                "per_unit": best / units,
+                "units_per_second": units / best,
+            }
+            print("%-45s %10.2f ms %12.1f /s" % (key, 1000 * best, units / best))
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Prints the ratios to the baseline, returns the keys over tolerance."""
+    slower = []
+    print("\n%-45s %10s %10s %8s" % ("benchmark", "baseline", "now", "ratio"))
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        ratio = result["best"] / baseline[key]["best"]
+        flag = ""
+        if ratio > 1 + tolerance:
+            slower.append(key)
+            flag = "  SLOWER"
+        print(
+            "%-45s %8.2fms %8.2fms %8.2f%s"
+            % (key, 1000 * baseline[key]["best"], 1000 * result["best"], ratio, flag)
+        )
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("benchmarks", nargs="*", help="among: " + ", ".join(BENCHMARKS))
+    parser.add_argument("-o", "--output", help="JSON file for the results")
+    parser.add_argument("--baseline", help="JSON results to compare with")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--media", help="directory for the generated media")
+    args = parser.parse_args()
+
+    names = args.benchmarks or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            parser.error("unknown benchmark %s" % name)
+
+    directory = args.media or tempfile.mkdtemp(prefix="moviepy_bench_")
+    os.makedirs(directory, exist_ok=True)
+    try:
+        results = run_benchmarks(names, args.repeat, directory)
+    finally:
+        if not args.media:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    report = {
+        "machine": platform.platform(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "results": results,
+    }
+    for path in [args.output, DEFAULT_BASELINE if args.save_baseline else None]:
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Measures the import time of moviepy, with ``python -X importtime``.
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py "from moviepy.editor import *" --budget 150
+
+Each run executes the import statement in a fresh interpreter. The time of
+a run is the cumulative time of the modules it imported (the ones imported
+by the interpreter startup are left out). The report lists the slowest
+modules of the fastest run, and the script exits with status 1 when that
+run is over ``--budget`` milliseconds, so it can be used as a gate.
+"""
+
+import argparse, os, subprocess, sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_STATEMENT = "from moviepy.editor import VideoFileClip"
+DEFAULT_BUDGET_MS = 100
+
+
+def import_times(statement):
+    """Runs ``statement`` in a new interpreter and returns the list of
+    ``(name, self_us, cumulative_us, level)`` reported by ``-X importtime``."""
+    env = dict(os.environ, PYTHONPATH=ROOT, PYTHONDONTWRITEBYTECODE="")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        stderr=subprocess.PIPE,
+        stdout=subprocess.DEVNULL,
+        env=env,
+        check=True,
+    )
+    times = []
+    for line in proc.stderr.decode("utf8").splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        times.append((name.strip(), int(self_us), int(cumulative_us), level))
+    return times
+
+
+def statement_times(statement, startup):
+    """Returns the times of the modules imported by ``statement`` but not by
+    the interpreter startup, and their total in microseconds."""
+    times = [t for t in import_times(statement) if t[0] not in startup]
+    return times, sum(t[2] for t in times if t[3] == 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("statement", nargs="?", default=DEFAULT_STATEMENT)
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    startup = set(t[0] for t in import_times("pass"))
+    import_times(args.statement)  # warms the bytecode and file system caches
+    runs = [statement_times(args.statement, startup) for _ in range(args.runs)]
+    best, total_us = min(runs, key=lambda run: run[1])
+    total_ms = total_us / 1000.0
+
+    print("%-50s %10s %10s" % ("module", "self [ms]", "total [ms]"))
+    for name, self_us, cumulative_us, _ in sorted(best, key=lambda t: -t[2])[: args.top]:
+        print("%-50s %10.1f %10.1f" % (name, self_us / 1000.0, cumulative_us / 1000.0))
+    print("\n%s: %.1f ms (budget %.1f ms)" % (args.statement, total_ms, args.budget))
+
+    if total_ms > args.budget:
+        print("Over budget.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
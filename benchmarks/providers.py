@@ -0,0 +1,195 @@
+"""Exercises the provider client (``providers.py``) against a local mock of
+the OpenAI API and of the image host.
+
+    python benchmarks/providers.py
+    python benchmarks/providers.py --images 60 --rate 20 --burst 5 --fail-every 4
+
+The mock answers ``completions`` and ``images/generations`` and serves the
+generated images, with a 429 or 503 (alternately) every ``--fail-every``
+requests and ``--latency`` seconds per request. A burst of image requests
+(generation and download, from ``--threads`` threads) is sent first with
+fresh connections per request, as ``urllib.request.urlretrieve`` does,
+without retries, then through the providers. The report gives the time,
+the connections opened, the failed requests, and the highest request rate
+seen by the mock over one second. The script exits with status 1 when the
+providers lose a request or exceed their rate limit.
+"""
+
+import argparse, json, os, shutil, sys, tempfile, threading, time, urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import providers
+
+IMAGE = os.urandom(200000)
+
+
+class MockProvider(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, fail_every, latency):
+        ThreadingHTTPServer.__init__(self, ("127.0.0.1", 0), MockHandler)
+        self.fail_every = fail_every
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.connections = 0
+        self.requests = 0
+        self.times = []
+
+    @property
+    def base_url(self):
+        return "http://127.0.0.1:%d" % self.server_address[1]
+
+    def max_rate(self, window=1.0):
+        times = sorted(t for t, path in self.times if path.startswith("/v1/"))
+        return max([sum(1 for u in times[i:] if u - t < window) for i, t in enumerate(times)] or [0])
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, body, content_type="application/json", headers=()):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for header in headers:
+            self.send_header(*header)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_request(self, method):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        with self.server.lock:
+            self.server.requests += 1
+            n = self.server.requests
+            self.server.times.append((time.monotonic(), self.path))
+        time.sleep(self.server.latency)
+        if self.server.fail_every and n % self.server.fail_every == 0:
+            if (n // self.server.fail_every) % 2:
+                return self.reply(429, b'{"error": "rate limited"}', headers=[("Retry-After", "0.2")])
+            return self.reply(503, b'{"error": "overloaded"}')
+        if method == "POST" and self.path == "/v1/completions":
+            data = {"choices": [{"text": "Echo: %s" % body["prompt"]}]}
+        elif method == "POST" and self.path == "/v1/images/generations":
+            data = {"data": [{"url": "%s/files/%d.jpg" % (self.server.base_url, n)}]}
+        elif method == "GET" and self.path.startswith("/files/"):
+            return self.reply(200, IMAGE, "image/jpeg")
+        else:
+            return self.reply(404, b'{"error": "not found"}')
+        self.reply(200, json.dumps(data).encode())
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_POST(self):
+        self.handle_request("POST")
+
+
+def fetch_urllib(server, directory, i):
+    request = urllib.request.Request(
+        server.base_url + "/v1/images/generations",
+        data=json.dumps({"prompt": "image %d" % i, "n": 1, "size": "1024x1024"}).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request) as response:
+        url = json.load(response)["data"][0]["url"]
+    urllib.request.urlretrieve(url, os.path.join(directory, "urllib%d.jpg" % i))
+
+
+def fetch_providers(server, directory, i):
+    url = providers.generate_image("image %d" % i)
+    providers.download(url, os.path.join(directory, "image%d.jpg" % i))
+
+
+def run(server, fetch, directory, images, threads):
+    server.reset()
+    errors = []
+
+    def task(i):
+        try:
+            fetch(server, directory, i)
+        except Exception as e:
+            errors.append(e)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(task, range(images)))
+    return time.perf_counter() - start, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--images", type=int, default=40)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--rate", type=float, default=20)
+    parser.add_argument("--burst", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--fail-every", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    server = MockProvider(args.fail_every, args.latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    providers.PROVIDERS["openai"].update(
+        base_url=server.base_url + "/v1",
+        headers={"Authorization": "Bearer test"},
+        rate=args.rate,
+        burst=args.burst,
+        max_concurrency=args.concurrency,
+    )
+    providers.PROVIDERS["downloads"].update(max_concurrency=args.concurrency)
+    for provider in providers.PROVIDERS.values():
+        provider.update(backoff=0.05)
+
+    directory = tempfile.mkdtemp(prefix="providers_bench_")
+    ok = True
+    try:
+        text = providers.complete("hello")
+        if text != "Echo: hello":
+            print("unexpected completion %r" % text)
+            ok = False
+
+        print("%-10s %8s %12s %8s %16s" % ("client", "time s", "connections", "failed", "max req/s (api)"))
+        for name, fetch in [("urllib", fetch_urllib), ("providers", fetch_providers)]:
+            duration, errors = run(server, fetch, directory, args.images, args.threads)
+            max_rate = server.max_rate()
+            print(
+                "%-10s %8.2f %12d %8d %16d"
+                % (name, duration, server.connections, len(errors), max_rate)
+            )
+            if name == "providers":
+                if errors:
+                    print("providers lost %d requests: %s" % (len(errors), errors[0]))
+                    ok = False
+                if max_rate > args.rate + args.burst:
+                    print("providers exceeded the rate limit")
+                    ok = False
+                files = [f for f in os.listdir(directory) if f.startswith("image")]
+                if len(files) != args.images:
+                    print("%d images downloaded out of %d" % (len(files), args.images))
+                    ok = False
+        print()
+        print(providers.metrics_report())
+    finally:
+        server.shutdown()
+        shutil.rmtree(directory, ignore_errors=True)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
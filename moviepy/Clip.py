@@ -1,7 +1,7 @@
 from copy import copy
 import numpy as np
-import proglog
 from moviepy.decorators import *
+from moviepy.tools import default_bar_logger, exact_rate, frame_count
 
 
 class Clip:
@@ -14,10 +14,10 @@ class Clip:
 
         self.memoize = False
         self.memoized_t = None
-        self.memoize_frame = None
+        self.memoized_frame = None
 
     def copy(self):
-        newclip = copy(self)
+        newclip = self._view()
         if hasattr(self, "audio"):
             newclip.audio = copy(self.audio)
         if hasattr(self, "mask"):
@@ -25,6 +25,15 @@ class Clip:
 
         return newclip
 
+    def _view(self):
+        """Returns a shallow copy of the clip, sharing its frames, readers,
+        mask and audio. The ``set_*`` methods return such views, with their
+        own timing and placement: a mask or audio which changes is replaced
+        by a view of its own (see ``apply_to_mask``), never modified."""
+        newclip = object.__new__(type(self))
+        newclip.__dict__.update(self.__dict__)
+        return newclip
+
     @convert_to_seconds(["t"])
     def get_frame(self, t):
         if self.memoize:
@@ -38,6 +47,36 @@ class Clip:
         else:
             return self.make_frame(t)
 
+    def get_frame_at_index(self, n, fps=None):
+        """Returns the frame ``n`` of the clip played at ``fps`` frames per
+        second (by default the clip's), the frame at ``t = n / fps``.
+
+        ``fps`` is taken exactly (see ``tools.exact_rate``) and ``n / fps``
+        is never rounded on the way down to the file readers, which find
+        their own frame index from it. ``n`` is a Fraction for a clip which
+        starts between two frames of a composite.
+        """
+        fps = exact_rate(fps or self.fps)
+        if self.memoize:
+            key = (n, fps)
+            if key != self.memoized_t:
+                self.memoized_frame = self.make_frame_at_index(n, fps)
+                self.memoized_t = key
+            return self.memoized_frame
+        return self.make_frame_at_index(n, fps)
+
+    def frame_key(self, n, fps):
+        """Returns a value identifying the frame ``get_frame_at_index(n,
+        fps)`` without computing it, or None if unknown: two frames of the
+        clip with equal keys are identical. Writers use it to hold frames
+        instead of rendering them again."""
+        return None
+
+    def make_frame_at_index(self, n, fps):
+        """Computes the frame of ``get_frame_at_index``. The clips which can
+        find it without a float time (files, composites) override this."""
+        return self.make_frame(float(n / fps))
+
     @apply_to_mask
     @apply_to_audio
     @convert_to_seconds(["t"])
@@ -101,12 +140,24 @@ class Clip:
     @requires_duration
     @use_clip_fps_by_default
     def iter_frames(self, fps=None, with_times=False, logger=None, dtype=None):
-        logger = proglog.default_bar_logger(logger)
-        for t in logger.iter_bar(t=np.arange(0, self.duration, 1.0 / fps)):
-            frame = self.get_frame(t)
+        logger = default_bar_logger(logger)
+        fps = exact_rate(fps)
+        for n in logger.iter_bar(t=range(frame_count(self.duration, fps))):
+            frame = self.get_frame_at_index(n, fps)
             if (dtype is not None) and (frame.dtype != dtype):
                 frame = frame.astype(dtype)
             if with_times:
-                yield t, frame
+                yield float(n / fps), frame
             else:
                 yield frame
+
+    def close(self):
+        """Releases the resources held by the clip, such as ffmpeg
+        processes. Subclasses which own readers override this."""
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
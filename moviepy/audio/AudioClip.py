@@ -1,6 +1,5 @@
-import os, proglog
+import os
 import numpy as np
-from tqdm import tqdm
 from moviepy.audio.io.ffmpeg_audiowriter import ffmpeg_audiowrite
 from moviepy.Clip import Clip
 from moviepy.decorators import requires_duration
@@ -40,6 +39,12 @@ class AudioClip(Clip):
 
 
 class CompositeAudioClip(AudioClip):
+    """Mixes audio clips, each playing from its own ``start``.
+
+    The clips are indexed by start time so that each chunk only touches the
+    clips overlapping it. Those are asked for the overlapping samples only,
+    which are accumulated into a single float32 block.
+    """
 
     def __init__(self, clips):
         Clip.__init__(self)
@@ -51,19 +56,52 @@ class CompositeAudioClip(AudioClip):
             self.duration = max(ends)
             self.end = max(ends)
 
-        def make_frame(t):
-            played_parts = [c.is_playing(t) for c in self.clips]
+        starts = np.array([c.start for c in clips], dtype=float)
+        ends = np.array([np.inf if e is None else e for e in ends], dtype=float)
+        self._order = np.argsort(starts, kind="stable")
+        self._starts = starts[self._order]
+        self._ends = ends[self._order]
+        # Any clip before position i in start order ends by _max_ends[i].
+        self._max_ends = np.maximum.accumulate(self._ends)
 
-            sounds = [
-                c.get_frame(t - c.start) * np.array([part]).T
-                for c, part in zip(self.clips, played_parts)
-                if (part is not False)
-            ]
+        self.make_frame = self._mix
 
-            if isinstance(t, np.ndarray):
-                zero = np.zeros((len(t), self.nchannels))
-            else:
-                zero = np.zeros(self.nchannels)
-            return zero + sum(sounds)
+    def overlapping_clips(self, tmin, tmax):
+        """Returns the clips playing at some point between tmin and tmax."""
+        first = np.searchsorted(self._max_ends, tmin, side="right")
+        last = np.searchsorted(self._starts, tmax, side="right")
+        if first >= last:
+            return []
+        playing = self._ends[first:last] > tmin
+        return [self.clips[i] for i in self._order[first:last][playing]]
 
-        self.make_frame = make_frame
+    def _mix(self, t):
+        if not isinstance(t, np.ndarray):
+            result = np.zeros(self.nchannels, dtype="float32")
+            for c in self.overlapping_clips(t, t):
+                if c.is_playing(t):
+                    result += c.get_frame(t - c.start)
+            return result
+
+        result = np.zeros((len(t), self.nchannels), dtype="float32")
+        if not len(t):
+            return result
+        tmin, tmax = t.min(), t.max()
+        ordered = bool(np.all(t[1:] >= t[:-1]))
+        for c in self.overlapping_clips(tmin, tmax):
+            if ordered:
+                # Chunks are sorted times: the clip covers one index range.
+                i0 = np.searchsorted(t, c.start, side="left")
+                i1 = len(t) if c.end is None else np.searchsorted(t, c.end, "right")
+                if i0 >= i1:
+                    continue
+                index = slice(i0, i1)
+            else:
+                index = np.flatnonzero(c.is_playing(t))
+                if not len(index):
+                    continue
+            sound = c.get_frame(t[index] - c.start)
+            if sound.ndim == 1:
+                sound = sound[:, np.newaxis]
+            result[index] += sound
+        return result
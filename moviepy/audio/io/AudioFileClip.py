@@ -1,14 +1,37 @@
 from moviepy.audio.AudioClip import AudioClip
-from moviepy.audio.io.readers import FFMPEG_AudioReader
+from moviepy.audio.io.readers import FFMPEG_AudioReader, FFMPEG_CachedAudioReader
+from moviepy.config import get_setting
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
 
 class AudioFileClip(AudioClip):
-    def __init__(self, filename, buffersize=200000, nbytes=2, fps=44100):
+    """An audio clip read from a file.
+
+    With ``pcm_cache=True`` the file is decoded once into a memory-mapped
+    cache (see FFMPEG_CachedAudioReader) instead of being streamed by an
+    ffmpeg process. By default this is done for files not longer than the
+    PCM_CACHE_MAX_DURATION setting.
+    """
+
+    def __init__(self, filename, buffersize=200000, nbytes=2, fps=44100, pcm_cache=None):
         AudioClip.__init__(self)
         self.filename = filename
-        self.reader = FFMPEG_AudioReader(filename, fps=fps, nbytes=nbytes, buffersize=buffersize)
+        if pcm_cache is None:
+            infos = ffmpeg_parse_infos(filename)
+            duration = infos.get("video_duration") or infos["duration"]
+            pcm_cache = duration <= get_setting("PCM_CACHE_MAX_DURATION")
+        if pcm_cache:
+            self.reader = FFMPEG_CachedAudioReader(filename, fps=fps)
+        else:
+            self.reader = FFMPEG_AudioReader(filename, fps=fps, nbytes=nbytes, buffersize=buffersize)
         self.fps = fps
         self.duration = self.reader.duration
         self.end = self.reader.duration
         self.buffersize = self.reader.buffersize
         self.make_frame = lambda t: self.reader.get_frame(t)
+        # Lets the writer check that the clip still plays the file as is.
+        self._reader_make_frame = self.make_frame
         self.nchannels = self.reader.nchannels
+
+    def close(self):
+        """Terminates the ffmpeg process of the clip, if any."""
+        self.reader.close_proc()
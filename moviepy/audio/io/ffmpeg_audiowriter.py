@@ -1,8 +1,9 @@
-import os,proglog
+import os
 import subprocess as sp
 from moviepy.compat import DEVNULL
 from moviepy.config import get_setting
 from moviepy.decorators import requires_duration
+from moviepy.tools import default_bar_logger
 
 class FFMPEG_AudioWriter:
     def __init__(
@@ -155,7 +156,7 @@ def ffmpeg_audiowrite(
         logfile = open(filename + ".log", "w+")
     else:
         logfile = None
-    logger = proglog.default_bar_logger(logger)
+    logger = default_bar_logger(logger)
     logger(message="MoviePy - Writing audio in %s" % filename)
     writer = FFMPEG_AudioWriter(
         filename,
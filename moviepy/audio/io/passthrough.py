@@ -0,0 +1,183 @@
+"""Builds soundtracks made only of audio files directly with ffmpeg.
+
+A soundtrack qualifies when it is an AudioFileClip, or a (possibly nested)
+CompositeAudioClip of AudioFileClips, which play their files unmodified.
+Such a soundtrack is assembled by a single ffmpeg command (silences and
+files joined with the ``concat`` filter, or delayed with ``adelay`` and
+summed with ``amix`` when they overlap), or used as is when it is a single
+file which already has the requested codec, instead of decoding, mixing
+and re-encoding every sample through Python.
+"""
+
+import os
+import subprocess as sp
+from moviepy.audio.AudioClip import CompositeAudioClip
+from moviepy.audio.io.AudioFileClip import AudioFileClip
+from moviepy.compat import DEVNULL
+from moviepy.config import get_setting
+from moviepy.video.io.ffmpeg_probe import probe
+
+# Names of the encoders used by write_videofile, as reported by ffprobe.
+CODEC_NAMES = {
+    "libmp3lame": "mp3",
+    "libvorbis": "vorbis",
+    "libopus": "opus",
+    "aac": "aac",
+    "libfdk_aac": "aac",
+    "pcm_s16le": "pcm_s16le",
+    "pcm_s32le": "pcm_s32le",
+}
+
+CHANNEL_LAYOUTS = {1: "mono", 2: "stereo"}
+
+
+def file_audio_segments(clip, offset=0, end=None):
+    """Returns the ``(filename, start, duration)`` of the files played by
+    ``clip``, sorted by start, or None if the clip is not just unmodified
+    audio files."""
+    start = offset + clip.start
+    if clip.end is not None:
+        end = start + clip.duration if end is None else min(end, start + clip.duration)
+
+    if isinstance(clip, AudioFileClip):
+        if clip.make_frame is not getattr(clip, "_reader_make_frame", None):
+            return None
+        duration = clip.duration if end is None else end - start
+        if duration <= 0:
+            return []
+        # The segment lasts as long as the clip plays, padded with silence
+        # past the decoded samples as the reader does.
+        return [(clip.filename, start, duration)]
+
+    if isinstance(clip, CompositeAudioClip):
+        if getattr(clip.make_frame, "__func__", None) is not CompositeAudioClip._mix:
+            return None
+        segments = []
+        for child in clip.clips:
+            child_segments = file_audio_segments(child, start, end)
+            if child_segments is None:
+                return None
+            segments += child_segments
+        segments.sort(key=lambda s: s[1])
+        return segments
+
+    return None
+
+
+def ffmpeg_audio_passthrough(
+    clip, filename, fps, codec, bitrate=None, logfile=None, logger=None
+):
+    """Writes the soundtrack ``clip`` to ``filename`` without going through
+    Python. Returns False (and writes nothing) if the clip does not qualify.
+    """
+    if clip.duration is None or clip.start < 0:
+        return False
+    segments = file_audio_segments(clip)
+    if not segments:
+        return False
+    if any(start < 0 for (_, start, _) in segments):
+        return False
+    layout = CHANNEL_LAYOUTS.get(clip.nchannels)
+    if layout is None:
+        return False
+
+    audio_format = "aformat=sample_fmts=fltp:sample_rates=%d:channel_layouts=%s" % (
+        fps,
+        layout,
+    )
+    inputs, graph, labels = [], [], []
+    overlap = any(
+        start2 < start1 + duration1 - 1e-6
+        for (_, start1, duration1), (_, start2, _) in zip(segments, segments[1:])
+    )
+
+    def samples(t):
+        return int(round(t * fps))
+
+    def file_input(i, source, start, duration):
+        # The file cut and padded to exactly the samples it plays: decoded
+        # files are often shorter than their reported duration, which would
+        # shift all the following segments.
+        inputs.extend(["-i", source])
+        length = samples(start + duration) - samples(start)
+        return (
+            "[%d:a]asetpts=PTS-STARTPTS,aresample=%d,%s,atrim=end_sample=%d,"
+            "apad=whole_len=%d" % (i, fps, audio_format, length, length)
+        )
+
+    if overlap:
+        # Each file is delayed to its start (in samples) and the inputs are
+        # summed, without amix's default normalization, as CompositeAudioClip.
+        for i, (source, start, duration) in enumerate(segments):
+            graph.append(
+                "%s,adelay=delays=%dS:all=1[a%d]"
+                % (file_input(i, source, start, duration), samples(start), i)
+            )
+            labels.append("[a%d]" % i)
+        graph.append(
+            "%samix=inputs=%d:duration=longest:normalize=0,apad,atrim=0:%.06f[out]"
+            % ("".join(labels), len(labels), clip.duration)
+        )
+    position = 0
+    for i, (source, start, duration) in enumerate([] if overlap else segments):
+        if samples(start) > samples(position):
+            graph.append(
+                "anullsrc=r=%d:cl=%s,atrim=end_sample=%d,%s[s%d]"
+                % (fps, layout, samples(start) - samples(position), audio_format, i)
+            )
+            labels.append("[s%d]" % i)
+        graph.append("%s[a%d]" % (file_input(i, source, start, duration), i))
+        labels.append("[a%d]" % i)
+        position = start + duration
+    if not overlap:
+        graph.append(
+            "%sconcat=n=%d:v=0:a=1,apad,atrim=0:%.06f[out]"
+            % ("".join(labels), len(labels), clip.duration)
+        )
+
+    cmd = (
+        [get_setting("FFMPEG_BINARY"), "-y", "-loglevel", "error"]
+        + inputs
+        + ["-filter_complex", ";".join(graph), "-map", "[out]"]
+        + ["-acodec", codec, "-ar", "%d" % fps, "-strict", "-2"]
+        + (["-ab", bitrate] if (bitrate is not None) else [])
+        + [filename]
+    )
+    if logger is not None:
+        logger(message="MoviePy - Writing audio in %s (ffmpeg passthrough)" % filename)
+
+    popen_params = {"stdout": DEVNULL, "stderr": logfile or sp.PIPE, "stdin": DEVNULL}
+
+    if os.name == "nt":
+        popen_params["creationflags"] = 0x08000000
+
+    proc = sp.Popen(cmd, **popen_params)
+    _, error = proc.communicate()
+    if proc.returncode:
+        raise IOError(
+            "MoviePy error: FFMPEG encountered the following error while "
+            "writing file %s:\n\n%s" % (filename, error and error.decode("utf8"))
+        )
+    return True
+
+
+def copyable_audio_file(clip, codec, bitrate=None):
+    """Returns the file a soundtrack can be stream-copied from, or None.
+
+    That is the case when the soundtrack is exactly one whole file starting
+    at 0 whose audio is already encoded with ``codec``.
+    """
+    if bitrate is not None or clip.duration is None:
+        return None
+    segments = file_audio_segments(clip)
+    if not segments or len(segments) != 1 or clip.start != 0:
+        return None
+    source, start, duration = segments[0]
+    info = probe(source)
+    if start != 0 or info.duration is None or abs(duration - info.duration) > 1e-3:
+        return None
+    if abs(clip.duration - duration) > 1e-3 or info.video_found:
+        return None
+    if info.audio_codec != CODEC_NAMES.get(codec, codec):
+        return None
+    return source
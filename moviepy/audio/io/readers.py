@@ -1,16 +1,37 @@
-import os, warnings
+import hashlib, os, threading, weakref
 import subprocess as sp
 import numpy as np
 from moviepy.compat import DEVNULL, PY3
 from moviepy.config import get_setting
+from moviepy.video.io.ffmpeg_probe import media_cache_key
 from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+from moviepy.video.io.reader_pool import default_pool
 
 class FFMPEG_AudioReader:
+    """Reads the audio of a file through an ffmpeg pipe.
+
+    The decoded samples are stored as float32 in a circular buffer of
+    ``buffersize`` frames: frame ``f`` lives in row ``f % buffersize``, and
+    the frames from ``buffer_startframe`` (included) to ``buffer_endframe``
+    (excluded) are valid. The buffer is filled in place with ``readinto``.
+    Once the file is read sequentially, a background thread (``readahead``)
+    keeps the buffer filled ahead of the last requested frame.
+    """
 
     def __init__(
-        self, filename, buffersize, print_infos=False, fps=44100, nbytes=2, nchannels=2
+        self,
+        filename,
+        buffersize,
+        print_infos=False,
+        fps=44100,
+        nbytes=2,
+        nchannels=2,
+        pool=default_pool,
+        readahead=True,
+        chunksize=8192,
     ):
         self.filename = filename
+        self.pool = pool
         self.nbytes = nbytes
         self.fps = fps
         self.f = "s%dle" % (8 * nbytes)
@@ -27,10 +48,24 @@ class FFMPEG_AudioReader:
 
         self.nframes = int(self.fps * self.duration)
         self.buffersize = min(self.nframes + 1, buffersize)
-        self.buffer = None
-        self.buffer_startframe = 1
-        self.initialize()
-        self.buffer_around(1)
+        self.buffer = np.zeros((self.buffersize, nchannels), dtype="float32")
+        self.buffer_startframe = 0
+        self.buffer_endframe = 0
+        self.eof = False
+
+        self.chunksize = min(chunksize, self.buffersize)
+        dt = {1: "int8", 2: "int16", 4: "int32"}[self.nbytes]
+        self._raw = np.empty((self.chunksize, nchannels), dtype=dt)
+        self._raw_view = memoryview(self._raw).cast("B")
+        self._scale = np.float32(1.0 / 2 ** (8 * self.nbytes - 1))
+
+        self.readahead = readahead
+        self._thread = None
+        self._stop = False
+        self._keep_from = 0
+        self._cond = threading.Condition()
+        # The ffmpeg process is only started when the buffer is first filled.
+        self.pos = 0
 
     def initialize(self, starttime=0):
         """Opens the file, creates the pipe."""
@@ -70,7 +105,7 @@ class FFMPEG_AudioReader:
         )
 
         popen_params = {
-            "bufsize": self.buffersize,
+            "bufsize": self.chunksize * self.nchannels * self.nbytes,
             "stdout": sp.PIPE,
             "stderr": sp.PIPE,
             "stdin": DEVNULL,
@@ -80,47 +115,177 @@ class FFMPEG_AudioReader:
             popen_params["creationflags"] = 0x08000000
 
         self.proc = sp.Popen(cmd, **popen_params)
+        self.pool.touch(self)
+
+        self.pos = int(np.round(self.fps * starttime))
+        with self._cond:
+            self.buffer_startframe = self.buffer_endframe = self.pos
+            self.eof = False
 
-        self.pos = np.round(self.fps * starttime)
+    def _read_raw(self, nframes):
+        """Reads up to ``nframes`` frames into the scratch array, returns the
+        number of frames read (less than asked at the end of the file)."""
+        framesize = self.nchannels * self.nbytes
+        view = self._raw_view[: nframes * framesize]
+        nread = 0
+        while nread < len(view):
+            n = self.proc.stdout.readinto(view[nread:] if nread else view)
+            if not n:
+                break
+            nread += n
+        return nread // framesize
 
     def skip_chunk(self, chunksize):
-        s = self.proc.stdout.read(self.nchannels * chunksize * self.nbytes)
-        self.proc.stdout.flush()
-        self.pos = self.pos + chunksize
+        """Reads and throws away ``chunksize`` frames."""
+        self._stop_readahead()
+        if self.proc is None:
+            self.initialize(1.0 * self.pos / self.fps)
+        while chunksize > 0 and not self.eof:
+            n = min(chunksize, self.chunksize)
+            got = self._read_raw(n)
+            self.pos += got
+            chunksize -= n
+            if got < n:
+                self.eof = True
+        with self._cond:
+            self.buffer_startframe = self.buffer_endframe = self.pos
 
-    def read_chunk(self, chunksize):
-        chunksize = int(round(chunksize))
-        L = self.nchannels * chunksize * self.nbytes
-        s = self.proc.stdout.read(L)
-        dt = {1: "int8", 2: "int16", 4: "int32"}[self.nbytes]
-        if hasattr(np, "frombuffer"):
-            result = np.frombuffer(s, dtype=dt)
-        else:
-            result = np.fromstring(s, dtype=dt)
-        result = (1.0 * result / 2 ** (8 * self.nbytes - 1)).reshape(
-            (int(len(result) / self.nchannels), self.nchannels)
+    def _read_forward(self, endframe):
+        """Reads the next chunk from the pipe into the buffer, without going
+        past ``endframe``. Returns False if there was nothing to read."""
+        with self._cond:
+            start = self.buffer_endframe
+            n = min(self.chunksize, endframe - start)
+            if n <= 0 or self.eof:
+                return False
+            # Invalidate the rows about to be overwritten before writing.
+            self.buffer_startframe = max(
+                self.buffer_startframe, start + n - self.buffersize
+            )
+
+        got = self._read_raw(n)
+        i = start % self.buffersize
+        first = min(got, self.buffersize - i)
+        np.multiply(
+            self._raw[:first], self._scale, out=self.buffer[i : i + first]
         )
-        self.pos = self.pos + chunksize
-        return result
+        if got > first:
+            np.multiply(
+                self._raw[first:got], self._scale, out=self.buffer[: got - first]
+            )
+
+        with self._cond:
+            self.buffer_endframe = start + got
+            self.pos = self.buffer_endframe
+            if got < n:
+                self.eof = True
+            self._cond.notify_all()
+        return True
+
+    def read_chunk(self, chunksize):
+        """Reads the next ``chunksize`` frames, returned as a new array."""
+        self._stop_readahead()
+        if self.proc is None:
+            self.initialize(1.0 * self.pos / self.fps)
+        result = np.zeros((int(round(chunksize)), self.nchannels), dtype="float32")
+        start = end = self.buffer_endframe
+        while end < start + len(result) and self._read_forward(start + len(result)):
+            rows = np.arange(end, self.buffer_endframe)
+            result[rows - start] = self.buffer[rows % self.buffersize]
+            end = self.buffer_endframe
+        return result[: end - start]
 
     def seek(self, pos):
-        if (pos < self.pos) or (pos > (self.pos + 1000000)):
-            t = 1.0 * pos / self.fps
-            self.initialize(t)
-        elif pos > self.pos:
-            self.skip_chunk(pos - self.pos)
-        self.pos = pos
+        """Restarts the process so that the next frame read is ``pos``."""
+        self._stop_readahead()
+        self.initialize(1.0 * pos / self.fps)
+
+    def _start_readahead(self):
+        if self._thread is None and self.readahead:
+            self._stop = False
+            self._thread = threading.Thread(
+                target=_readahead_loop, args=(weakref.ref(self),), daemon=True
+            )
+            self._thread.start()
+
+    def _stop_readahead(self):
+        if self._thread is not None:
+            with self._cond:
+                self._stop = True
+                self._cond.notify_all()
+            if self._thread is not threading.current_thread():
+                self._thread.join()
+            self._thread = None
+
+    def _readahead_step(self):
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._stop
+                or not (
+                    self.eof
+                    or self.buffer_endframe >= self._keep_from + self.buffersize
+                ),
+                timeout=0.1,
+            )
+            if self._stop:
+                return False
+            endframe = self._keep_from + self.buffersize
+        self._read_forward(endframe)
+        return True
 
     def close_proc(self):
+        self._stop_readahead()
         if hasattr(self, "proc") and self.proc is not None:
             self.proc.terminate()
             for std in [self.proc.stdout, self.proc.stderr]:
                 std.close()
             self.proc.wait()
             self.proc = None
+        if getattr(self, "pool", None) is not None:
+            self.pool.forget(self)
+
+    def buffer_around(self, fr_min, fr_max=None):
+        """Makes sure that frames ``fr_min`` to ``fr_max`` are in the buffer."""
+        fr_max = fr_min if fr_max is None else fr_max
+        with self._cond:
+            self._keep_from = fr_min
+            self._cond.notify_all()
+            if self.buffer_startframe <= fr_min and fr_max < self.buffer_endframe:
+                return
+
+        forward = self.buffer_endframe <= fr_max
+        if (
+            self.proc is None
+            or fr_min < self.buffer_startframe
+            or fr_min > self.buffer_endframe + 1000000
+        ):
+            self.seek(max(0, fr_min - self.buffersize // 2))
+            forward = False
+        elif fr_min > self.buffer_endframe + self.buffersize:
+            self.skip_chunk(fr_min - self.buffersize // 2 - self.buffer_endframe)
+            forward = False
+        else:
+            self.pool.touch(self)
+
+        if forward and self.readahead:
+            # Sequential reading: let the thread fill the buffer.
+            self._start_readahead()
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self.buffer_endframe > fr_max
+                    or self.eof
+                    or self._thread is None
+                )
+            if self.buffer_endframe > fr_max or self.eof:
+                return
+            if self.proc is None:  # suspended by the reader pool meanwhile
+                return self.buffer_around(fr_min, fr_max)
+
+        while self.buffer_endframe <= fr_max:
+            if not self._read_forward(fr_min + self.buffersize):
+                break
 
     def get_frame(self, tt):
-        buffersize = self.buffersize
         if isinstance(tt, np.ndarray):
             in_time = (tt >= 0) & (tt < self.duration)
 
@@ -134,61 +299,175 @@ class FFMPEG_AudioReader:
             frames = np.round((self.fps * tt)).astype(int)[in_time]
             fr_min, fr_max = frames.min(), frames.max()
 
-            if not (0 <= (fr_min - self.buffer_startframe) < len(self.buffer)):
-                self.buffer_around(fr_min)
-            elif not (0 <= (fr_max - self.buffer_startframe) < len(self.buffer)):
-                self.buffer_around(fr_max)
-
-            try:
-                result = np.zeros((len(tt), self.nchannels))
-                indices = frames - self.buffer_startframe
-                if len(self.buffer) < self.buffersize // 2:
-                    indices = indices - (self.buffersize // 2 - len(self.buffer) + 1)
-                result[in_time] = self.buffer[indices]
-                return result
-
-            except IndexError as error:
-                warnings.warn(
-                    "Error in file %s, " % (self.filename)
-                    + "At time t=%.02f-%.02f seconds, " % (tt[0], tt[-1])
-                    + "indices wanted: %d-%d, " % (indices.min(), indices.max())
-                    + "but len(buffer)=%d\n" % (len(self.buffer))
-                    + str(error),
-                    UserWarning,
-                )
+            if fr_max - fr_min >= self.buffersize:
+                half = len(tt) // 2
+                return np.vstack([self.get_frame(tt[:half]), self.get_frame(tt[half:])])
 
-                indices[indices >= len(self.buffer)] = len(self.buffer) - 1
-                result[in_time] = self.buffer[indices]
-                return result
+            self.buffer_around(fr_min, fr_max)
+
+            result = np.zeros((len(tt), self.nchannels), dtype="float32")
+            sound = self.buffer[frames % self.buffersize]
+            if fr_max >= self.buffer_endframe:  # past the end of the stream
+                sound[frames >= self.buffer_endframe] = 0
+            result[in_time] = sound
+            return result
 
         else:
             ind = int(self.fps * tt)
             if ind < 0 or ind > self.nframes:  # out of time: return 0
-                return np.zeros(self.nchannels)
-
-            if not (0 <= (ind - self.buffer_startframe) < len(self.buffer)):
-                self.buffer_around(ind)
-
-            return self.buffer[ind - self.buffer_startframe]
-
-    def buffer_around(self, framenumber):
-        new_bufferstart = max(0, framenumber - self.buffersize // 2)
-
-        if self.buffer is not None:
-            current_f_end = self.buffer_startframe + self.buffersize
-            if new_bufferstart < current_f_end < new_bufferstart + self.buffersize:
-                conserved = current_f_end - new_bufferstart + 1
-                chunksize = self.buffersize - conserved
-                array = self.read_chunk(chunksize)
-                self.buffer = np.vstack([self.buffer[-conserved:], array])
-            else:
-                self.seek(new_bufferstart)
-                self.buffer = self.read_chunk(self.buffersize)
-        else:
-            self.seek(new_bufferstart)
-            self.buffer = self.read_chunk(self.buffersize)
+                return np.zeros(self.nchannels, dtype="float32")
 
-        self.buffer_startframe = new_bufferstart
+            self.buffer_around(ind)
+            if ind >= self.buffer_endframe:
+                return np.zeros(self.nchannels, dtype="float32")
+            return self.buffer[ind % self.buffersize].copy()
 
     def __del__(self):
         self.close_proc()
+
+
+class FFMPEG_CachedAudioReader:
+    """Reads the audio of a file from a decoded copy mapped in memory.
+
+    The whole file is decoded once, as float32 PCM at the given frame rate,
+    into a file of ``PCM_CACHE_DIR`` named after the version of the source
+    (path, size and modification time). That file is then memory-mapped, so
+    ``get_frame`` is pure indexing, and the pages are shared by all the
+    processes reading the same source. The least recently used files are
+    removed from the cache beyond ``PCM_CACHE_MAX_BYTES`` (see
+    ``evict_pcm_cache``).
+    """
+
+    def __init__(self, filename, print_infos=False, fps=44100, nchannels=2):
+        self.filename = filename
+        self.fps = fps
+        self.nchannels = nchannels
+        infos = ffmpeg_parse_infos(filename)
+        self.duration = infos.get("video_duration") or infos["duration"]
+        self.infos = infos
+        self.nframes = int(self.fps * self.duration)
+        self.buffersize = self.nframes + 1
+        self.proc = None
+
+        self.cachefile = self.decode()
+        if os.path.getsize(self.cachefile):
+            self.data = np.memmap(self.cachefile, dtype="float32", mode="r")
+            self.data = self.data.reshape((-1, nchannels))
+        else:
+            self.data = np.zeros((0, nchannels), dtype="float32")
+
+    def decode(self):
+        """Decodes the file into the cache unless it is there already, and
+        returns the path of the decoded file."""
+        key = media_cache_key(self.filename) + (self.fps, self.nchannels)
+        digest = hashlib.sha1(repr(key).encode("utf8")).hexdigest()
+        directory = get_setting("PCM_CACHE_DIR")
+        path = os.path.join(directory, digest + ".f32")
+        try:
+            os.utime(path)  # a use, for the eviction
+            return path
+        except OSError:
+            pass
+
+        os.makedirs(directory, exist_ok=True)
+        temp = "%s.%d.tmp" % (path, os.getpid())
+        cmd = [
+            get_setting("FFMPEG_BINARY"),
+            "-y",
+            "-loglevel",
+            "error",
+            "-i",
+            self.filename,
+            "-vn",
+            "-f",
+            "f32le",
+            "-acodec",
+            "pcm_f32le",
+            "-ar",
+            "%d" % self.fps,
+            "-ac",
+            "%d" % self.nchannels,
+            temp,
+        ]
+        popen_params = {"stdout": DEVNULL, "stderr": sp.PIPE, "stdin": DEVNULL}
+
+        if os.name == "nt":
+            popen_params["creationflags"] = 0x08000000
+
+        proc = sp.Popen(cmd, **popen_params)
+        _, error = proc.communicate()
+        if proc.returncode:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise IOError(
+                "MoviePy error: failed to decode the audio of file %s:\n\n%s"
+                % (self.filename, error.decode("utf8"))
+            )
+        os.replace(temp, path)
+        evict_pcm_cache(keep=[path])
+        return path
+
+    def get_frame(self, tt):
+        if isinstance(tt, np.ndarray):
+            in_time = (tt >= 0) & (tt < self.duration)
+
+            if not in_time.any():
+                raise IOError(
+                    "Error in file %s, " % (self.filename)
+                    + "Accessing time t=%.02f-%.02f seconds, " % (tt[0], tt[-1])
+                    + "with clip duration=%d seconds, " % self.duration
+                )
+
+            frames = np.round((self.fps * tt)).astype(int)
+            in_time &= frames < len(self.data)
+            result = np.zeros((len(tt), self.nchannels), dtype="float32")
+            result[in_time] = self.data[frames[in_time]]
+            return result
+
+        else:
+            ind = int(self.fps * tt)
+            if ind < 0 or ind >= len(self.data):  # out of time: return 0
+                return np.zeros(self.nchannels, dtype="float32")
+            return np.array(self.data[ind])
+
+    def close_proc(self):
+        """Nothing to close: there is no ffmpeg process."""
+        pass
+
+
+def evict_pcm_cache(keep=()):
+    """Removes the least recently used files of ``PCM_CACHE_DIR`` (but
+    none of ``keep``) beyond ``PCM_CACHE_MAX_BYTES``. Returns the size of
+    the cache."""
+    directory = get_setting("PCM_CACHE_DIR")
+    entries = []
+    for name in os.listdir(directory) if os.path.isdir(directory) else []:
+        path = os.path.join(directory, name)
+        try:
+            st = os.stat(path)
+        except OSError:  # removed by another process
+            continue
+        if name.endswith(".f32"):
+            entries.append((st.st_mtime, st.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= get_setting("PCM_CACHE_MAX_BYTES"):
+            break
+        if path in keep:
+            continue
+        try:
+            os.remove(path)  # the readers mapping it keep their pages
+        except OSError:
+            continue
+        total -= size
+    return total
+
+
+def _readahead_loop(ref):
+    # Only holds the reader during a step, so that it can be garbage
+    # collected (which stops the thread) while the thread is waiting.
+    while True:
+        reader = ref()
+        if reader is None or not reader._readahead_step():
+            return
+        del reader
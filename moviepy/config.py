@@ -1,16 +1,60 @@
-import os
+import json, os, re, shutil, threading
 import subprocess as sp
 
 from .compat import DEVNULL
 
+# The binaries are only looked for on the first ``get_setting`` asking for
+# them. What was found (path, modification time and the ffmpeg encoders) is
+# kept in CAPABILITY_CACHE, so later processes do not run any command until
+# a binary changes.
 FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg-imageio")
-IMAGEMAGICK_BINARY = r"C:\Program Files\ImageMagick-7.1.0-Q16-HDRI\convert.exe"
+if os.name == "nt":
+    IMAGEMAGICK_BINARY = os.getenv(
+        "IMAGEMAGICK_BINARY", r"C:\Program Files\ImageMagick-7.1.0-Q16-HDRI\convert.exe"
+    )
+else:
+    IMAGEMAGICK_BINARY = os.getenv("IMAGEMAGICK_BINARY", "auto-detect")
 if os.name == "nt":
     try:
         import winreg as wr  # py3k
     except ImportError:
         import _winreg as wr  # py2k
 
+# ffprobe is shipped next to ffmpeg and named the same way, so by default
+# its path is derived from the one of ffmpeg once that is known.
+FFPROBE_BINARY = os.getenv("FFPROBE_BINARY")
+
+# Names of the encoders of FFMPEG_BINARY, as listed by ``ffmpeg -encoders``.
+FFMPEG_ENCODERS = None
+
+# (major, minor) version of FFMPEG_BINARY, or None if it does not tell
+# (e.g. a build from git).
+FFMPEG_VERSION = None
+
+CAPABILITY_CACHE = os.getenv(
+    "MOVIEPY_CAPABILITY_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "moviepy", "capabilities.json"),
+)
+
+PROBE_CACHE_DIR = os.getenv(
+    "MOVIEPY_PROBE_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "moviepy", "probe"),
+)
+
+MAX_LIVE_READERS = int(os.getenv("MOVIEPY_MAX_READERS", "16"))
+
+PCM_CACHE_DIR = os.getenv(
+    "MOVIEPY_PCM_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "moviepy", "pcm"),
+)
+PCM_CACHE_MAX_DURATION = float(os.getenv("MOVIEPY_PCM_CACHE_MAX_DURATION", "120"))
+# The least recently used decoded files are removed beyond this size.
+PCM_CACHE_MAX_BYTES = int(os.getenv("MOVIEPY_PCM_CACHE_MAX_BYTES", str(2 * 2 ** 30)))
+
+# Type of the frames of the masks created by MoviePy: "uint8" (0-255, the
+# alpha of the decoded images as is), "float32" or "float64" (0-1).
+MASK_DTYPE = os.getenv("MOVIEPY_MASK_DTYPE", "uint8")
+
 
 def try_cmd(cmd):
     try:
@@ -27,61 +71,197 @@ def try_cmd(cmd):
         return True, None
 
 
-if FFMPEG_BINARY == "ffmpeg-imageio":
-    from imageio.plugins.ffmpeg import get_exe
+def _binary_stamp(binary):
+    """Returns ``[path, mtime, size]`` for an executable, or None."""
+    path = binary if os.path.isabs(binary) else shutil.which(binary)
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError):
+        return None
+    return [path, stat.st_mtime_ns, stat.st_size]
 
-    FFMPEG_BINARY = get_exe()
 
-elif FFMPEG_BINARY == "auto-detect":
-    if try_cmd(["ffmpeg"])[0]:
-        FFMPEG_BINARY = "ffmpeg"
-    elif try_cmd(["ffmpeg.exe"])[0]:
-        FFMPEG_BINARY = "ffmpeg.exe"
-    else:
-        FFMPEG_BINARY = "unset"
-else:
-    success, err = try_cmd([FFMPEG_BINARY])
-    if not success:
-        raise IOError(
-            str(err) + " - The path specified for the ffmpeg binary might be wrong"
-        )
+def _load_capabilities():
+    try:
+        with open(CAPABILITY_CACHE) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def _save_capabilities(section, entry):
+    capabilities = _load_capabilities()
+    capabilities[section] = entry
+    try:
+        os.makedirs(os.path.dirname(CAPABILITY_CACHE), exist_ok=True)
+        temp = "%s.%d.tmp" % (CAPABILITY_CACHE, os.getpid())
+        with open(temp, "w") as f:
+            json.dump(capabilities, f)
+        os.replace(temp, CAPABILITY_CACHE)
+    except (IOError, OSError):
+        pass
+
+
+def _cached_capabilities(section, request):
+    """Returns the cached entry for ``section`` if it was found for the same
+    configured value and its binary did not change since."""
+    entry = _load_capabilities().get(section)
+    if not entry or entry.get("request") != request:
+        return None
+    if entry.get("stamp") is None or _binary_stamp(entry["binary"]) != entry["stamp"]:
+        return None
+    return entry
+
+
+def ffmpeg_encoders(binary):
+    """Returns the names of the encoders of an ffmpeg binary."""
+    popen_params = {"stdout": sp.PIPE, "stderr": sp.PIPE, "stdin": DEVNULL}
 
-if IMAGEMAGICK_BINARY == "auto-detect":
     if os.name == "nt":
-        try:
-            key = wr.OpenKey(wr.HKEY_LOCAL_MACHINE, "SOFTWARE\\ImageMagick\\Current")
-            IMAGEMAGICK_BINARY = wr.QueryValueEx(key, "BinPath")[0] + r"\convert.exe"
-            key.Close()
-        except:
-            IMAGEMAGICK_BINARY = "unset"
-    elif try_cmd(["convert"])[0]:
-        IMAGEMAGICK_BINARY = "convert"
-    else:
-        IMAGEMAGICK_BINARY = "unset"
-else:
-    if not os.path.exists(IMAGEMAGICK_BINARY):
-        raise IOError(
-            "ImageMagick binary cannot be found at {}".format(IMAGEMAGICK_BINARY)
-        )
+        popen_params["creationflags"] = 0x08000000
 
-    if not os.path.isfile(IMAGEMAGICK_BINARY):
-        raise IOError(
-            "ImageMagick binary found at {} is not a file".format(IMAGEMAGICK_BINARY)
-        )
+    try:
+        proc = sp.Popen([binary, "-hide_banner", "-encoders"], **popen_params)
+        output, _ = proc.communicate()
+    except OSError:
+        return []
+    lines = output.decode("utf8", "replace").splitlines()
+    separator = next((i for i, l in enumerate(lines) if l.strip().startswith("---")), None)
+    if separator is None:
+        return []
+    return [l.split()[1] for l in lines[separator + 1 :] if len(l.split()) > 1]
+
+
+def ffmpeg_version(binary):
+    """Returns the ``[major, minor]`` version of an ffmpeg binary, or None."""
+    popen_params = {"stdout": sp.PIPE, "stderr": sp.PIPE, "stdin": DEVNULL}
+
+    if os.name == "nt":
+        popen_params["creationflags"] = 0x08000000
+
+    try:
+        proc = sp.Popen([binary, "-hide_banner", "-version"], **popen_params)
+        output, _ = proc.communicate()
+    except OSError:
+        return None
+    match = re.match(r"\S+ version n?(\d+)\.(\d+)", output.decode("utf8", "replace"))
+    return [int(match.group(1)), int(match.group(2))] if match else None
+
+
+_derived_ffprobe = None
+
+
+def _resolve_ffmpeg():
+    global FFMPEG_BINARY, FFPROBE_BINARY, FFMPEG_ENCODERS, FFMPEG_VERSION
+    global _derived_ffprobe
+
+    request = FFMPEG_BINARY
+    entry = _cached_capabilities("ffmpeg", request)
+    if entry is None or "version" not in entry:
+        if request == "ffmpeg-imageio":
+            from imageio.plugins.ffmpeg import get_exe
+
+            binary = get_exe()
 
-    success, err = try_cmd([IMAGEMAGICK_BINARY])
-    if not success:
-        raise IOError(
-            "%s - The path specified for the ImageMagick binary might "
-            "be wrong: %s" % (err, IMAGEMAGICK_BINARY)
+        elif request == "auto-detect":
+            if shutil.which("ffmpeg"):
+                binary = "ffmpeg"
+            elif shutil.which("ffmpeg.exe"):
+                binary = "ffmpeg.exe"
+            else:
+                binary = "unset"
+        else:
+            success, err = try_cmd([request])
+            if not success:
+                raise IOError(
+                    str(err) + " - The path specified for the ffmpeg binary might be wrong"
+                )
+            binary = request
+
+        encoders = [] if binary == "unset" else ffmpeg_encoders(binary)
+        entry = {
+            "request": request,
+            "binary": binary,
+            "stamp": _binary_stamp(binary),
+            "encoders": encoders,
+            "version": None if binary == "unset" else ffmpeg_version(binary),
+        }
+        if entry["stamp"] is not None:
+            _save_capabilities("ffmpeg", entry)
+
+    FFMPEG_BINARY = entry["binary"]
+    FFMPEG_ENCODERS = entry["encoders"]
+    FFMPEG_VERSION = entry["version"] and tuple(entry["version"])
+    if FFPROBE_BINARY in (None, _derived_ffprobe):
+        FFPROBE_BINARY = _derived_ffprobe = os.path.join(
+            os.path.dirname(FFMPEG_BINARY),
+            os.path.basename(FFMPEG_BINARY).replace("ffmpeg", "ffprobe"),
         )
 
 
+def _resolve_imagemagick():
+    global IMAGEMAGICK_BINARY
+
+    request = IMAGEMAGICK_BINARY
+    entry = _cached_capabilities("imagemagick", request)
+    if entry is not None:
+        IMAGEMAGICK_BINARY = entry["binary"]
+        return
+
+    if request == "auto-detect":
+        binary = "unset"
+        if os.name == "nt":
+            try:
+                key = wr.OpenKey(wr.HKEY_LOCAL_MACHINE, "SOFTWARE\\ImageMagick\\Current")
+                binary = wr.QueryValueEx(key, "BinPath")[0] + r"\convert.exe"
+                key.Close()
+            except:
+                pass
+        elif shutil.which("convert"):
+            binary = "convert"
+    else:
+        if not os.path.exists(request):
+            raise IOError("ImageMagick binary cannot be found at {}".format(request))
+
+        if not os.path.isfile(request):
+            raise IOError("ImageMagick binary found at {} is not a file".format(request))
+
+        success, err = try_cmd([request])
+        if not success:
+            raise IOError(
+                "%s - The path specified for the ImageMagick binary might "
+                "be wrong: %s" % (err, request)
+            )
+        binary = request
+
+    entry = {"request": request, "binary": binary, "stamp": _binary_stamp(binary)}
+    if entry["stamp"] is not None:
+        _save_capabilities("imagemagick", entry)
+    IMAGEMAGICK_BINARY = binary
+
+
+_resolvers = {
+    "FFMPEG_BINARY": _resolve_ffmpeg,
+    "FFPROBE_BINARY": _resolve_ffmpeg,
+    "FFMPEG_ENCODERS": _resolve_ffmpeg,
+    "FFMPEG_VERSION": _resolve_ffmpeg,
+    "IMAGEMAGICK_BINARY": _resolve_imagemagick,
+}
+_resolved = set()
+_resolve_lock = threading.Lock()
+
+
 def get_setting(varname):
     """Returns the value of a configuration variable."""
     gl = globals()
     if varname not in gl.keys():
         raise ValueError("Unknown setting %s" % varname)
+    resolver = _resolvers.get(varname)
+    if resolver is not None and resolver not in _resolved:
+        with _resolve_lock:
+            if resolver not in _resolved:
+                resolver()
+                _resolved.add(resolver)
     return gl[varname]
 
 
@@ -94,15 +274,18 @@ def change_settings(new_settings=None, filename=None):
             exec(in_file)
         gl.update(locals())
     gl.update(new_settings)
+    # New binaries are looked for (or checked) again on their next use.
+    for varname in new_settings:
+        _resolved.discard(_resolvers.get(varname))
 
 
 if __name__ == "__main__":
-    if try_cmd([FFMPEG_BINARY])[0]:
+    if try_cmd([get_setting("FFMPEG_BINARY")])[0]:
         print("MoviePy : ffmpeg successfully found.")
     else:
         print("MoviePy : can't find or access ffmpeg.")
 
-    if try_cmd([IMAGEMAGICK_BINARY])[0]:
+    if try_cmd([get_setting("IMAGEMAGICK_BINARY")])[0]:
         print("MoviePy : ImageMagick successfully found.")
     else:
         print("MoviePy : can't find or access ImageMagick.")
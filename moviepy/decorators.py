@@ -3,7 +3,7 @@ from moviepy.tools import cvsecs
 
 @decorator.decorator
 def outplace(f, clip, *a, **k):
-    newclip = clip.copy()
+    newclip = clip._view()
     f(newclip, *a, **k)
     return newclip
 
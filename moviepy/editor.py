@@ -1,10 +1,36 @@
 import os
+from importlib import import_module
 
 os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "1"
 
-from .video.io.VideoFileClip import VideoFileClip
-from .video.VideoClip import VideoClip, ImageClip, TextClip
-from .video.compositing.CompositeVideoClip import CompositeVideoClip
-from .video.compositing.concatenate import concatenate_videoclips
-from .audio.AudioClip import AudioClip
-from .audio.io.AudioFileClip import AudioFileClip
+from .version import __version__
+
+# Public names and the modules defining them. They are imported on first
+# access, so ``from moviepy.editor import VideoFileClip`` only loads what a
+# video file clip needs (``import *`` still loads everything).
+_lazy_names = {
+    "VideoFileClip": ".video.io.VideoFileClip",
+    "VideoClip": ".video.VideoClip",
+    "ImageClip": ".video.VideoClip",
+    "TextClip": ".video.VideoClip",
+    "CompositeVideoClip": ".video.compositing.CompositeVideoClip",
+    "concatenate_videoclips": ".video.compositing.concatenate",
+    "AudioClip": ".audio.AudioClip",
+    "AudioFileClip": ".audio.io.AudioFileClip",
+    "preview_mode": ".video.preview",
+    "set_preview": ".video.preview",
+}
+
+__all__ = list(_lazy_names) + ["__version__"]
+
+
+def __getattr__(name):
+    if name not in _lazy_names:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    value = getattr(import_module(_lazy_names[name], __package__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_names))
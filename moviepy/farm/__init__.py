@@ -0,0 +1,3 @@
+from .cache import RenderCache
+from .queue import QUEUE_BACKENDS, SQLiteQueue, WorkQueue, open_queue
+from .render import farm_render, render_cached, run_worker, spawn_workers
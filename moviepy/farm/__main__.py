@@ -0,0 +1,40 @@
+"""Render farm worker:
+
+    python -m moviepy.farm worker QUEUE [--lease 60] [--idle-exit SECONDS]
+
+QUEUE is a spec of ``moviepy.farm.open_queue``, e.g. the path of an SQLite
+queue. The builders of the jobs must be importable (see PYTHONPATH).
+"""
+
+import argparse, sys
+
+from .render import run_worker
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command")
+    worker = commands.add_parser("worker", help="renders the items of a queue")
+    worker.add_argument("queue")
+    worker.add_argument("--name", help="worker name (default host:pid)")
+    worker.add_argument("--lease", type=float, default=60)
+    worker.add_argument("--poll", type=float, default=1.0)
+    worker.add_argument("--idle-exit", type=float, help="stop after idling this long")
+    worker.add_argument("--max-items", type=int)
+    args = parser.parse_args()
+    if args.command != "worker":
+        parser.print_help()
+        sys.exit(2)
+    run_worker(
+        args.queue,
+        worker=args.name,
+        lease=args.lease,
+        poll=args.poll,
+        idle_exit=args.idle_exit,
+        max_items=args.max_items,
+        logger=None,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""Cache of the encoded segments of renders, by content.
+
+The key of a segment (``segment_key``) hashes what its frames show: the
+content of the sources (the pixels of the images and texts, the bytes of
+the video files), where and when each clip plays in the segment, and the
+encoder settings. The times are relative to the segment, so a segment
+whose clips only moved in the timeline (e.g. the paragraphs after an
+edited one) has the same key. A clip whose frames cannot be described so
+(a custom ``make_frame``, an effect, a moving position) makes the segments
+it plays in uncacheable: they are rendered every time.
+
+RenderCache keeps the segment files in a directory, and removes the least
+recently used ones beyond ``max_bytes``. Several processes can share it.
+"""
+
+import functools, hashlib, math, os, shutil, stat, uuid
+
+import numpy as np
+from moviepy.tools import exact_rate, exact_time
+from moviepy.video.compositing.CompositeVideoClip import CompositeVideoClip
+from moviepy.video.io.VideoFileClip import VideoFileClip
+from moviepy.video.VideoClip import ColorClip, ImageClip, constant_position
+
+# Changes the keys of all the segments when the rendering changes.
+CACHE_VERSION = 1
+CACHE_BYTES = 4 * 2 ** 30
+FILE_DIGESTS_SIZE = 1024
+
+_CONSTANT_POSITION = constant_position(None).__code__
+
+
+class Uncacheable(Exception):
+    """Raised when the frames of a clip cannot be keyed."""
+
+
+def _plain(value):
+    """Returns ``value`` with the NumPy values as Python ones, whose repr
+    does not depend on the NumPy version."""
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    if isinstance(value, (list, tuple)):
+        return tuple(_plain(v) for v in value)
+    return value
+
+
+def array_digest(array, memo):
+    if id(array) not in memo:
+        digest = hashlib.blake2b(np.ascontiguousarray(array), digest_size=16)
+        digest.update(("%s%s" % (array.shape, array.dtype)).encode())
+        memo[id(array)] = (array, digest.hexdigest())  # keeps the id in use
+    return memo[id(array)][1]
+
+
+def file_digest(filename):
+    """Returns the hash of the content of ``filename``, computed once per
+    version of the file (for the FILE_DIGESTS_SIZE last files)."""
+    st = os.stat(filename)
+    return _file_digest((os.path.abspath(filename), st.st_size, st.st_mtime_ns))
+
+
+@functools.lru_cache(maxsize=FILE_DIGESTS_SIZE)
+def _file_digest(version):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(version[0], "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def clip_fingerprint(clip, start, nframes, fps, memo):
+    """Returns a value describing the ``nframes`` frames of ``clip`` at
+    the times ``start + i / fps`` (exact), or raises Uncacheable."""
+    if isinstance(clip, ColorClip) and clip.make_frame is clip._image_make_frame:
+        return ("color", _plain(clip.size), _plain(clip.color), clip.ismask)
+    if isinstance(clip, ImageClip) and clip.make_frame is clip._image_make_frame:
+        return ("image", array_digest(clip.img, memo), clip.ismask)
+    reader_make_frame = getattr(clip, "_reader_make_frame", None)
+    if isinstance(clip, VideoFileClip) and clip.make_frame is reader_make_frame:
+        reader = clip.reader
+        return (
+            "file",
+            file_digest(reader.filename),
+            _plain(reader.size),
+            reader.resize_algo,
+            start,
+            clip.ismask,
+        )
+    if getattr(clip.make_frame, "__func__", None) is CompositeVideoClip._composite:
+        composite = clip.make_frame.__self__
+        layers = []
+        for c in composite.clips:
+            # The frames of the segment which show c, as the composite
+            # plays it (from start included to end excluded).
+            first = max(0, math.ceil((exact_time(c.start) - start) * fps))
+            last = nframes
+            if c.end is not None:
+                last = min(nframes, math.ceil((exact_time(c.end) - start) * fps))
+            if last <= first:
+                continue
+            if c.pos.__code__ is not _CONSTANT_POSITION:
+                raise Uncacheable("moving clip")
+            local = start + first / fps - exact_time(c.start)
+            mask = None
+            if c.mask is not None:
+                mask = clip_fingerprint(c.mask, local, last - first, fps, memo)
+            layers.append(
+                (
+                    clip_fingerprint(c, local, last - first, fps, memo),
+                    mask,
+                    first,
+                    last,
+                    _plain(c.pos(0)),
+                    c.relative_pos,
+                )
+            )
+        background = clip_fingerprint(composite.bg, start, nframes, fps, memo)
+        return ("composite", _plain(composite.size), background, tuple(layers), clip.ismask)
+    raise Uncacheable(type(clip).__name__)
+
+
+def segment_key(clip, frames, fps, **settings):
+    """Returns the key of the frames ``(start, end)`` of ``clip`` encoded
+    with ``settings`` (codec, extension...), or None if it is uncacheable.
+    """
+    rate = exact_rate(fps)
+    start, end = (int(f) for f in frames)  # not NumPy ints, whose repr differs
+    try:
+        fingerprint = clip_fingerprint(clip, start / rate, end - start, rate, {})
+    except Uncacheable:
+        return None
+    value = (CACHE_VERSION, fingerprint, end - start, rate, _plain(sorted(settings.items())))
+    return hashlib.blake2b(repr(value).encode(), digest_size=20).hexdigest()
+
+
+class RenderCache:
+    """The segment files of ``directory``, named by key, at most
+    ``max_bytes`` in total."""
+
+    def __init__(self, directory, max_bytes=CACHE_BYTES):
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, key, ext):
+        return os.path.join(self.directory, key + ext)
+
+    def get(self, key, ext):
+        """Returns the file of ``key``, or None. A hit counts as a use."""
+        path = self.path(key, ext)
+        try:
+            os.utime(path)
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    def put(self, key, filename, keep=()):
+        """Moves ``filename`` to the cache under ``key`` and returns its new
+        path, then evicts files (but none of ``keep``)."""
+        path = self.path(key, os.path.splitext(filename)[1])
+        try:
+            os.replace(filename, path)
+        except OSError:  # another filesystem
+            temp = "%s.%s.tmp" % (path, uuid.uuid4().hex[:8])
+            shutil.copyfile(filename, temp)
+            os.replace(temp, path)
+            os.remove(filename)
+        self.evict(keep=set(keep) | {path})
+        return path
+
+    def entries(self):
+        """Returns the (last use, size, path) of the files, oldest first."""
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:  # removed by another process
+                continue
+            if stat.S_ISREG(st.st_mode) and not name.endswith(".tmp"):
+                entries.append((st.st_mtime, st.st_size, path))
+        return sorted(entries)
+
+    def evict(self, keep=()):
+        """Removes the least recently used files beyond ``max_bytes``.
+        Returns the size of the cache."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path in keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+        return total
+
+    def clear(self):
+        for _, _, path in self.entries():
+            os.remove(path)
+
+    def stats(self):
+        entries = self.entries()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "files": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+        }
+
+
+def open_cache(cache):
+    """Returns ``cache`` (a RenderCache, the path of its directory, or
+    None) as a RenderCache."""
+    if cache is None or isinstance(cache, RenderCache):
+        return cache
+    return RenderCache(cache)
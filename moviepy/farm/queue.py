@@ -0,0 +1,227 @@
+"""Work queues of the render farm.
+
+A queue holds the work items of jobs. Workers ``claim`` an item for a
+lease, renew it with ``heartbeat`` while they work, and ``complete`` or
+``fail`` it. An item whose lease expires (its worker died, or lost its
+node) is claimed again by another worker, until ``max_attempts`` claims,
+after which it is failed.
+
+Backends subclass WorkQueue and are registered in QUEUE_BACKENDS, so that
+``open_queue("name:location")`` finds them. The first one, SQLiteQueue,
+keeps the items in an SQLite file: local worker processes, or the nodes
+sharing a filesystem with reliable locks, can use it as is.
+"""
+
+import abc, json, os, socket, sqlite3, time, uuid
+from contextlib import contextmanager
+
+
+class WorkQueue(abc.ABC):
+    """Interface of the queue backends. Items are dicts with the keys
+    ``id``, ``job``, ``index``, ``payload`` (any JSON-able value),
+    ``attempts`` and, for claimed items, ``token``."""
+
+    @abc.abstractmethod
+    def put(self, job, payloads):
+        """Adds the items of ``job``, in order."""
+
+    @abc.abstractmethod
+    def claim(self, worker, lease):
+        """Returns the next pending (or expired) item, now leased to
+        ``worker`` for ``lease`` seconds, or None."""
+
+    @abc.abstractmethod
+    def heartbeat(self, item, lease):
+        """Extends the lease of a claimed item. Returns False if the item
+        was claimed by another worker in the meantime."""
+
+    @abc.abstractmethod
+    def complete(self, item, result=None):
+        """Marks a claimed item as done with ``result``. Returns False if
+        the item was claimed by another worker in the meantime."""
+
+    @abc.abstractmethod
+    def fail(self, item, error):
+        """Releases the item for a new attempt, or fails it for good after
+        ``max_attempts``."""
+
+    @abc.abstractmethod
+    def status(self, job):
+        """Returns the number of items of ``job`` by state (``pending``,
+        ``claimed``, ``done``, ``failed``)."""
+
+    @abc.abstractmethod
+    def items(self, job):
+        """Returns all the items of ``job``, in order, with their state,
+        result and error."""
+
+    @abc.abstractmethod
+    def purge(self, job):
+        """Removes all the items of ``job``."""
+
+
+class SQLiteQueue(WorkQueue):
+    """Work queue in the SQLite file ``path``, safe for several processes."""
+
+    def __init__(self, path, max_attempts=3, timeout=60):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        with self._transaction() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS items ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " job TEXT NOT NULL,"
+                " idx INTEGER NOT NULL,"
+                " payload TEXT NOT NULL,"
+                " state TEXT NOT NULL DEFAULT 'pending',"
+                " token TEXT,"
+                " worker TEXT,"
+                " lease_expires REAL,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " result TEXT,"
+                " error TEXT)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS items_job ON items (job, idx)")
+            db.execute("CREATE INDEX IF NOT EXISTS items_state ON items (state, id)")
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock at once, so two workers can
+        # never claim the same item.
+        db = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+        finally:
+            db.close()
+
+    def put(self, job, payloads):
+        with self._transaction() as db:
+            db.executemany(
+                "INSERT INTO items (job, idx, payload) VALUES (?, ?, ?)",
+                [(job, i, json.dumps(p)) for i, p in enumerate(payloads)],
+            )
+
+    def claim(self, worker, lease):
+        now = time.time()
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE items SET state = 'failed', token = NULL,"
+                " error = COALESCE(error, 'lease expired')"
+                " WHERE state = 'claimed' AND lease_expires < ? AND attempts >= ?",
+                (now, self.max_attempts),
+            )
+            row = db.execute(
+                "SELECT id, job, idx, payload, attempts FROM items"
+                " WHERE state = 'pending' OR (state = 'claimed' AND lease_expires < ?)"
+                " ORDER BY id LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            token = uuid.uuid4().hex
+            db.execute(
+                "UPDATE items SET state = 'claimed', token = ?, worker = ?,"
+                " lease_expires = ?, attempts = attempts + 1 WHERE id = ?",
+                (token, worker, now + lease, row[0]),
+            )
+        return {
+            "id": row[0],
+            "job": row[1],
+            "index": row[2],
+            "payload": json.loads(row[3]),
+            "attempts": row[4] + 1,
+            "token": token,
+        }
+
+    def _update_claimed(self, item, query, args):
+        with self._transaction() as db:
+            cursor = db.execute(
+                query + " WHERE id = ? AND token = ? AND state = 'claimed'",
+                args + (item["id"], item["token"]),
+            )
+            return cursor.rowcount == 1
+
+    def heartbeat(self, item, lease):
+        return self._update_claimed(
+            item, "UPDATE items SET lease_expires = ?", (time.time() + lease,)
+        )
+
+    def complete(self, item, result=None):
+        """Marks a claimed item as done with ``result``. Returns False if
+        the item was claimed by another worker in the meantime."""
+        return self._update_claimed(
+            item,
+            "UPDATE items SET state = 'done', token = NULL, result = ?",
+            (json.dumps(result),),
+        )
+
+    def fail(self, item, error):
+        state = "failed" if item["attempts"] >= self.max_attempts else "pending"
+        return self._update_claimed(
+            item,
+            "UPDATE items SET state = ?, token = NULL, error = ?",
+            (state, error),
+        )
+
+    def status(self, job):
+        with self._transaction() as db:
+            rows = db.execute(
+                "SELECT state, COUNT(*) FROM items WHERE job = ? GROUP BY state",
+                (job,),
+            ).fetchall()
+        counts = dict.fromkeys(["pending", "claimed", "done", "failed"], 0)
+        counts.update(rows)
+        return counts
+
+    def items(self, job):
+        with self._transaction() as db:
+            rows = db.execute(
+                "SELECT id, idx, payload, state, worker, attempts, result, error"
+                " FROM items WHERE job = ? ORDER BY idx",
+                (job,),
+            ).fetchall()
+        return [
+            {
+                "id": id_,
+                "job": job,
+                "index": idx,
+                "payload": json.loads(payload),
+                "state": state,
+                "worker": worker,
+                "attempts": attempts,
+                "result": result and json.loads(result),
+                "error": error,
+            }
+            for (id_, idx, payload, state, worker, attempts, result, error) in rows
+        ]
+
+    def purge(self, job):
+        with self._transaction() as db:
+            db.execute("DELETE FROM items WHERE job = ?", (job,))
+
+
+# Backends of open_queue, by scheme.
+QUEUE_BACKENDS = {"sqlite": SQLiteQueue}
+
+
+def open_queue(spec, **kwargs):
+    """Returns the queue described by ``spec``: a WorkQueue is returned as
+    is, ``"scheme:location"`` opens a backend of QUEUE_BACKENDS, and a plain
+    path is an SQLite queue."""
+    if isinstance(spec, WorkQueue):
+        return spec
+    scheme, _, location = spec.partition(":")
+    if location and scheme in QUEUE_BACKENDS:
+        return QUEUE_BACKENDS[scheme](location, **kwargs)
+    return SQLiteQueue(spec, **kwargs)
+
+
+def worker_name():
+    return "%s:%d" % (socket.gethostname(), os.getpid())
@@ -0,0 +1,413 @@
+"""Distributed rendering: workers render segments, a coordinator stitches.
+
+Clips cannot be sent to other processes, so a job names a *builder*, a
+function ``"module:function"`` importable on every node which returns the
+clip when called with the job's ``builder_kwargs``. ``farm_render`` splits
+the frames of the clip into segments (at the ``start_times`` of a
+concatenation, i.e. one per paragraph, and every ``segment_duration``
+seconds), puts one work item per segment on the queue and renders the
+soundtrack. Workers (``run_worker``, or ``python -m moviepy.farm worker``)
+render each segment to its own closed-GOP file in the shared ``workdir``,
+and the coordinator joins the segments and the soundtrack with stream
+copy. Items lost with their worker are claimed again when their lease
+expires.
+
+With a ``cache`` (see ``moviepy.farm.cache``), the segments whose content
+was rendered before are taken from it, and only the others are rendered,
+then stored. ``render_cached`` does the same in the current process, for
+a clip at hand.
+"""
+
+import math, os, shutil, subprocess as sp, sys, tempfile, threading, time, traceback, uuid
+from importlib import import_module
+
+from moviepy.audio.io.passthrough import copyable_audio_file, ffmpeg_audio_passthrough
+from moviepy.compat import DEVNULL
+from moviepy.config import get_setting
+from moviepy.tools import default_bar_logger, exact_rate, exact_time, find_extension, frame_count
+from moviepy.video.io.ffmpeg_reader import borrowed_frames
+from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+
+from .cache import open_cache, segment_key
+from .queue import open_queue, worker_name
+
+# Restarts of the local workers of farm_render without progress.
+MAX_RESPAWNS = 3
+
+
+def resolve_builder(builder):
+    """Returns the function named by ``"module:function"``."""
+    module, _, name = builder.partition(":")
+    return getattr(import_module(module), name)
+
+
+def split_frames(nframes, fps, segment_duration=None, boundaries=()):
+    """Returns the ``(start, end)`` frame ranges of the segments: cut at the
+    first frames from the ``boundaries`` times, then every
+    ``segment_duration``."""
+    rate = exact_rate(fps)
+    nframes = int(nframes)  # the ranges go in JSON payloads: no NumPy ints
+    cuts = {int(math.ceil(exact_time(t) * rate)) for t in boundaries}
+    cuts = sorted(c for c in cuts if 0 < c < nframes)
+    ranges = []
+    for start, end in zip([0] + cuts, cuts + [nframes]):
+        step = int(round(segment_duration * fps)) if segment_duration else end - start
+        for s in range(start, end, max(step, 1)):
+            ranges.append((s, min(s + step, end)))
+    return ranges
+
+
+def plan_segments(clip, ranges, fps, ext, cache, **settings):
+    """Returns the (key, cached file) of the frame ranges of ``clip``,
+    both None without a cache or for an uncacheable range."""
+    plan = []
+    for frames in ranges:
+        key = None if cache is None else segment_key(clip, frames, fps, ext=ext, **settings)
+        plan.append((key, None if key is None else cache.get(key, ext)))
+    return plan
+
+
+def write_soundtrack(clip, prefix, audio_fps, audio_codec, audio_bitrate):
+    """Returns a file of the soundtrack of ``clip`` which can be muxed by
+    stream copy (written at ``prefix`` plus extension if needed), or None.
+    """
+    if clip.audio is None:
+        return None
+    audiofile = copyable_audio_file(clip.audio, audio_codec, audio_bitrate)
+    if audiofile is None:
+        audiofile = "%s.%s" % (prefix, find_extension(audio_codec))
+        if not ffmpeg_audio_passthrough(
+            clip.audio, audiofile, audio_fps, audio_codec, bitrate=audio_bitrate
+        ):
+            clip.audio.write_audiofile(
+                audiofile, audio_fps, codec=audio_codec, bitrate=audio_bitrate, logger=None
+            )
+    return audiofile
+
+
+def render_segment(clip, payload):
+    """Renders the frames ``payload["frames"]`` of ``clip`` to
+    ``payload["output"]``, as a video which starts on a keyframe and whose
+    GOPs do not reference the other segments."""
+    start, end = payload["frames"]
+    fps = payload["fps"]
+    rate = exact_rate(fps)
+    output = payload["output"]
+    temp = "%s.%s.tmp%s" % (output, uuid.uuid4().hex[:8], os.path.splitext(output)[1])
+    params = list(payload.get("ffmpeg_params") or []) + ["-flags", "+cgop"]
+    with FFMPEG_VideoWriter(
+        temp,
+        clip.size,
+        fps,
+        codec=payload["codec"],
+        preset=payload["preset"],
+        bitrate=payload.get("bitrate"),
+        threads=payload.get("threads"),
+        ffmpeg_params=params,
+    ) as writer, borrowed_frames():
+        for n in range(start, end):
+            frame = clip.get_frame_at_index(n, rate)
+            if frame.dtype != "uint8":
+                frame = frame.astype("uint8")
+            writer.write_frame(frame)
+    os.replace(temp, output)
+    return {"output": output, "frames": end - start}
+
+
+class _Heartbeat(threading.Thread):
+    """Renews the lease of an item while it is rendered."""
+
+    def __init__(self, queue, item, lease):
+        threading.Thread.__init__(self, daemon=True)
+        self.queue, self.item, self.lease = queue, item, lease
+        self.stopped = threading.Event()
+        self.lost = False
+
+    def run(self):
+        while not self.stopped.wait(self.lease / 3.0):
+            if not self.queue.heartbeat(self.item, self.lease):
+                self.lost = True
+                return
+
+
+def run_worker(queue, worker=None, lease=60, poll=1.0, idle_exit=None, max_items=None, logger=None):
+    """Renders the items of ``queue`` until it stays empty ``idle_exit``
+    seconds (forever if None), or ``max_items`` were rendered. Returns the
+    number of items rendered."""
+    queue = open_queue(queue)
+    worker = worker or worker_name()
+    logger = default_bar_logger(logger)
+    clips = {}  # the clip of the last job, built once per worker
+    done, idle_since = 0, time.time()
+    while max_items is None or done < max_items:
+        item = queue.claim(worker, lease)
+        if item is None:
+            if idle_exit is not None and time.time() - idle_since > idle_exit:
+                break
+            time.sleep(poll)
+            continue
+        payload = item["payload"]
+        logger(message="Moviepy - %s renders segment %d of job %s" % (worker, item["index"], item["job"]))
+        heartbeat = _Heartbeat(queue, item, lease)
+        heartbeat.start()
+        try:
+            key = (payload["builder"], repr(payload.get("builder_kwargs")))
+            if key not in clips:
+                for clip in clips.values():
+                    clip.close()
+                builder = resolve_builder(payload["builder"])
+                clips = {key: builder(**(payload.get("builder_kwargs") or {}))}
+            result = render_segment(clips[key], payload)
+        except Exception:
+            heartbeat.stopped.set()
+            queue.fail(item, "%s: %s" % (worker, traceback.format_exc()))
+        else:
+            heartbeat.stopped.set()
+            if not heartbeat.lost:
+                queue.complete(item, result)
+                done += 1
+        idle_since = time.time()
+    for clip in clips.values():
+        clip.close()
+    return done
+
+
+def spawn_workers(queue, n, lease=60, idle_exit=5):
+    """Starts ``n`` local worker processes on ``queue`` (a path)."""
+    env = dict(os.environ)
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env["PYTHONPATH"] = os.pathsep.join([root, os.getcwd(), env.get("PYTHONPATH", "")])
+    cmd = [sys.executable, "-m", "moviepy.farm", "worker", queue, "--lease", str(lease)]
+    if idle_exit is not None:
+        cmd += ["--idle-exit", str(idle_exit)]
+    return [sp.Popen(cmd, env=env, stdout=DEVNULL) for _ in range(n)]
+
+
+def stitch_segments(segments, filename, audiofile=None, logfile=None):
+    """Joins the segment files, and the soundtrack, with stream copy."""
+    listfile = filename + ".segments.txt"
+    with open(listfile, "w") as f:
+        for segment in segments:
+            f.write("file '%s'\n" % os.path.abspath(segment).replace("'", "'\\''"))
+    cmd = [get_setting("FFMPEG_BINARY"), "-y", "-loglevel", "error"]
+    cmd += ["-f", "concat", "-safe", "0", "-i", listfile]
+    if audiofile is not None:
+        cmd += ["-i", audiofile, "-map", "0:v", "-map", "1:a"]
+    cmd += ["-c", "copy", filename]
+
+    popen_params = {"stdout": DEVNULL, "stderr": logfile or sp.PIPE, "stdin": DEVNULL}
+
+    if os.name == "nt":
+        popen_params["creationflags"] = 0x08000000
+
+    proc = sp.Popen(cmd, **popen_params)
+    _, error = proc.communicate()
+    os.remove(listfile)
+    if proc.returncode:
+        raise IOError(
+            "MoviePy error: FFMPEG encountered the following error while "
+            "writing file %s:\n\n%s" % (filename, error and error.decode("utf8"))
+        )
+
+
+def farm_render(
+    queue,
+    builder,
+    filename,
+    builder_kwargs=None,
+    fps=None,
+    segment_duration=10,
+    boundaries=None,
+    codec="libx264",
+    preset="medium",
+    bitrate=None,
+    threads=None,
+    ffmpeg_params=None,
+    audio=True,
+    audio_fps=44100,
+    audio_codec="libmp3lame",
+    audio_bitrate=None,
+    workdir=None,
+    workers=0,
+    lease=60,
+    poll=0.5,
+    remove_temp=True,
+    cache=None,
+    logger="bar",
+):
+    """Renders the clip returned by ``builder`` to ``filename`` with the
+    workers of ``queue`` (a WorkQueue or a spec of ``open_queue``).
+
+    ``workdir`` (by default next to ``filename``) must be visible at the
+    same path from all the workers. ``workers`` local worker processes are
+    started for the job (0 relies on workers already running), which needs
+    a queue with a ``path``. ``cache`` is a RenderCache or its directory.
+    Raises IOError if a segment fails ``max_attempts`` times, or if the
+    local workers are restarted MAX_RESPAWNS times in a row without
+    claiming any item.
+    """
+    logger = default_bar_logger(logger)
+    builder_kwargs = builder_kwargs or {}
+    clip = resolve_builder(builder)(**builder_kwargs)
+    fps = fps or clip.fps
+    nframes = frame_count(clip.duration, fps)
+    if boundaries is None:
+        boundaries = getattr(clip, "start_times", ())
+    ranges = split_frames(nframes, fps, segment_duration, boundaries)
+
+    job = uuid.uuid4().hex
+    name, ext = os.path.splitext(os.path.abspath(filename))
+    workdir = os.path.abspath(workdir or name + ".farm")
+    os.makedirs(workdir, exist_ok=True)
+    cache = open_cache(cache)
+    settings = dict(
+        codec=codec, preset=preset, bitrate=bitrate, threads=threads, ffmpeg_params=ffmpeg_params
+    )
+    plan = plan_segments(clip, ranges, fps, ext, cache, **settings)
+    outputs = [cached for _, cached in plan]
+    todo = [i for i, output in enumerate(outputs) if output is None]
+    payloads = [
+        dict(
+            settings,
+            builder=builder,
+            builder_kwargs=builder_kwargs,
+            frames=ranges[i],
+            fps=fps,
+            output=os.path.join(workdir, "%s_%05d%s" % (job, i, ext)),
+        )
+        for i in todo
+    ]
+    queue = open_queue(queue)
+    if payloads:
+        queue.put(job, payloads)
+    logger(
+        message="Moviepy - Job %s: %d segments queued, %d cached"
+        % (job, len(payloads), len(ranges) - len(payloads))
+    )
+    processes = []
+    if workers and payloads:
+        # The workers idle a whole lease, to claim the items of dead workers.
+        processes = spawn_workers(queue.path, workers, lease, idle_exit=lease)
+    claims, respawns = 0, 0
+
+    try:
+        audiofile = None
+        if audio:
+            prefix = os.path.join(workdir, "%s_audio" % job)
+            audiofile = write_soundtrack(clip, prefix, audio_fps, audio_codec, audio_bitrate)
+        clip.close()
+
+        last = None
+        while payloads:
+            status = queue.status(job)
+            if status != last:
+                logger(message="Moviepy - Job %s: %s" % (job, status))
+                last = status
+            if status["failed"]:
+                errors = [i["error"] for i in queue.items(job) if i["state"] == "failed"]
+                raise IOError(
+                    "MoviePy error: %d segment(s) of %s failed:\n\n%s"
+                    % (len(errors), filename, errors[0])
+                )
+            if status["done"] == len(payloads):
+                break
+            if processes and all(p.poll() is not None for p in processes):
+                # The local workers stopped: restart them for the rest,
+                # unless they keep stopping without claiming any item.
+                attempts = sum(i["attempts"] for i in queue.items(job))
+                respawns = 0 if attempts > claims else respawns + 1
+                claims = attempts
+                if respawns > MAX_RESPAWNS:
+                    raise IOError(
+                        "MoviePy error: the workers of %s exited without rendering "
+                        "(exit codes %s)" % (filename, [p.returncode for p in processes])
+                    )
+                processes = spawn_workers(queue.path, workers, lease, idle_exit=lease)
+            time.sleep(poll)
+
+        for i, payload in zip(todo, payloads):
+            key = plan[i][0]
+            if key is None:
+                outputs[i] = payload["output"]
+            else:
+                outputs[i] = cache.put(key, payload["output"], keep=outputs)
+        stitch_segments(outputs, filename, audiofile)
+        if cache is not None:
+            cache.evict()
+    finally:
+        for p in processes:
+            if p.poll() is None:
+                p.terminate()
+            p.wait()
+        if remove_temp:
+            queue.purge(job)
+            for f in os.listdir(workdir):
+                if f.startswith(job):
+                    os.remove(os.path.join(workdir, f))
+            if not os.listdir(workdir):
+                os.rmdir(workdir)
+    logger(message="Moviepy - video ready %s" % filename)
+    return filename
+
+
+def render_cached(
+    clip,
+    filename,
+    cache,
+    fps=None,
+    segment_duration=10,
+    boundaries=None,
+    codec="libx264",
+    preset="medium",
+    bitrate=None,
+    threads=None,
+    ffmpeg_params=None,
+    audio=True,
+    audio_fps=44100,
+    audio_codec="libmp3lame",
+    audio_bitrate=None,
+    logger="bar",
+):
+    """Renders ``clip`` to ``filename`` in segments, as ``farm_render``
+    does but in this process: the segments found in ``cache`` (a
+    RenderCache or its directory) are reused, the others are rendered and
+    stored in it (all are rendered if ``cache`` is None). Returns the
+    number of segments rendered."""
+    logger = default_bar_logger(logger)
+    cache = open_cache(cache)
+    fps = fps or clip.fps
+    if boundaries is None:
+        boundaries = getattr(clip, "start_times", ())
+    ranges = split_frames(frame_count(clip.duration, fps), fps, segment_duration, boundaries)
+    ext = os.path.splitext(filename)[1]
+    settings = dict(
+        codec=codec, preset=preset, bitrate=bitrate, threads=threads, ffmpeg_params=ffmpeg_params
+    )
+    plan = plan_segments(clip, ranges, fps, ext, cache, **settings)
+    outputs = [cached for _, cached in plan]
+    todo = [i for i, output in enumerate(outputs) if output is None]
+    logger(
+        message="Moviepy - Writing video %s: %d segments to render, %d cached"
+        % (filename, len(todo), len(ranges) - len(todo))
+    )
+
+    workdir = tempfile.mkdtemp(
+        prefix="moviepy_segments_", dir=os.path.dirname(os.path.abspath(filename))
+    )
+    try:
+        for i in logger.iter_bar(segment=todo):
+            output = os.path.join(workdir, "%05d%s" % (i, ext))
+            render_segment(clip, dict(settings, frames=ranges[i], fps=fps, output=output))
+            key = plan[i][0]
+            outputs[i] = output if key is None else cache.put(key, output, keep=outputs)
+        audiofile = None
+        if audio:
+            prefix = os.path.join(workdir, "audio")
+            audiofile = write_soundtrack(clip, prefix, audio_fps, audio_codec, audio_bitrate)
+        stitch_segments(outputs, filename, audiofile)
+        if cache is not None:
+            cache.evict()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    logger(message="Moviepy - video ready %s" % filename)
+    return len(todo)
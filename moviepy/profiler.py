@@ -0,0 +1,210 @@
+"""Opt-in profiling of renders, per clip.
+
+    with RenderProfiler() as profiler:
+        clip.write_videofile("out.mp4")
+    profiler.export_trace("out.trace.json")  # for chrome://tracing or Perfetto
+    print(profiler.table())
+
+or simply ``clip.write_videofile("out.mp4", profile=True)``.
+
+While a profiler runs, the methods of PROFILED_METHODS are replaced by
+wrappers recording the wall time, the calls and the bytes of every clip
+node (a clip, a reader or a writer, named after its type and a label), and
+the original methods are put back when it stops: when no profiler runs,
+rendering costs exactly what it did. The get_frame of a CompositeVideoClip
+is the call of its make_frame, the blits happen inside it.
+"""
+
+import functools, json, os, threading, time, tracemalloc
+from collections import OrderedDict
+from contextlib import contextmanager
+from importlib import import_module
+
+import numpy as np
+
+# (module, class, method) of the profiled calls.
+PROFILED_METHODS = [
+    ("moviepy.Clip", "Clip", "get_frame"),
+    ("moviepy.Clip", "Clip", "get_frame_at_index"),
+    ("moviepy.video.VideoClip", "VideoClip", "blit_on"),
+    ("moviepy.video.io.ffmpeg_reader", "FFMPEG_VideoReader", "initialize"),
+    ("moviepy.video.io.ffmpeg_reader", "FFMPEG_VideoReader", "get_frame"),
+    ("moviepy.video.io.ffmpeg_reader", "FFMPEG_VideoReader", "get_frame_at_index"),
+    ("moviepy.video.io.ffmpeg_writer", "FFMPEG_VideoWriter", "write_frame"),
+    ("moviepy.audio.io.readers", "FFMPEG_AudioReader", "get_frame"),
+    ("moviepy.audio.io.ffmpeg_audiowriter", "FFMPEG_AudioWriter", "write_frames"),
+]
+
+_active = None
+
+
+class RenderProfiler:
+    """Records the calls of PROFILED_METHODS between ``start`` and ``stop``.
+
+    ``bytes new`` are the bytes of the new arrays returned by the calls
+    (views on existing buffers are not counted). With ``memory=True``,
+    tracemalloc also measures the net bytes allocated by each call
+    (children included), which slows the render down.
+    """
+
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.events = []
+        self.stats = OrderedDict()
+        self._labels = {}
+        self._originals = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._t0 = None
+
+    def start(self):
+        global _active
+        if _active is not None:
+            raise RuntimeError("MoviePy error: a RenderProfiler is already running.")
+        _active = self
+        self._tracemalloc = self.memory and not tracemalloc.is_tracing()
+        if self._tracemalloc:
+            tracemalloc.start()
+        self._t0 = time.perf_counter()
+        for module, classname, method in PROFILED_METHODS:
+            cls = getattr(import_module(module), classname)
+            original = cls.__dict__[method]
+            self._originals.append((cls, method, original))
+            setattr(cls, method, self._wrap(method, original))
+        return self
+
+    def stop(self):
+        global _active
+        for cls, method, original in reversed(self._originals):
+            setattr(cls, method, original)
+        self._originals = []
+        if self._tracemalloc:
+            tracemalloc.stop()
+        _active = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def node_name(self, obj):
+        """Returns ``Type[label]`` for a clip, reader or writer. The label is
+        the ``label`` attribute, else the file name or the text of the clip,
+        else a number given in order of appearance."""
+        label = obj.__dict__.get("label")
+        if label is None and isinstance(getattr(obj, "filename", None), str):
+            label = os.path.basename(obj.filename)
+        if label is None and isinstance(getattr(obj, "txt", None), str):
+            label = repr(obj.txt[:20])
+        if label is None:
+            label = "#%d" % self._labels.setdefault(id(obj), len(self._labels) + 1)
+        kind = type(obj).__name__
+        if getattr(obj, "ismask", False):
+            kind += "(mask)"
+        return "%s[%s]" % (kind, label)
+
+    def _wrap(self, method, f):
+        profiler = self
+
+        @functools.wraps(f)
+        def wrapper(obj, *args, **kwargs):
+            return profiler._call(obj, method, f, args, kwargs)
+
+        return wrapper
+
+    def _call(self, obj, method, f, args, kwargs):
+        stack = self._local.__dict__.setdefault("stack", [])
+        children = [0.0]
+        stack.append(children)
+        allocated = tracemalloc.get_traced_memory()[0] if self.memory else 0
+        start = time.perf_counter()
+        try:
+            result = f(obj, *args, **kwargs)
+        finally:
+            duration = time.perf_counter() - start
+            stack.pop()
+            if stack:
+                stack[-1][0] += duration
+            if self.memory:
+                allocated = tracemalloc.get_traced_memory()[0] - allocated
+        owned = isinstance(result, np.ndarray) and result.flags.owndata
+        nbytes = result.nbytes if owned else 0
+        self._record(self.node_name(obj), method, start, duration, children[0], nbytes, allocated)
+        return result
+
+    def _record(self, node, method, start, duration, children, nbytes, allocated):
+        with self._lock:
+            self.events.append(
+                (node, method, start, duration, threading.get_ident(), nbytes, allocated)
+            )
+            stats = self.stats.get((node, method))
+            if stats is None:
+                stats = self.stats[node, method] = [0, 0.0, 0.0, 0, 0]
+            stats[0] += 1
+            stats[1] += duration
+            stats[2] += duration - children
+            stats[3] += nbytes
+            stats[4] += allocated
+
+    def export_trace(self, filename):
+        """Writes the calls as a Chrome trace (JSON), which can be opened in
+        chrome://tracing or ui.perfetto.dev."""
+        pid = os.getpid()
+        events = [
+            {
+                "name": "%s.%s" % (node, method),
+                "cat": method,
+                "ph": "X",
+                "ts": 1e6 * (start - self._t0),
+                "dur": 1e6 * duration,
+                "pid": pid,
+                "tid": tid,
+                "args": {"bytes_new": nbytes, "bytes_allocated": allocated},
+            }
+            for (node, method, start, duration, tid, nbytes, allocated) in self.events
+        ]
+        with open(filename, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    def table(self, top=None):
+        """Returns the times per node and method, by decreasing self time."""
+        rows = sorted(self.stats.items(), key=lambda item: -item[1][2])[:top]
+        lines = [
+            "%-48s %8s %10s %10s %9s %10s %10s"
+            % ("node.method", "calls", "total ms", "self ms", "ms/call", "MB new", "MB alloc")
+        ]
+        for (node, method), (calls, total, own, nbytes, allocated) in rows:
+            lines.append(
+                "%-48s %8d %10.1f %10.1f %9.3f %10.1f %10.1f"
+                % (
+                    "%s.%s" % (node, method),
+                    calls,
+                    1000 * total,
+                    1000 * own,
+                    1000 * total / calls,
+                    nbytes / 1e6,
+                    allocated / 1e6,
+                )
+            )
+        return "\n".join(lines)
+
+
+def profiling():
+    """Tells whether a RenderProfiler is running."""
+    return _active is not None
+
+
+@contextmanager
+def render_profile(profile, filename, logger):
+    """Profiles the render of ``filename`` if ``profile`` is set, as used by
+    ``write_videofile``: ``True`` writes the trace to ``filename +
+    ".trace.json"``, a string is the path of the trace."""
+    if not profile or _active is not None:
+        yield None
+        return
+    trace = profile if isinstance(profile, str) else filename + ".trace.json"
+    with RenderProfiler() as profiler:
+        yield profiler
+    profiler.export_trace(trace)
+    logger(message="Moviepy - Render profile (trace in %s):\n%s" % (trace, profiler.table()))
@@ -1,9 +1,19 @@
-import os, sys, warnings, proglog
+import math, os, sys, warnings
 import subprocess as sp
-from .compat import DEVNULL
+from fractions import Fraction
+from .compat import DEVNULL, string_types
+
+
+def default_bar_logger(logger):
+    """Returns ``proglog.default_bar_logger(logger)``. proglog (and tqdm) are
+    only imported when something is actually written."""
+    import proglog
+
+    return proglog.default_bar_logger(logger)
+
 
 def subprocess_call(cmd, logger="bar", errorprint=True):
-    logger = proglog.default_bar_logger(logger)
+    logger = default_bar_logger(logger)
     logger(message='Moviepy - Running:\n>>> "+ " ".join(cmd)')
     popen_params = {"stdout": DEVNULL, "stderr": sp.PIPE, "stdin": DEVNULL}
     if os.name == "nt":
@@ -25,10 +35,7 @@ def subprocess_call(cmd, logger="bar", errorprint=True):
 
 
 def is_string(obj):
-    try:
-        return isinstance(obj, basestring)
-    except NameError:
-        return isinstance(obj, str)
+    return isinstance(obj, string_types)
 
 
 def cvsecs(time):
@@ -40,6 +47,31 @@ def cvsecs(time):
     return sum(mult * part for mult, part in zip(factors, reversed(time)))
 
 
+def exact_rate(fps):
+    """Returns a frame rate as a Fraction. Floats are taken as the nearest
+    fraction with a denominator up to 1001, so 23.976... is 24000/1001;
+    strings such as ``"24000/1001"`` are parsed."""
+    if isinstance(fps, Fraction):
+        return fps
+    if is_string(fps):
+        return Fraction(fps)
+    return Fraction(fps).limit_denominator(1001)
+
+
+def exact_time(t):
+    """Returns a time in seconds as a Fraction, dropping the float drift of
+    sums of durations (0.1 + 0.2 is 3/10)."""
+    if isinstance(t, Fraction):
+        return t
+    return Fraction(t).limit_denominator(10 ** 6)
+
+
+def frame_count(duration, fps):
+    """Returns the number of frames of a clip of ``duration`` seconds at
+    ``fps``, counted exactly."""
+    return math.ceil(exact_time(duration) * exact_rate(fps))
+
+
 def deprecated_version_of(f, oldname, newname=None):
     if newname is None:
         newname = f.__name__
@@ -65,6 +97,7 @@ extensions_dict = {
     "webm": {"type": "video", "codec": ["libvpx"]},
     "avi": {"type": "video"},
     "mov": {"type": "video"},
+    "m3u8": {"type": "video", "codec": ["libx264"]},
     "ogg": {"type": "audio", "codec": ["libvorbis"]},
     "mp3": {"type": "audio", "codec": ["libmp3lame"]},
     "wav": {"type": "audio", "codec": ["pcm_s16le", "pcm_s24le", "pcm_s32le"]},
@@ -1,13 +1,27 @@
-import os, tempfile, warnings, proglog
+import os, tempfile, warnings
 import numpy as np
-from imageio import imread 
 from ..Clip import Clip
-from ..compat import DEVNULL, string_types
+from ..audio.io.passthrough import copyable_audio_file, ffmpeg_audio_passthrough
+from ..compat import DEVNULL
 from ..config import get_setting
 from ..decorators import *
+from ..profiler import profiling, render_profile
 from ..tools import *
-from .io.ffmpeg_writer import ffmpeg_write_video
-from .tools.drawing import blit
+from .io.ffmpeg_writer import HLS_TIME, ffmpeg_write_video
+from .io.images import read_image
+from .preview import (
+    preview_scale,
+    preview_write_options,
+    scale_length,
+    scale_position,
+)
+from .tools.drawing import add_masks, alpha_to_mask, blit, mask_dtype, mask_value
+from .tools.text import render_text
+
+
+def constant_position(pos):
+    """Returns the position function of a clip which does not move."""
+    return lambda t: pos
 
 
 class VideoClip(Clip):
@@ -15,7 +29,7 @@ class VideoClip(Clip):
         Clip.__init__(self)
         self.mask = None
         self.audio = None
-        self.pos = lambda t: (0, 0)
+        self.pos = constant_position((0, 0))
         self.relative_pos = False
         if make_frame:
             self.make_frame = make_frame
@@ -62,10 +76,54 @@ class VideoClip(Clip):
         threads=None,
         ffmpeg_params=None,
         logger="bar",
+        preview=None,
+        audio_passthrough=True,
+        profile=None,
+        hls_time=HLS_TIME,
+        ffmpeg_graph=True,
+        hold_frames=False,
     ):
+        """Writes the clip to a video file.
+
+        With ``audio_passthrough``, a soundtrack made only of unmodified,
+        non-overlapping audio files is assembled by ffmpeg directly (or
+        stream-copied) instead of going through Python.
+
+        ``preview`` renders a quick low-resolution version of the clip. By
+        default it follows ``moviepy.video.preview.set_preview``; ``True``
+        (or a scale factor) previews a clip which was built at full size.
+
+        ``profile=True`` (or the path of the trace file) profiles the render
+        with ``moviepy.profiler.RenderProfiler``: a table of the time spent
+        in each clip is logged at the end, and a Chrome trace is written to
+        ``filename + ".trace.json"``. While profiling (with ``profile`` or a
+        running RenderProfiler), ``ffmpeg_graph`` and ``audio_passthrough``
+        are turned off, so that the frames are rendered where they are timed.
+
+        A ``.m3u8`` filename writes the clip as HLS, in segments of
+        ``hls_time`` seconds (``name_00000.ts``...) listed by a playlist which
+        is updated as they are encoded, so that a player can start before the
+        end of the render.
+
+        With ``ffmpeg_graph``, a clip made only of image, color, text and
+        video file clips at fixed positions is rendered by a single ffmpeg
+        command (see ``moviepy.video.io.ffmpeg_graph``), without passing its
+        frames through Python.
+
+        With ``hold_frames=True``, frames identical to the previous one are
+        neither rendered again nor encoded: for the formats which allow it
+        (mp4, mov, mkv, webm), the video has a variable frame rate and no
+        B-frames, and a still shown for ten seconds costs about ten frames
+        instead of 240.
+        """
+        fps, preset, ffmpeg_params = preview_write_options(
+            preview, fps, preset, ffmpeg_params
+        )
+        if profile or profiling():
+            ffmpeg_graph = audio_passthrough = False
         name, ext = os.path.splitext(os.path.basename(filename))
         ext = ext[1:].lower()
-        logger = proglog.default_bar_logger(logger)
+        logger = default_bar_logger(logger)
 
         if codec is None:
             try:
@@ -98,59 +156,112 @@ class VideoClip(Clip):
             audio_ext = find_extension(audio_codec)
             audiofile = name + Clip._TEMP_FILES_PREFIX + "wvf_snd.%s" % audio_ext
 
+        if make_audio and audio_passthrough:
+            source = copyable_audio_file(self.audio, audio_codec, audio_bitrate)
+            if source is not None:
+                # Muxed as is by the video writer, and never removed.
+                audiofile, make_audio = source, False
+
+        from .io.ffmpeg_graph import ffmpeg_write_graph
+
         logger(message="Moviepy - Building video %s." % filename)
-        if make_audio:
-            self.audio.write_audiofile(
-                audiofile,
-                audio_fps,
-                audio_nbytes,
-                audio_bufsize,
-                audio_codec,
-                bitrate=audio_bitrate,
+        with render_profile(profile, filename, logger):
+            if make_audio and audio_passthrough:
+                make_audio_in_python = not ffmpeg_audio_passthrough(
+                    self.audio,
+                    audiofile,
+                    audio_fps,
+                    audio_codec,
+                    bitrate=audio_bitrate,
+                    logger=logger,
+                )
+            else:
+                make_audio_in_python = make_audio
+            if make_audio_in_python:
+                self.audio.write_audiofile(
+                    audiofile,
+                    audio_fps,
+                    audio_nbytes,
+                    audio_bufsize,
+                    audio_codec,
+                    bitrate=audio_bitrate,
+                    write_logfile=write_logfile,
+                    verbose=verbose,
+                    logger=logger,
+                )
+
+            if not ffmpeg_graph or not ffmpeg_write_graph(
+                self,
+                filename,
+                fps,
+                codec,
+                bitrate=bitrate,
+                preset=preset,
                 write_logfile=write_logfile,
-                verbose=verbose,
+                audiofile=audiofile,
+                threads=threads,
+                ffmpeg_params=ffmpeg_params,
                 logger=logger,
-            )
-
-        ffmpeg_write_video(
-            self,
-            filename,
-            fps,
-            codec,
-            bitrate=bitrate,
-            preset=preset,
-            write_logfile=write_logfile,
-            audiofile=audiofile,
-            verbose=verbose,
-            threads=threads,
-            ffmpeg_params=ffmpeg_params,
-            logger=logger,
-        )
+                hls_time=hls_time,
+                hold_frames=hold_frames,
+            ):
+                ffmpeg_write_video(
+                    self,
+                    filename,
+                    fps,
+                    codec,
+                    bitrate=bitrate,
+                    preset=preset,
+                    write_logfile=write_logfile,
+                    audiofile=audiofile,
+                    verbose=verbose,
+                    threads=threads,
+                    ffmpeg_params=ffmpeg_params,
+                    logger=logger,
+                    hls_time=hls_time,
+                    hold_frames=hold_frames,
+                )
 
         if remove_temp and make_audio:
             if os.path.exists(audiofile):
                 os.remove(audiofile)
         logger(message="Moviepy - video ready %s" % filename)
 
-    def blit_on(self, picture, t):
-        hf, wf = framesize = picture.shape[:2]
+    def blit_on(self, picture, t, n=None, fps=None):
+        """Blits the frame of the clip at time ``t`` (of the picture) on
+        ``picture``. With ``n`` and ``fps``, the frames are taken by index:
+        ``n`` is the clip time ``t - start`` in frames of ``fps``."""
+        framesize = picture.shape[:2]
 
         if self.ismask and picture.max():
-            return np.minimum(1, picture + self.blit_on(np.zeros(framesize), t))
+            blitted = self.blit_on(np.zeros(framesize, picture.dtype), t, n, fps)
+            return add_masks(picture, blitted)
 
         ct = t - self.start  # clip time
 
-        img = self.get_frame(ct)
-        mask = self.mask.get_frame(ct) if self.mask else None
+        if n is None:
+            img = self.get_frame(ct)
+            mask = self.mask.get_frame(ct) if self.mask else None
+        else:
+            img = self.get_frame_at_index(n, fps)
+            mask = self.mask.get_frame_at_index(n, fps) if self.mask else None
 
         if mask is not None and (
             (img.shape[0] != mask.shape[0]) or (img.shape[1] != mask.shape[1])
         ):
             img = self.fill_array(img, mask.shape)
 
-        hi, wi = img.shape[:2]
+        pos = self.position_on(ct, framesize, img.shape[:2])
+
+        return blit(img, picture, pos, mask=mask, ismask=self.ismask)
 
-        pos = self.pos(ct)
+    def position_on(self, t, framesize, size):
+        """Returns the ``[x, y]`` pixel position, at clip time ``t``, of an
+        image of shape ``size`` (height, width) blitted on a frame of shape
+        ``framesize``."""
+        hf, wf = framesize
+        hi, wi = size
+        pos = self.pos(t)
 
         if isinstance(pos, str):
             pos = {
@@ -176,9 +287,7 @@ class VideoClip(Clip):
             D = {"top": 0, "center": (hf - hi) / 2, "bottom": hf - hi}
             pos[1] = D[pos[1]]
 
-        pos = map(int, pos)
-
-        return blit(img, picture, pos, mask=mask, ismask=self.ismask)
+        return [int(p) for p in pos]
 
     def add_mask(self):
         """Add a mask VideoClip to the VideoClip.
@@ -187,7 +296,9 @@ class VideoClip(Clip):
             mask = ColorClip(self.size, 1.0, ismask=True)
             return self.set_mask(mask.set_duration(self.duration))
         else:
-            make_frame = lambda t: np.ones(self.get_frame(t).shape[:2], dtype=float)
+            make_frame = lambda t: np.full(
+                self.get_frame(t).shape[:2], mask_value(1.0), dtype=mask_dtype()
+            )
             mask = VideoClip(ismask=True, make_frame=make_frame)
             return self.set_mask(mask.set_duration(self.duration))
 
@@ -204,33 +315,58 @@ class VideoClip(Clip):
     @outplace
     def set_position(self, pos, relative=False):
         self.relative_pos = relative
+        scale = preview_scale()
+        if scale != 1 and not relative:
+            if hasattr(pos, "__call__"):
+                pos = lambda t, pos=pos: scale_position(pos(t), scale)
+            else:
+                pos = scale_position(pos, scale)
         if hasattr(pos, "__call__"):
             self.pos = pos
         else:
-            self.pos = lambda t: pos
+            self.pos = constant_position(pos)
 
 
 class ImageClip(VideoClip):
-    def __init__(self, img, ismask=False, transparent=True, fromalpha=False, duration=None):
+    """A clip showing an image: an array, a file path or the bytes of an
+    image file. Files and bytes are decoded at ``target_resolution``
+    (height, width, one of them None to keep the aspect ratio), through a
+    cache shared by the clips of the same image (see ``io.images``)."""
+
+    def __init__(
+        self,
+        img,
+        ismask=False,
+        transparent=True,
+        fromalpha=False,
+        duration=None,
+        target_resolution=None,
+    ):
         VideoClip.__init__(self, ismask=ismask, duration=duration)
-        if isinstance(img, string_types):
-            img = imread(img)
+        if is_string(img) or isinstance(img, (bytes, bytearray)):
+            img = read_image(img, preview_scale(), target_resolution)
         if len(img.shape) == 3: 
             if img.shape[2] == 4:
                 if fromalpha:
-                    img = 1.0 * img[:, :, 3] / 255
+                    img = alpha_to_mask(img[:, :, 3])
                 elif ismask:
-                    img = 1.0 * img[:, :, 0] / 255
+                    img = alpha_to_mask(img[:, :, 0])
                 elif transparent:
-                    self.mask = ImageClip(1.0 * img[:, :, 3] / 255, ismask=True)
+                    self.mask = ImageClip(alpha_to_mask(img[:, :, 3]), ismask=True)
                     img = img[:, :, :3]
             elif ismask:
-                img = 1.0 * img[:, :, 0] / 255
+                img = alpha_to_mask(img[:, :, 0])
 
         self.make_frame = lambda t: img
+        self._image_make_frame = self.make_frame
         self.size = img.shape[:2][::-1]
         self.img = img
 
+    def frame_key(self, n, fps):
+        if self.make_frame is getattr(self, "_image_make_frame", None):
+            return ("image", id(self.make_frame))
+        return VideoClip.frame_key(self, n, fps)
+
 
 VideoClip.set_pos = deprecated_version_of(VideoClip.set_position, "set_pos")
 VideoClip.to_videofile = deprecated_version_of(VideoClip.write_videofile, "to_videofile")
@@ -252,9 +388,20 @@ class ColorClip(ImageClip):
                 )
             else:
                 color = col
+        if color is None:
+            color = 0 if ismask else (0, 0, 0)
         w, h = size
         shape = (h, w) if np.isscalar(color) else (h, w, len(color))
-        ImageClip.__init__(self, np.tile(color, w * h).reshape(shape), ismask=ismask, duration=duration)
+        # All the pixels share the memory of a single one (a read-only view
+        # with zero strides), so the frame costs bytes whatever its size.
+        if ismask:
+            value = np.array(mask_value(color))
+        else:
+            value = np.array(color)
+        if not ismask and np.all((value == np.round(value)) & (0 <= value) & (value <= 255)):
+            value = value.astype("uint8")
+        ImageClip.__init__(self, np.broadcast_to(value, shape), ismask=ismask, duration=duration)
+        self.color = color
 
 class TextClip(ImageClip):
     def __init__(
@@ -278,6 +425,47 @@ class TextClip(ImageClip):
         remove_temp=True,
         print_cmd=False,
     ):
+        scale = preview_scale()
+        if scale != 1:
+            fontsize = fontsize and fontsize * scale
+            stroke_width = stroke_width * scale
+            kerning = kerning and kerning * scale
+            interline = interline and interline * scale
+            if size is not None:
+                size = [None if l is None else scale_length(l, scale) for l in size]
+
+        img = None
+        if tempfilename is None and remove_temp and kerning is None and not print_cmd:
+            # Renders in-process, unless the caller relies on ImageMagick.
+            if txt is None:
+                with open(filename, encoding="utf8") as f:
+                    text = f.read()
+            else:
+                text = txt
+            try:
+                img = render_text(
+                    text,
+                    font,
+                    fontsize=fontsize,
+                    color=color,
+                    bg_color=bg_color,
+                    stroke_color=stroke_color,
+                    stroke_width=stroke_width,
+                    size=size,
+                    method=method,
+                    align=align,
+                    interline=interline,
+                )
+            except (IOError, OSError, ValueError, ImportError):
+                img = None  # unknown font or color: ImageMagick may know it
+
+        if img is not None:
+            ImageClip.__init__(self, img, transparent=transparent)
+            self.txt = text
+            self.color = color
+            self.stroke_color = stroke_color
+            return
+
         if txt is not None:
             if temptxt is None:
                 temptxt_fd, temptxt = tempfile.mkstemp(suffix=".txt")
@@ -1,6 +1,22 @@
 from moviepy.audio.AudioClip import CompositeAudioClip
+from moviepy.tools import exact_time
 from moviepy.video.VideoClip import ColorClip, VideoClip
 
+_UNBUILT = object()
+
+
+def clip_index(clip, n, fps):
+    """Returns the index, in the frames of ``clip`` at ``fps``, of its frame
+    shown at the frame ``n`` of a composite: ``n`` shifted exactly by the
+    start of the clip. That is an int when the clip starts on a frame of
+    the composite, else a Fraction (its exact time ``index / fps``, from
+    which a file reader finds the frame it shows, see ``frame_index``), as
+    rounding it to the composite's frames would pick the wrong frame of a
+    file whose rate differs."""
+    index = n - exact_time(clip.start) * fps
+    return int(index) if index.denominator == 1 else index
+
+
 class CompositeVideoClip(VideoClip):
     def __init__(self, clips, size=None, bg_color=None, use_bgclip=False, ismask=False):
         if size is None:
@@ -30,7 +46,7 @@ class CompositeVideoClip(VideoClip):
             self.created_bg = False
         else:
             self.clips = clips
-            self.bg = ColorClip(size, color=self.bg_color)
+            self.bg = ColorClip(size, color=self.bg_color, ismask=ismask)
             self.created_bg = True
 
         ends = [c.end for c in self.clips]
@@ -44,25 +60,84 @@ class CompositeVideoClip(VideoClip):
             self.audio = CompositeAudioClip(audioclips)
 
         if transparent:
-            maskclips = [
-                (c.mask if (c.mask is not None) else c.add_mask().mask)
-                .set_position(c.pos)
-                .set_end(c.end)
-                .set_start(c.start, change_end=False)
-                for c in self.clips
-            ]
-
-            self.mask = CompositeVideoClip(
-                maskclips, self.size, ismask=True, bg_color=0.0
-            )
-
-        def make_frame(t):
-            f = self.bg.get_frame(t)
-            for c in self.playing_clips(t):
-                f = c.blit_on(f, t)
-            return f
-
-        self.make_frame = make_frame
+            self.mask = _UNBUILT
+
+        self.make_frame = self._composite
+
+    @property
+    def mask(self):
+        if self._mask is _UNBUILT:
+            self._mask = self._build_mask()
+        return self._mask
+
+    @mask.setter
+    def mask(self, mask):
+        self._mask = mask
+
+    def _build_mask(self):
+        """Composites the masks of the clips (opaque for the clips without).
+        A transparent composite builds it on first access, as rendering the
+        composite itself does not need it."""
+        opaque = {}  # one shared mask per size
+        maskclips = []
+        for c in self.clips:
+            if c.mask is not None:
+                mask = c.mask._view()
+            elif c.has_constant_size:
+                size = tuple(c.size)
+                if size not in opaque:
+                    opaque[size] = ColorClip(size, 1.0, ismask=True)
+                mask = opaque[size]._view()
+            else:
+                mask = c.add_mask().mask._view()
+            mask.pos, mask.relative_pos = c.pos, c.relative_pos
+            mask.start, mask.end = c.start, c.end
+            mask.duration = c.duration if c.end is None else c.end - c.start
+            maskclips.append(mask)
+
+        mask = CompositeVideoClip(maskclips, self.size, ismask=True, bg_color=0.0)
+        mask.start, mask.end, mask.duration = self.start, self.end, self.duration
+        mask.pos, mask.relative_pos = self.pos, self.relative_pos
+        return mask
+
+    def _composite(self, t):
+        # A created background is a ColorClip, whose frame is a broadcast
+        # view: the first blit writes it out once at the output size, and
+        # frames without playing clips stay views.
+        f = self.bg.get_frame(t)
+        for c in self.playing_clips(t):
+            f = c.blit_on(f, t)
+        return f
+
+    def make_frame_at_index(self, n, fps):
+        if getattr(self.make_frame, "__func__", None) is not CompositeVideoClip._composite:
+            return VideoClip.make_frame_at_index(self, n, fps)
+        composite = self.make_frame.__self__
+        t = float(n / fps)
+        f = composite.bg.get_frame_at_index(n, fps)
+        for c in composite.playing_clips(t):
+            f = c.blit_on(f, t, clip_index(c, n, fps), fps)
+        return f
+
+    def frame_key(self, n, fps):
+        if getattr(self.make_frame, "__func__", None) is not CompositeVideoClip._composite:
+            return VideoClip.frame_key(self, n, fps)
+        # The keys of the playing clips and of their masks, and positions.
+        composite = self.make_frame.__self__
+        t = float(n / fps)
+        keys = [composite.bg.frame_key(n, fps)]
+        if keys[0] is None:
+            return None
+        for c in composite.playing_clips(t):
+            i = clip_index(c, n, fps)
+            key = c.frame_key(i, fps)
+            mask_key = None if c.mask is None else c.mask.frame_key(i, fps)
+            if key is None or (c.mask is not None and mask_key is None):
+                return None
+            pos = c.pos(t - c.start)
+            pos = pos if isinstance(pos, str) else tuple(pos)
+            keys.append((id(c), key, mask_key, pos, c.relative_pos))
+        return tuple(keys)
 
     def playing_clips(self, t=0):
         return [c for c in self.clips if c.is_playing(t)]
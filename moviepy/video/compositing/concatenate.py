@@ -2,7 +2,7 @@ import numpy as np
 from moviepy.audio.AudioClip import CompositeAudioClip
 from moviepy.tools import deprecated_version_of
 from moviepy.video.compositing.CompositeVideoClip import CompositeVideoClip
-from moviepy.video.VideoClip import ColorClip, VideoClip
+from moviepy.video.VideoClip import ColorClip, VideoClip, constant_position
 
 try:  # Python 2
     reduce
@@ -10,6 +10,25 @@ except NameError:  # Python 3
     from functools import reduce
 
 
+def _place(clip, start, pos=None):
+    """Returns ``clip.set_start(start)``, moved to the position function
+    ``pos``, as one view (and one view of its mask and of its audio) instead
+    of a copy per call."""
+    newclip = clip._view()
+    newclip.start = start
+    if newclip.duration is not None:
+        newclip.end = start + newclip.duration
+    elif newclip.end is not None:
+        newclip.duration = newclip.end - start
+    if pos is not None:
+        newclip.pos, newclip.relative_pos = pos, False
+    if getattr(newclip, "mask", None) is not None:
+        newclip.mask = _place(newclip.mask, start, pos)
+    if getattr(newclip, "audio", None) is not None:
+        newclip.audio = _place(newclip.audio, start)
+    return newclip
+
+
 def concatenate_videoclips(clips, method="chain", transition=None, bg_color=None, ismask=False, padding=0):
 
     tt = np.cumsum([0] + [c.duration for c in clips])
@@ -21,8 +40,9 @@ def concatenate_videoclips(clips, method="chain", transition=None, bg_color=None
 
     tt = np.maximum(0, tt + padding * np.arange(len(tt)))
 
+    center = constant_position("center")
     result = CompositeVideoClip(
-        [c.set_start(t).set_position("center") for (c, t) in zip(clips, tt)],
+        [_place(c, t, center) for (c, t) in zip(clips, tt.tolist())],
         size=(w, h),
         bg_color=bg_color,
         ismask=ismask,
@@ -35,7 +55,7 @@ def concatenate_videoclips(clips, method="chain", transition=None, bg_color=None
 
     audio_t = [(c.audio, t) for c, t in zip(clips, tt) if c.audio is not None]
     if audio_t:
-        result.audio = CompositeAudioClip([a.set_start(t) for a, t in audio_t])
+        result.audio = CompositeAudioClip([_place(a, t) for a, t in audio_t])
 
     fpss = [c.fps for c in clips if getattr(c, "fps", None) is not None]
     result.fps = max(fpss) if fpss else None
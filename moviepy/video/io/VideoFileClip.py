@@ -1,6 +1,7 @@
 from moviepy.audio.io.AudioFileClip import AudioFileClip
 from moviepy.Clip import Clip
-from moviepy.video.io.ffmpeg_reader import FFMPEG_VideoReader
+from moviepy.video.io.ffmpeg_reader import FFMPEG_VideoReader, owned_frame
+from moviepy.video.tools.drawing import alpha_to_mask
 from moviepy.video.VideoClip import VideoClip
 
 
@@ -38,16 +39,19 @@ class VideoFileClip(VideoClip):
 
         self.filename = self.reader.filename
 
+        # The frames are copies of the reader's buffers, which the next
+        # reads overwrite (except within ``borrowed_frames``).
         if has_mask:
-            self.make_frame = lambda t: self.reader.get_frame(t)[:, :, :3]
-            mask_mf = lambda t: self.reader.get_frame(t)[:, :, 3] / 255.0
+            self.make_frame = lambda t: owned_frame(self.reader.get_frame(t)[:, :, :3])
+            mask_mf = lambda t: alpha_to_mask(self.reader.get_frame(t)[:, :, 3])
             self.mask = VideoClip(ismask=True, make_frame=mask_mf).set_duration(
                 self.duration
             )
             self.mask.fps = self.fps
 
         else:
-            self.make_frame = lambda t: self.reader.get_frame(t)
+            self.make_frame = lambda t: owned_frame(self.reader.get_frame(t))
+            self._reader_make_frame = self.make_frame
 
         if audio and self.reader.infos["audio_found"]:
             self.audio = AudioFileClip(
@@ -56,3 +60,20 @@ class VideoFileClip(VideoClip):
                 fps=audio_fps,
                 nbytes=audio_nbytes,
             )
+
+    def make_frame_at_index(self, n, fps):
+        if self.make_frame is not getattr(self, "_reader_make_frame", None):
+            return VideoClip.make_frame_at_index(self, n, fps)
+        return owned_frame(self.reader.get_frame_at_index(self.reader.frame_index(n, fps)))
+
+    def frame_key(self, n, fps):
+        if self.make_frame is not getattr(self, "_reader_make_frame", None):
+            return VideoClip.frame_key(self, n, fps)
+        return ("file", id(self.reader), self.reader.frame_index(n, fps))
+
+    def close(self):
+        """Terminates the ffmpeg processes of the clip. Readers reopen
+        lazily, so the clip (and its copies) can still be used after."""
+        self.reader.close()
+        if self.audio is not None:
+            self.audio.close()
@@ -0,0 +1,301 @@
+"""Renders simple compositions with a single ffmpeg command.
+
+``ffmpeg_write_graph`` compiles a clip into an ffmpeg ``filter_complex``
+when every node of it has an ffmpeg equivalent:
+
+- ImageClip, ColorClip and TextClip: a single-frame input (a PNG of their
+  image and mask) which ``overlay`` repeats,
+- VideoFileClip: the file, scaled as its reader does and shifted to the
+  start of the clip,
+- CompositeVideoClip (concatenations included) of those, or of other
+  composites, at fixed positions: a canvas of the background color and a
+  chain of ``overlay``, each enabled while its clip plays.
+
+The frames then go from the decoders to the encoder without passing
+through Python (the soundtrack is written beforehand, see
+``moviepy.audio.io.passthrough``). The ``-vf`` filters of ``ffmpeg_params``
+(the downscaling of a preview) are appended to the graph. Otherwise nothing is written and
+``write_videofile`` renders the frames with NumPy.
+
+With ``hold_frames``, ``mpdecimate`` drops the frames identical to the
+previous one before the encoder, as ``ffmpeg_write_video`` does (for the
+formats of GRAPH_VFR_EXTENSIONS).
+"""
+
+import os, shutil, subprocess as sp, tempfile
+
+import numpy as np
+from moviepy.compat import DEVNULL
+from moviepy.config import get_setting
+from moviepy.tools import default_bar_logger, exact_rate, frame_count
+from moviepy.video.compositing.CompositeVideoClip import CompositeVideoClip
+from moviepy.video.io.ffmpeg_writer import (
+    HLS_TIME,
+    MAX_HOLD,
+    output_params,
+    vfr_params,
+)
+from moviepy.video.io.VideoFileClip import VideoFileClip
+from moviepy.video.tools.drawing import mask_to_uint8
+from moviepy.video.VideoClip import ImageClip, constant_position
+
+_CONSTANT_POSITION = constant_position(None).__code__
+
+# The formats of VFR_EXTENSIONS which store no frame rate: the frames held
+# by the graph lose it, which Matroska would need.
+GRAPH_VFR_EXTENSIONS = ["mp4", "m4v", "mov"]
+
+
+class Unsupported(Exception):
+    """Raised when a clip has no ffmpeg equivalent."""
+
+
+def split_video_filters(ffmpeg_params):
+    """Returns the chains of the ``-vf`` options of ``ffmpeg_params`` (e.g.
+    the scale of a preview) and its other options. ffmpeg refuses them
+    along ``-filter_complex``: they become the last filters of the graph."""
+    filters, params = [], []
+    options = iter(ffmpeg_params or [])
+    for option in options:
+        if option in ["-vf", "-filter:v"]:
+            filters.append(next(options))
+        elif option in ["-filter_complex", "-lavfi", "-filter"]:
+            raise Unsupported("ffmpeg_params %s" % option)
+        else:
+            params.append(option)
+    return filters, params
+
+
+class FilterGraph:
+    """The inputs and filters of an ffmpeg command, built node by node."""
+
+    def __init__(self, tempdir):
+        self.tempdir = tempdir
+        self.inputs = []
+        self.filters = []
+        self.labels = 0
+
+    def add_input(self, *args):
+        """Adds an input, returns its index."""
+        self.inputs.append(list(args))
+        return len(self.inputs) - 1
+
+    def add_image(self, img):
+        """Adds an RGB(A) image as a single-frame input."""
+        from PIL import Image
+
+        path = os.path.join(self.tempdir, "image%d.png" % len(self.inputs))
+        Image.fromarray(np.ascontiguousarray(img)).save(path, compress_level=1)
+        return self.add_input("-i", path)
+
+    def add_filter(self, inputs, chain):
+        """Adds ``[inputs]chain[output]``, returns the output label."""
+        self.labels += 1
+        label = "v%d" % self.labels
+        self.filters.append("%s%s[%s]" % ("".join("[%s]" % i for i in inputs), chain, label))
+        return label
+
+    def split(self, label):
+        """Adds ``[label]split``, returns the labels of the two copies."""
+        self.labels += 1
+        copies = ["v%da" % self.labels, "v%db" % self.labels]
+        self.filters.append("[%s]split[%s][%s]" % (label, copies[0], copies[1]))
+        return copies
+
+    def args(self):
+        return sum(self.inputs, []) + ["-filter_complex", ";".join(self.filters)]
+
+
+def color_hex(color):
+    value = np.asarray(color)
+    if value.shape != (3,) or np.any(value != np.round(value)):
+        raise Unsupported("color %r" % (color,))
+    if np.any((value < 0) | (value > 255)):
+        raise Unsupported("color %r" % (color,))
+    return "0x%02x%02x%02x" % tuple(int(v) for v in value)
+
+
+def still_image(clip):
+    """Returns the RGB(A) image of an ImageClip which shows its image (with
+    its mask as alpha) at all times, or raises Unsupported."""
+    if not isinstance(clip, ImageClip) or clip.get_frame(0) is not clip.img:
+        raise Unsupported(type(clip).__name__)
+    img = clip.img
+    if img.dtype != np.uint8 or img.ndim != 3 or img.shape[2] != 3:
+        raise Unsupported("image of shape %s and type %s" % (img.shape, img.dtype))
+    mask = clip.mask
+    if mask is None:
+        return img
+    if not isinstance(mask, ImageClip) or mask.get_frame(0) is not mask.img:
+        raise Unsupported("animated mask")
+    if mask.img.shape[:2] != img.shape[:2]:
+        raise Unsupported("mask size")
+    return np.dstack([img, mask_to_uint8(mask.img)])
+
+
+def add_source(graph, clip, fps, start, end):
+    """Adds the frames of ``clip`` played from ``start`` to ``end`` (in the
+    time of the output), returns their label."""
+    if clip.ismask:
+        raise Unsupported("mask clip")
+    if getattr(clip.make_frame, "__func__", None) is CompositeVideoClip._composite:
+        duration = clip.duration if end is None else end - start
+        if duration is None:
+            raise Unsupported("composite without duration")
+        # _mask, as the mask of a transparent composite is built on access.
+        label = compile_clip(graph, clip, fps, duration, alpha=clip._mask is not None)
+        return graph.add_filter([label], "setpts=PTS-STARTPTS+%.06f/TB" % start)
+    if isinstance(clip, VideoFileClip):
+        if clip.make_frame is not getattr(clip, "_reader_make_frame", None):
+            raise Unsupported("modified VideoFileClip")
+        if clip.mask is not None:
+            raise Unsupported("VideoFileClip with a mask")
+        reader = clip.reader
+        index = graph.add_input("-i", reader.filename)
+        chain = "scale=%d:%d:flags=%s" % (tuple(reader.size) + (reader.resize_algo,))
+        if end is not None:
+            chain += ",trim=duration=%.06f" % (end - start)
+        chain += ",setpts=PTS-STARTPTS+%.06f/TB" % start
+        return graph.add_filter(["%d:v" % index], chain)
+    index = graph.add_image(still_image(clip))
+    return "%d:v" % index
+
+
+def compile_clip(graph, clip, fps, duration, alpha=False):
+    """Adds the filters rendering the ``duration`` first seconds of ``clip``
+    to ``graph`` (with transparent pixels where nothing is drawn if
+    ``alpha``), returns the label of the output, or raises Unsupported."""
+    if clip.ismask:
+        raise Unsupported("mask clip")
+    make_frame = clip.make_frame
+    color = "0x000000"
+    if getattr(make_frame, "__func__", None) is CompositeVideoClip._composite:
+        composite = make_frame.__self__
+        size = composite.size
+        if composite.created_bg:
+            if not alpha:
+                color = color_hex(composite.bg.color)
+            layers = []
+        else:
+            if composite.bg.size != size:
+                raise Unsupported("background size")
+            layers = [(composite.bg, 0, None, (0, 0))]
+        for c in composite.clips:
+            if c.pos.__code__ is not _CONSTANT_POSITION:
+                raise Unsupported("moving clip")
+            if c.end is not None and c.end <= c.start or c.start >= duration:
+                continue
+            layers.append((c, c.start, c.end, None))
+    else:
+        size = clip.size
+        layers = [(clip, 0, None, (0, 0))]
+
+    nframes = frame_count(duration, fps)
+    canvas = "color=c=%s:s=%dx%d:r=%s" % (
+        color + ("@0" if alpha else ""),
+        size[0],
+        size[1],
+        exact_rate(fps),
+    )
+    if alpha:
+        canvas += ",format=rgba"
+    label = graph.add_filter([], canvas + ",trim=end_frame=%d" % nframes)
+    for c, start, end, pos in layers:
+        source = add_source(graph, c, fps, start, end)
+        if pos is None:
+            pos = c.position_on(0, size[::-1], c.size[::-1])
+        enable = "gte(t,%.06f)" % start
+        if end is not None:
+            enable += "*lt(t,%.06f)" % end
+        label = graph.add_filter(
+            [label, source],
+            "overlay=x=%d:y=%d:format=%s:eof_action=repeat:enable='%s'"
+            % (pos[0], pos[1], "auto" if alpha else "rgb", enable),
+        )
+    return label
+
+
+def ffmpeg_write_graph(
+    clip,
+    filename,
+    fps,
+    codec="libx264",
+    bitrate=None,
+    preset="medium",
+    write_logfile=False,
+    audiofile=None,
+    threads=None,
+    ffmpeg_params=None,
+    logger="bar",
+    hls_time=HLS_TIME,
+    hold_frames=False,
+):
+    """Writes ``clip`` with a single ffmpeg command, muxing ``audiofile``.
+    Returns False (and writes nothing) if the clip has no ffmpeg equivalent.
+    """
+    logger = default_bar_logger(logger)
+    tempdir = tempfile.mkdtemp(prefix="moviepy_graph_")
+    try:
+        graph = FilterGraph(tempdir)
+        try:
+            label = compile_clip(graph, clip, fps, clip.duration)
+            filters, ffmpeg_params = split_video_filters(ffmpeg_params)
+        except Unsupported:
+            return False
+        for chain in filters:
+            label = graph.add_filter([label], chain)
+
+        vfr = hold_frames and filename.split(".")[-1].lower() in GRAPH_VFR_EXTENSIONS
+        if vfr:
+            # Drops the exact duplicates, at most MAX_HOLD seconds in a row,
+            # but keeps the first frames (the frame rate is guessed from
+            # them) and the last one, which ends the video. A frame kept
+            # twice has the same time, and is selected once. (``interleave``
+            # works in AV_TIME_BASE, whose frame durations must be exact.)
+            frames, kept = graph.split(label)
+            frames = graph.add_filter(
+                [frames],
+                "mpdecimate=hi=0:lo=0:frac=0:max=%d,settb=AVTB"
+                % (max(1, round(MAX_HOLD * fps)) - 1),
+            )
+            kept = graph.add_filter(
+                [kept],
+                "select='lt(n,3)+eq(n,%d)',settb=AVTB" % (frame_count(clip.duration, fps) - 1),
+            )
+            label = graph.add_filter(
+                [frames, kept],
+                "interleave,select='not(lte(t,prev_selected_t))',settb=%s" % (1 / exact_rate(fps)),
+            )
+
+        cmd = [get_setting("FFMPEG_BINARY"), "-y", "-loglevel", "error"]
+        if audiofile is not None:
+            audio = graph.add_input("-i", audiofile)
+        cmd += graph.args() + ["-map", "[%s]" % label]
+        if audiofile is not None:
+            cmd += ["-map", "%d:a" % audio, "-acodec", "copy"]
+        if vfr:
+            cmd += vfr_params()
+        cmd += output_params(
+            filename, clip.size, codec, preset, bitrate, threads, ffmpeg_params, hls_time
+        )
+
+        logger(message="Moviepy - Writing video %s (ffmpeg filter graph)\n" % filename)
+        logfile = open(filename + ".log", "w+") if write_logfile else None
+        popen_params = {"stdout": DEVNULL, "stderr": logfile or sp.PIPE, "stdin": DEVNULL}
+
+        if os.name == "nt":
+            popen_params["creationflags"] = 0x08000000
+
+        proc = sp.Popen(cmd, **popen_params)
+        _, error = proc.communicate()
+        if logfile is not None:
+            logfile.close()
+        if proc.returncode:
+            raise IOError(
+                "MoviePy error: FFMPEG encountered the following error while "
+                "writing file %s:\n\n%s" % (filename, error and error.decode("utf8"))
+            )
+    finally:
+        shutil.rmtree(tempdir, ignore_errors=True)
+    logger(message="Moviepy - Done !")
+    return True
@@ -0,0 +1,396 @@
+"""Cached media probing shared by the video and audio readers.
+
+Files are probed once with ``ffprobe -print_format json`` (or, if ffprobe
+is not available, by parsing the output of ``ffmpeg -i``). The resulting
+MediaInfo is kept in memory (the MEMORY_CACHE_SIZE most recently used
+values) and in an on-disk cache keyed by the path, the size and the
+modification time of the file, so a file is only probed again when it
+changes.
+"""
+
+import hashlib, json, os, re, threading
+import subprocess as sp
+from collections import OrderedDict
+from fractions import Fraction
+from moviepy.compat import DEVNULL
+from moviepy.config import get_setting
+from moviepy.tools import cvsecs
+
+MEMORY_CACHE_SIZE = 1024
+
+_memory_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def media_cache_key(filename):
+    """Returns the (path, size, mtime) key identifying a version of a file."""
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        raise IOError(
+            (
+                "MoviePy error: the file %s could not be found!\n"
+                "Please check that you entered the correct "
+                "path."
+            )
+            % filename
+        )
+    return (os.path.abspath(filename), stat.st_size, stat.st_mtime_ns)
+
+
+def _cache_path(kind, key):
+    directory = get_setting("PROBE_CACHE_DIR")
+    if not directory:
+        return None
+    digest = hashlib.sha1(repr(key).encode("utf8")).hexdigest()
+    return os.path.join(directory, "%s_%s.json" % (kind, digest))
+
+
+def cache_get(kind, key):
+    """Returns the value cached for ``(kind, key)``, or None."""
+    with _lock:
+        if (kind, key) in _memory_cache:
+            _memory_cache.move_to_end((kind, key))
+            return _memory_cache[kind, key]
+    path = _cache_path(kind, key)
+    if path is None or not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            value = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+    _remember(kind, key, value)
+    return value
+
+
+def _remember(kind, key, value):
+    with _lock:
+        _memory_cache[kind, key] = value
+        _memory_cache.move_to_end((kind, key))
+        while len(_memory_cache) > MEMORY_CACHE_SIZE:
+            _memory_cache.popitem(last=False)
+
+
+def cache_put(kind, key, value):
+    """Caches a JSON-serializable value in memory and on disk."""
+    _remember(kind, key, value)
+    path = _cache_path(kind, key)
+    if path is None:
+        return
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp = "%s.%d.tmp" % (path, os.getpid())
+        with open(temp, "w") as f:
+            json.dump(value, f)
+        os.replace(temp, path)
+    except (IOError, OSError):
+        pass
+
+
+class MediaInfo:
+    """Metadata of a media file.
+
+    ``video_rate`` is the rate ffmpeg reports as ``tbr`` (ffprobe's
+    ``r_frame_rate``) and ``video_avg_rate`` the one it reports as ``fps``
+    (``avg_frame_rate``). Fields which could not be determined are None.
+    """
+
+    def __init__(
+        self,
+        filename,
+        duration=None,
+        video_found=False,
+        video_size=None,
+        video_rate=None,
+        video_avg_rate=None,
+        video_nframes=None,
+        video_rotation=0,
+        audio_found=False,
+        audio_fps=None,
+        audio_nchannels=None,
+        audio_codec=None,
+    ):
+        self.filename = filename
+        self.duration = duration
+        self.video_found = video_found
+        self.video_size = video_size
+        self.video_rate = video_rate
+        self.video_avg_rate = video_avg_rate
+        self.video_nframes = video_nframes
+        self.video_rotation = video_rotation
+        self.audio_found = audio_found
+        self.audio_fps = audio_fps
+        self.audio_nchannels = audio_nchannels
+        self.audio_codec = audio_codec
+
+    def to_json(self):
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(**data)
+
+    def video_fps(self, fps_source="tbr"):
+        rates = [self.video_rate, self.video_avg_rate]
+        if fps_source == "fps":
+            rates.reverse()
+        fps = next((r for r in rates if r), None)
+        if fps is None:
+            return None
+
+        coef = 1000.0 / 1001.0
+        for x in [23, 24, 25, 30, 50]:
+            if (fps != x) and abs(fps - x * coef) < 0.01:
+                fps = x * coef
+        return fps
+
+    def to_infos(self, check_duration=True, fps_source="tbr"):
+        """Returns the dictionary formerly built by ``ffmpeg_parse_infos``."""
+        result = {"duration": None}
+
+        if check_duration:
+            if self.duration is None:
+                raise IOError(
+                    "MoviePy error: failed to read the duration of file %s."
+                    % self.filename
+                )
+            result["duration"] = self.duration
+
+        result["video_found"] = self.video_found
+
+        if self.video_found:
+            result["video_size"] = list(self.video_size)
+            result["video_fps"] = self.video_fps(fps_source)
+            if result["video_fps"] is None:
+                raise IOError(
+                    "MoviePy error: failed to read the frame rate of file %s."
+                    % self.filename
+                )
+
+            if check_duration:
+                result["video_nframes"] = (
+                    int(result["duration"] * result["video_fps"]) + 1
+                )
+                result["video_duration"] = result["duration"]
+            else:
+                result["video_nframes"] = 1
+                result["video_duration"] = None
+
+            result["video_rotation"] = self.video_rotation
+
+        result["audio_found"] = self.audio_found
+
+        if self.audio_found:
+            result["audio_fps"] = self.audio_fps or "unknown"
+
+        return result
+
+
+def probe(filename):
+    """Returns the MediaInfo of a file, probing it only if it is not cached."""
+    key = media_cache_key(filename)
+    data = cache_get("probe", key)
+    if data is not None:
+        return MediaInfo.from_json(data)
+
+    info = ffprobe_media_info(filename)
+    if info is None:  # no usable ffprobe binary next to ffmpeg
+        info = ffmpeg_media_info(filename)
+
+    cache_put("probe", key, info.to_json())
+    return info
+
+
+def _rate(value):
+    try:
+        rate = Fraction(value)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    return float(rate) if rate > 0 else None
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def ffprobe_media_info(filename):
+    """Probes a file with ffprobe. Returns None if ffprobe cannot be run,
+    raises IOError if it fails to read the file."""
+    is_GIF = filename.endswith(".gif")
+    cmd = [
+        get_setting("FFPROBE_BINARY"),
+        "-v",
+        "error",
+        "-print_format",
+        "json",
+        "-show_format",
+        "-show_streams",
+    ]
+    if is_GIF:
+        # Counts the packets (one per frame) without decoding them.
+        cmd += ["-count_packets"]
+    cmd += [filename]
+
+    popen_params = {"stdout": sp.PIPE, "stderr": sp.PIPE, "stdin": DEVNULL}
+
+    if os.name == "nt":
+        popen_params["creationflags"] = 0x08000000
+
+    try:
+        proc = sp.Popen(cmd, **popen_params)
+    except (FileNotFoundError, PermissionError):
+        return None
+    output, error = proc.communicate()
+    if proc.returncode:
+        raise IOError(
+            "MoviePy error: ffprobe failed to read file %s:\n\n%s"
+            % (filename, error.decode("utf8"))
+        )
+
+    data = json.loads(output.decode("utf8"))
+    streams = data.get("streams", [])
+    info = MediaInfo(filename, duration=_float(data.get("format", {}).get("duration")))
+
+    video = [
+        s
+        for s in streams
+        if s.get("codec_type") == "video"
+        and s.get("width")
+        and not s.get("disposition", {}).get("attached_pic")
+    ]
+    if video:
+        stream = video[0]
+        info.video_found = True
+        info.video_size = [stream["width"], stream["height"]]
+        info.video_rate = _rate(stream.get("r_frame_rate"))
+        info.video_avg_rate = _rate(stream.get("avg_frame_rate"))
+        nframes = stream.get("nb_read_packets") or stream.get("nb_frames")
+        info.video_nframes = int(nframes) if nframes else None
+
+        rotation = stream.get("tags", {}).get("rotate")
+        if rotation is not None:
+            info.video_rotation = int(rotation) % 360
+        for side_data in stream.get("side_data_list", []):
+            if "rotation" in side_data:
+                # The display matrix rotates the other way round.
+                info.video_rotation = int(-float(side_data["rotation"])) % 360
+
+        if info.duration is None:
+            info.duration = _float(stream.get("duration"))
+        if info.duration is None and info.video_nframes and info.video_rate:
+            info.duration = info.video_nframes / info.video_rate
+
+    audio = [s for s in streams if s.get("codec_type") == "audio"]
+    if audio:
+        stream = audio[0]
+        info.audio_found = True
+        info.audio_fps = int(stream["sample_rate"]) if "sample_rate" in stream else None
+        info.audio_nchannels = stream.get("channels")
+        info.audio_codec = stream.get("codec_name")
+        if info.duration is None:
+            info.duration = _float(stream.get("duration"))
+
+    return info
+
+
+def ffmpeg_media_info(filename):
+    """Probes a file by parsing the output of ``ffmpeg -i``."""
+    is_GIF = filename.endswith(".gif")
+    cmd = [get_setting("FFMPEG_BINARY"), "-i", filename]
+    if is_GIF:
+        cmd += ["-f", "null", "/dev/null"]
+
+    popen_params = {
+        "bufsize": 10**5,
+        "stdout": sp.PIPE,
+        "stderr": sp.PIPE,
+        "stdin": DEVNULL,
+    }
+
+    if os.name == "nt":
+        popen_params["creationflags"] = 0x08000000
+
+    proc = sp.Popen(cmd, **popen_params)
+    (output, error) = proc.communicate()
+    infos = error.decode("utf8")
+
+    del proc
+
+    lines = infos.splitlines()
+    if "No such file or directory" in lines[-1]:
+        raise IOError(
+            (
+                "MoviePy error: the file %s could not be found!\n"
+                "Please check that you entered the correct "
+                "path."
+            )
+            % filename
+        )
+
+    info = MediaInfo(filename)
+
+    try:
+        keyword = "frame=" if is_GIF else "Duration: "
+        index = -1 if is_GIF else 0
+        line = [l for l in lines if keyword in l][index]
+        match = re.findall("([0-9][0-9]:[0-9][0-9]:[0-9][0-9].[0-9][0-9])", line)[0]
+        info.duration = cvsecs(match)
+    except IndexError:
+        pass
+
+    lines_video = [l for l in lines if " Video: " in l and re.search(r"\d+x\d+", l)]
+
+    if lines_video:
+        info.video_found = True
+        line = lines_video[0]
+        try:
+            match = re.search(" [0-9]*x[0-9]*(,| )", line)
+            info.video_size = list(
+                map(int, line[match.start() : match.end() - 1].split("x"))
+            )
+        except Exception:
+            raise IOError(
+                (
+                    "MoviePy error: failed to read video dimensions in file %s.\n"
+                    "Here are the file infos returned by ffmpeg:\n\n%s"
+                )
+                % (filename, infos)
+            )
+
+        match = re.search("( [0-9]*.| )[0-9]* tbr", line)
+        if match:
+            s_tbr = line[match.start() : match.end()].split(" ")[1]
+            if "k" in s_tbr:
+                info.video_rate = float(s_tbr.replace("k", "")) * 1000
+            else:
+                info.video_rate = float(s_tbr)
+
+        match = re.search("( [0-9]*.| )[0-9]* fps", line)
+        if match:
+            info.video_avg_rate = float(
+                line[match.start() : match.end()].split(" ")[1]
+            )
+
+        rotation_lines = [
+            l for l in lines if "rotate          :" in l and re.search(r"\d+$", l)
+        ]
+        if rotation_lines:
+            match = re.search(r"\d+$", rotation_lines[0])
+            info.video_rotation = int(rotation_lines[0][match.start() : match.end()])
+
+    lines_audio = [l for l in lines if " Audio: " in l]
+
+    if lines_audio:
+        info.audio_found = True
+        match = re.search(r" Audio: (\w+)", lines_audio[0])
+        if match:
+            info.audio_codec = match.group(1)
+        match = re.search(" [0-9]* Hz", lines_audio[0])
+        if match:
+            info.audio_fps = int(lines_audio[0][match.start() + 1 : match.end() - 3])
+
+    return info
@@ -1,14 +1,83 @@
 from __future__ import division
-import logging, os, re, warnings
+import json, logging, math, os, threading, warnings
 import subprocess as sp
+from collections import deque
+from contextlib import contextmanager
 import numpy as np
 from moviepy.compat import DEVNULL, PY3
 from moviepy.config import get_setting  # ffmpeg, ffmpeg.exe, etc...
-from moviepy.tools import cvsecs
+from moviepy.tools import exact_rate
+from moviepy.video.io.ffmpeg_probe import cache_get, cache_put, media_cache_key, probe
+from moviepy.video.io.reader_pool import default_pool
+from moviepy.video.preview import preview_scale, scale_length
 
 logging.captureWarnings(True)
 
 
+class FrameBufferPool:
+    """A ring of preallocated frame buffers that readers fill in place.
+
+    ``lease()`` hands out the buffer that was released the longest time ago
+    and ``release()`` gives it back, so the frame a reader has just replaced
+    stays untouched until ``nbuffers - 1`` further frames have been read.
+    Consumers which keep frames for longer must copy them, as VideoFileClip
+    does (see ``borrowed_frames``). Frames which are read only to be thrown
+    away go to a separate scratch buffer.
+    """
+
+    def __init__(self, shape, nbuffers=3):
+        self.shape = shape
+        self.buffers = []
+        self.views = []
+        self.free = deque()
+        for i in range(nbuffers):
+            self.free.append(self._allocate())
+        self.scratch = np.empty(shape, dtype="uint8")
+        self.scratch_view = memoryview(self.scratch).cast("B")
+
+    def _allocate(self):
+        buf = np.empty(self.shape, dtype="uint8")
+        self.buffers.append(buf)
+        self.views.append(memoryview(buf).cast("B"))
+        return len(self.buffers) - 1
+
+    def lease(self):
+        """Returns the index of a buffer the caller now owns."""
+        return self.free.popleft() if self.free else self._allocate()
+
+    def release(self, index):
+        self.free.append(index)
+
+    def frame(self, index):
+        """Returns a read-only array over the buffer ``index``."""
+        frame = self.buffers[index].view()
+        frame.flags.writeable = False
+        return frame
+
+
+_borrowing = threading.local()
+
+
+@contextmanager
+def borrowed_frames():
+    """Within the block, the frames of the VideoFileClips of this thread
+    are the read-only buffers of their readers (see FrameBufferPool), not
+    copies: for consumers which are done with a frame before they read the
+    next ones, such as the writers."""
+    depth = getattr(_borrowing, "depth", 0)
+    _borrowing.depth = depth + 1
+    try:
+        yield
+    finally:
+        _borrowing.depth = depth
+
+
+def owned_frame(frame):
+    """Returns a frame of a reader as the clips give it: a copy, unless
+    frames are borrowed."""
+    return frame if getattr(_borrowing, "depth", 0) else frame.copy()
+
+
 class FFMPEG_VideoReader:
     def __init__(
         self,
@@ -20,14 +89,28 @@ class FFMPEG_VideoReader:
         target_resolution=None,
         resize_algo="bicubic",
         fps_source="tbr",
+        skip_threshold=10,
+        frame_buffers=3,
+        pool=default_pool,
     ):
         self.filename = filename
         self.proc = None
+        self.pool = pool
+        self.skip_threshold = skip_threshold
+        self._keyframes = None
         infos = ffmpeg_parse_infos(filename, print_infos, check_duration, fps_source)
         self.fps = infos["video_fps"]
+        self.rate = exact_rate(self.fps)
         self.size = infos["video_size"]
         self.rotation = infos["video_rotation"]
 
+        scale = preview_scale()
+        if scale != 1:
+            target_resolution = [
+                None if l is None else scale_length(l, scale)
+                for l in (target_resolution or self.size[::-1])
+            ]
+
         if target_resolution:
             target_resolution = target_resolution[1], target_resolution[0]
 
@@ -55,17 +138,22 @@ class FFMPEG_VideoReader:
             bufsize = self.depth * w * h + 100
 
         self.bufsize = bufsize
-        self.initialize()
-
+        w, h = self.size
+        self.frame_pool = FrameBufferPool((h, w, self.depth), frame_buffers)
+        self._lease = None
+        # The ffmpeg process is only started by the first get_frame.
         self.pos = 1
-        self.lastread = self.read_frame()
 
     def initialize(self, starttime=0):
         """Opens the file, creates the pipe."""
 
         self.close()  # if any
 
-        if starttime != 0:
+        if starttime != 0 and self.keyframe_index() is not None:
+            # ffmpeg seeks to the keyframe preceding starttime and decodes
+            # forward from there, so no pre-roll is needed.
+            i_arg = ["-ss", "%.06f" % starttime, "-i", self.filename]
+        elif starttime != 0:
             offset = min(1, starttime)
             i_arg = [
                 "-ss",
@@ -108,23 +196,39 @@ class FFMPEG_VideoReader:
             popen_params["creationflags"] = 0x08000000
 
         self.proc = sp.Popen(cmd, **popen_params)
+        self.pool.touch(self)
+
+    def _readinto(self, view):
+        nread = 0
+        while nread < len(view):
+            n = self.proc.stdout.readinto(view[nread:] if nread else view)
+            if not n:
+                break
+            nread += n
+        return nread
 
     def skip_frames(self, n=1):
         """Reads and throws away n frames"""
-        w, h = self.size
         for i in range(n):
-            self.proc.stdout.read(self.depth * w * h)
+            self._readinto(self.frame_pool.scratch_view)
         self.pos += n
 
     def read_frame(self):
+        """Reads the next frame into a buffer of the frame pool.
+
+        The returned array is read-only and owned by the reader: it remains
+        valid until ``frame_buffers - 1`` more frames have been read.
+        """
         w, h = self.size
         nbytes = self.depth * w * h
 
-        s = self.proc.stdout.read(nbytes)
-        if len(s) != nbytes:
+        index = self.frame_pool.lease()
+        nread = self._readinto(self.frame_pool.views[index])
+        if nread != nbytes:
+            self.frame_pool.release(index)
             warnings.warn(
                 "Warning: in file %s, " % (self.filename)
-                + "%d bytes wanted but %d bytes read," % (nbytes, len(s))
+                + "%d bytes wanted but %d bytes read," % (nbytes, nread)
                 + "at frame %d/%d, at time %.02f/%.02f sec. "
                 % (self.pos, self.nframes, 1.0 * self.pos / self.fps, self.duration)
                 + "Using the last valid frame instead.",
@@ -147,209 +251,180 @@ class FFMPEG_VideoReader:
             result = self.lastread
 
         else:
-            if hasattr(np, "frombuffer"):
-                result = np.frombuffer(s, dtype="uint8")
-            else:
-                result = np.fromstring(s, dtype="uint8")
-            result.shape = (h, w, len(s) // (w * h))  # reshape((h, w, len(s)//(w*h)))
+            if self._lease is not None:
+                self.frame_pool.release(self._lease)
+            self._lease = index
+            result = self.frame_pool.frame(index)
             self.lastread = result
 
         return result
 
+    def keyframe_index(self):
+        """Returns the (1-based) frame positions of the keyframes of the
+        file, or None if the file could not be indexed."""
+        if self._keyframes is None:
+            times = ffmpeg_keyframe_times(self.filename)
+            if times is None or not len(times):
+                self._keyframes = False
+            else:
+                self._keyframes = (self.fps * times + 0.00001).astype(int) + 1
+        return self._keyframes if self._keyframes is not False else None
+
+    def keyframe_before(self, pos):
+        """Returns the position of the last keyframe at or before ``pos``."""
+        keyframes = self.keyframe_index()
+        if keyframes is None:
+            return None
+        i = np.searchsorted(keyframes, pos, side="right")
+        return keyframes[i - 1] if i else 1
+
+    def _can_skip_to(self, pos):
+        if pos - self.pos <= self.skip_threshold:
+            return True
+        keyframe = self.keyframe_before(pos)
+        if keyframe is None:
+            return pos <= self.pos + 100
+        # A seek has to decode from the keyframe preceding pos anyway, so
+        # reading forward is never slower while that keyframe is behind us.
+        return keyframe <= self.pos
+
+    def _seek(self, pos, t):
+        if self.keyframe_index() is not None:
+            # Start a quarter frame early so that rounding cannot drop the
+            # requested frame (half a frame makes ffmpeg duplicate it).
+            t = max(0, (pos - 1.25) / self.fps)
+        self.initialize(t)
+        self.pos = pos
+
     def get_frame(self, t):
-        pos = int(self.fps * t + 0.00001) + 1
+        return self._read_at(int(self.fps * t + 0.00001) + 1, t)
+
+    def frame_index(self, n, fps):
+        """Returns the index (from 0) of the frame of the file shown at the
+        time ``n / fps``, computed exactly."""
+        return math.floor(n * self.rate / fps)
 
-        if not self.proc:
-            self.initialize(t)
-            self.pos = pos
-            self.lastread = self.read_frame()
+    def get_frame_at_index(self, i):
+        """Returns the frame ``i`` (from 0) of the file."""
+        return self._read_at(i + 1, float(i / self.rate))
 
-        if pos == self.pos:
+    def _read_at(self, pos, t):
+        if pos == self.pos and self._lease is not None:
             return self.lastread
-        elif (pos < self.pos) or (pos > self.pos + 100):
-            self.initialize(t)
-            self.pos = pos
+        elif not self.proc:
+            # Never opened, or suspended by the reader pool.
+            self._seek(pos, t)
+        elif (pos < self.pos) or not self._can_skip_to(pos):
+            self._seek(pos, t)
         else:
+            self.pool.touch(self)
             self.skip_frames(pos - self.pos - 1)
         result = self.read_frame()
         self.pos = pos
         return result
 
-    def close(self):
+    def close_proc(self):
+        """Terminates the ffmpeg process but keeps the last frame read."""
         if self.proc:
             self.proc.terminate()
             self.proc.stdout.close()
             self.proc.stderr.close()
             self.proc.wait()
             self.proc = None
+        if getattr(self, "pool", None) is not None:
+            self.pool.forget(self)
+
+    def close(self):
+        self.close_proc()
         if hasattr(self, "lastread"):
             del self.lastread
+        if getattr(self, "_lease", None) is not None:
+            self.frame_pool.release(self._lease)
+            self._lease = None
 
     def __del__(self):
         self.close()
 
 
+def ffmpeg_keyframe_times(filename):
+    """Returns the sorted times (in seconds from the first frame) of the
+    keyframes of the first video stream of a file, or None if the file
+    could not be scanned.
+
+    The packets are read without decoding (stream copy to ffmpeg's
+    ``framecrc`` muxer) and the result is cached per file version.
+    """
+    try:
+        key = media_cache_key(filename)
+    except IOError:
+        return None
+    cached = cache_get("keyframes", key)
+    if cached is not None:
+        return np.array(cached["times"]) if cached["times"] is not None else None
+
+    cmd = [
+        get_setting("FFMPEG_BINARY"),
+        "-loglevel",
+        "error",
+        "-i",
+        filename,
+        "-map",
+        "0:v:0",
+        "-c",
+        "copy",
+        "-f",
+        "framecrc",
+        "-",
+    ]
+    popen_params = {"stdout": sp.PIPE, "stderr": sp.PIPE, "stdin": DEVNULL}
+
+    if os.name == "nt":
+        popen_params["creationflags"] = 0x08000000
+
+    proc = sp.Popen(cmd, **popen_params)
+    output, error = proc.communicate()
+
+    times = None
+    if proc.returncode == 0:
+        timebase, first, keyframes = None, None, []
+        for line in output.decode("utf8").splitlines():
+            if line.startswith("#tb 0:"):
+                num, den = line.split(":")[1].split("/")
+                timebase = float(num) / float(den)
+            elif line and not line.startswith("#"):
+                fields = [f.strip() for f in line.split(",")]
+                pts = int(fields[2])
+                if pts < -(2**62):  # AV_NOPTS_VALUE
+                    continue
+                first = pts if first is None else min(first, pts)
+                # framecrc only prints the flags of non-keyframe packets.
+                if not any(f.startswith("F=") for f in fields[6:]):
+                    keyframes.append(pts)
+        if timebase is not None and keyframes:
+            times = np.unique(timebase * (np.array(keyframes) - first))
+
+    cache_put("keyframes", key, {"times": None if times is None else times.tolist()})
+    return times
+
+
 def ffmpeg_read_image(filename, with_mask=True):
     pix_fmt = "rgba" if with_mask else "rgb24"
     reader = FFMPEG_VideoReader(filename, pix_fmt=pix_fmt, check_duration=False)
-    im = reader.lastread
-    del reader
+    im = reader.get_frame(0)
+    reader.close()
     return im
 
 
 def ffmpeg_parse_infos(
     filename, print_infos=False, check_duration=True, fps_source="tbr"
 ):
+    """Returns a dictionary of metadata of a media file.
 
-    is_GIF = filename.endswith(".gif")
-    cmd = [get_setting("FFMPEG_BINARY"), "-i", filename]
-    if is_GIF:
-        cmd += ["-f", "null", "/dev/null"]
-
-    popen_params = {
-        "bufsize": 10**5,
-        "stdout": sp.PIPE,
-        "stderr": sp.PIPE,
-        "stdin": DEVNULL,
-    }
-
-    if os.name == "nt":
-        popen_params["creationflags"] = 0x08000000
-
-    proc = sp.Popen(cmd, **popen_params)
-    (output, error) = proc.communicate()
-    infos = error.decode("utf8")
-
-    del proc
+    The file is probed at most once per version (see ``ffmpeg_probe``).
+    """
+    info = probe(filename)
 
     if print_infos:
-        print(infos)
-
-    lines = infos.splitlines()
-    if "No such file or directory" in lines[-1]:
-        raise IOError(
-            (
-                "MoviePy error: the file %s could not be found!\n"
-                "Please check that you entered the correct "
-                "path."
-            )
-            % filename
-        )
-
-    result = dict()
-
-    result["duration"] = None
-
-    if check_duration:
-        try:
-            keyword = "frame=" if is_GIF else "Duration: "
-            index = -1 if is_GIF else 0
-            line = [l for l in lines if keyword in l][index]
-            match = re.findall("([0-9][0-9]:[0-9][0-9]:[0-9][0-9].[0-9][0-9])", line)[0]
-            result["duration"] = cvsecs(match)
-        except:
-            raise IOError(
-                (
-                    "MoviePy error: failed to read the duration of file %s.\n"
-                    "Here are the file infos returned by ffmpeg:\n\n%s"
-                )
-                % (filename, infos)
-            )
-
-    lines_video = [l for l in lines if " Video: " in l and re.search("\d+x\d+", l)]
-
-    result["video_found"] = lines_video != []
-
-    if result["video_found"]:
-        try:
-            line = lines_video[0]
-
-            match = re.search(" [0-9]*x[0-9]*(,| )", line)
-            s = list(map(int, line[match.start() : match.end() - 1].split("x")))
-            result["video_size"] = s
-        except:
-            raise IOError(
-                (
-                    "MoviePy error: failed to read video dimensions in file %s.\n"
-                    "Here are the file infos returned by ffmpeg:\n\n%s"
-                )
-                % (filename, infos)
-            )
-
-        def get_tbr():
-            match = re.search("( [0-9]*.| )[0-9]* tbr", line)
-
-            s_tbr = line[match.start() : match.end()].split(" ")[1]
-            if "k" in s_tbr:
-                tbr = float(s_tbr.replace("k", "")) * 1000
-            else:
-                tbr = float(s_tbr)
-            return tbr
-
-        def get_fps():
-            match = re.search("( [0-9]*.| )[0-9]* fps", line)
-            fps = float(line[match.start() : match.end()].split(" ")[1])
-            return fps
-
-        if fps_source == "tbr":
-            try:
-                result["video_fps"] = get_tbr()
-            except:
-                result["video_fps"] = get_fps()
-
-        elif fps_source == "fps":
-            try:
-                result["video_fps"] = get_fps()
-            except:
-                result["video_fps"] = get_tbr()
-
-        coef = 1000.0 / 1001.0
-        fps = result["video_fps"]
-        for x in [23, 24, 25, 30, 50]:
-            if (fps != x) and abs(fps - x * coef) < 0.01:
-                result["video_fps"] = x * coef
-
-        if check_duration:
-            result["video_nframes"] = int(result["duration"] * result["video_fps"]) + 1
-            result["video_duration"] = result["duration"]
-        else:
-            result["video_nframes"] = 1
-            result["video_duration"] = None
-
-        try:
-            rotation_lines = [
-                l for l in lines if "rotate          :" in l and re.search("\d+$", l)
-            ]
-            if len(rotation_lines):
-                rotation_line = rotation_lines[0]
-                match = re.search("\d+$", rotation_line)
-                result["video_rotation"] = int(
-                    rotation_line[match.start() : match.end()]
-                )
-            else:
-                result["video_rotation"] = 0
-        except:
-            raise IOError(
-                (
-                    "MoviePy error: failed to read video rotation in file %s.\n"
-                    "Here are the file infos returned by ffmpeg:\n\n%s"
-                )
-                % (filename, infos)
-            )
-
-    lines_audio = [l for l in lines if " Audio: " in l]
-
-    result["audio_found"] = lines_audio != []
-
-    if result["audio_found"]:
-        line = lines_audio[0]
-        try:
-            match = re.search(" [0-9]* Hz", line)
-            hz_string = line[
-                match.start() + 1 : match.end() - 3
-            ]  # Removes the 'hz' from the end
-            result["audio_fps"] = int(hz_string)
-        except:
-            result["audio_fps"] = "unknown"
+        print(json.dumps(info.to_json(), indent=2))
 
-    return result
+    return info.to_infos(check_duration, fps_source)
@@ -1,12 +1,93 @@
-import os
+import os, struct
 import subprocess as sp
 import numpy as np
-from proglog import proglog
 from moviepy.compat import DEVNULL, PY3
 from moviepy.config import get_setting
+from moviepy.tools import default_bar_logger, exact_rate, frame_count
+from moviepy.video.io.ffmpeg_reader import borrowed_frames
+from moviepy.video.tools.drawing import mask_to_uint8
+
+# Default duration of the segments of HLS outputs, in seconds.
+HLS_TIME = 4
+
+# Formats whose timestamps can skip the frames identical to the previous
+# one (variable frame rate), and the longest time a frame is held so. Not
+# HLS: the segmenter gets the durations of the segments wrong.
+VFR_EXTENSIONS = ["mp4", "m4v", "mov", "mkv", "webm"]
+MAX_HOLD = 1.0
+
+
+def holds_frames(filename):
+    """Tells whether held frames can be written to ``filename`` as gaps in
+    the timestamps."""
+    return filename.split(".")[-1].lower() in VFR_EXTENSIONS
+
+
+def vfr_params():
+    """Returns the ffmpeg options writing a variable frame rate video
+    (``-vsync`` is deprecated since ffmpeg 5.1). B-frames are turned off:
+    with gaps in the timestamps, the durations ffmpeg derives for them are
+    wrong and so is the length of the file."""
+    version = get_setting("FFMPEG_VERSION")
+    sync = ["-fps_mode", "vfr"] if version and version >= (5, 1) else ["-vsync", "vfr"]
+    return sync + ["-bf", "0"]
+
+
+def hls_params(filename, hls_time=HLS_TIME):
+    """Returns the ffmpeg options writing ``filename`` (a .m3u8 playlist) as
+    HLS: segments of ``hls_time`` seconds named after the playlist, each
+    starting on a keyframe, and a playlist rewritten after every segment and
+    ended (``#EXT-X-ENDLIST``) when the encoding completes."""
+    base = os.path.splitext(filename)[0]
+    return [
+        "-force_key_frames",
+        "expr:gte(t,n_forced*%s)" % hls_time,
+        "-f",
+        "hls",
+        "-hls_time",
+        str(hls_time),
+        "-hls_playlist_type",
+        "event",
+        "-hls_flags",
+        "independent_segments+temp_file",
+        "-hls_segment_filename",
+        base + "_%05d.ts",
+    ]
+
+
+def output_params(
+    filename,
+    size,
+    codec="libx264",
+    preset="medium",
+    bitrate=None,
+    threads=None,
+    ffmpeg_params=None,
+    hls_time=HLS_TIME,
+):
+    """Returns the ffmpeg options encoding the video to ``filename``,
+    ``filename`` included."""
+    cmd = ["-vcodec", codec, "-preset", preset]
+    if ffmpeg_params is not None:
+        cmd.extend(ffmpeg_params)
+    if bitrate is not None:
+        cmd.extend(["-b", bitrate])
+
+    if threads is not None:
+        cmd.extend(["-threads", str(threads)])
+
+    if (codec == "libx264") and (size[0] % 2 == 0) and (size[1] % 2 == 0):
+        cmd.extend(["-pix_fmt", "yuv420p"])
+    if filename.split(".")[-1] == "m3u8":
+        cmd.extend(hls_params(filename, hls_time))
+    cmd.extend([filename])
+    return cmd
 
 
 class FFMPEG_VideoWriter:
+    """Pipes frames to ffmpeg. A ``.m3u8`` filename is written as HLS, see
+    ``hls_params``: the playlist can be played while the video is written."""
+
     def __init__(
         self,
         filename,
@@ -20,6 +101,8 @@ class FFMPEG_VideoWriter:
         logfile=None,
         threads=None,
         ffmpeg_params=None,
+        hls_time=HLS_TIME,
+        hold_frames=False,
     ):
         if logfile is None:
             logfile = sp.PIPE
@@ -27,47 +110,35 @@ class FFMPEG_VideoWriter:
         self.filename = filename
         self.codec = codec
         self.ext = self.filename.split(".")[-1]
+        self.vfr = hold_frames and holds_frames(filename)
+        self.max_gap = max(1, int(round(MAX_HOLD * fps)))
+        self.count = 0  # frames written or held
+        self.sent = -1  # index of the last frame sent to ffmpeg
+        self.last = None  # its bytes
 
         cmd = [
             get_setting("FFMPEG_BINARY"),
             "-y",
             "-loglevel",
             "error" if logfile == sp.PIPE else "info",
-            "-f",
-            "rawvideo",
-            "-vcodec",
-            "rawvideo",
-            "-s",
-            "%dx%d" % (size[0], size[1]),
-            "-pix_fmt",
-            "rgba" if withmask else "rgb24",
-            "-r",
-            "%.02f" % fps,
-            "-an",
-            "-i",
-            "-",
         ]
+        if self.vfr:
+            # IVF: raw frames with their timestamps, see write_frame.
+            cmd += ["-f", "ivf"]
+        else:
+            cmd += ["-f", "rawvideo", "-s", "%dx%d" % (size[0], size[1])]
+            cmd += ["-pix_fmt", "rgba" if withmask else "rgb24"]
+            cmd += ["-r", str(exact_rate(fps))]
+        cmd += ["-vcodec", "rawvideo", "-an", "-i", "-"]
         if audiofile is not None:
             cmd.extend(["-i", audiofile, "-acodec", "copy"])
+        if self.vfr:
+            cmd.extend(vfr_params())
         cmd.extend(
-            [
-                "-vcodec",
-                codec,
-                "-preset",
-                preset,
-            ]
+            output_params(
+                filename, size, codec, preset, bitrate, threads, ffmpeg_params, hls_time
+            )
         )
-        if ffmpeg_params is not None:
-            cmd.extend(ffmpeg_params)
-        if bitrate is not None:
-            cmd.extend(["-b", bitrate])
-
-        if threads is not None:
-            cmd.extend(["-threads", str(threads)])
-
-        if (codec == "libx264") and (size[0] % 2 == 0) and (size[1] % 2 == 0):
-            cmd.extend(["-pix_fmt", "yuv420p"])
-        cmd.extend([filename])
 
         popen_params = {"stdout": DEVNULL, "stderr": logfile, "stdin": sp.PIPE}
 
@@ -75,14 +146,51 @@ class FFMPEG_VideoWriter:
             popen_params["creationflags"] = 0x08000000  # CREATE_NO_WINDOW
 
         self.proc = sp.Popen(cmd, **popen_params)
+        if self.vfr:
+            rate = exact_rate(fps)
+            fourcc = b"RGBA" if withmask else b"RGB\x18"
+            # Signature, version, header size, fourcc, size, time base
+            # (frames of 1 / fps), number of frames (unknown), unused.
+            header = struct.pack(
+                "<4sHH4sHHIIII",
+                b"DKIF",
+                0,
+                32,
+                fourcc,
+                size[0],
+                size[1],
+                rate.numerator,
+                rate.denominator,
+                0,
+                0,
+            )
+            self._write(header)
 
     def write_frame(self, img_array):
         """Writes one frame in the file."""
+        self._send(img_array.tobytes() if PY3 else img_array.tostring())
+
+    def hold_frame(self):
+        """Shows the last frame written for one more frame. With
+        ``hold_frames``, nothing is sent when the output format allows it,
+        except for the first frames and every MAX_HOLD seconds: ffmpeg and
+        the players guess the frame rate of a file from its timestamps."""
+        if self.vfr and self.count >= 3 and self.count - self.sent < self.max_gap:
+            self.count += 1
+        else:
+            self._send(self.last)
+
+    def _send(self, data):
+        if self.vfr:
+            self._write(struct.pack("<IQ", len(data), self.count))
+        self._write(data)
+        self.last = data
+        self.sent = self.count
+        self.count += 1
+
+    def _write(self, data):
         try:
-            if PY3:
-                self.proc.stdin.write(img_array.tobytes())
-            else:
-                self.proc.stdin.write(img_array.tostring())
+            self.proc.stdin.write(data)
         except IOError as err:
             _, ffmpeg_error = self.proc.communicate()
             error = str(err) + (
@@ -132,6 +240,10 @@ class FFMPEG_VideoWriter:
 
     def close(self):
         if self.proc:
+            if self.vfr and self.sent < self.count - 1:
+                # Ends the video with the held frame, at its last time.
+                self.count -= 1
+                self._send(self.last)
             self.proc.stdin.close()
             if self.proc.stderr is not None:
                 self.proc.stderr.close()
@@ -160,8 +272,18 @@ def ffmpeg_write_video(
     threads=None,
     ffmpeg_params=None,
     logger="bar",
+    hls_time=HLS_TIME,
+    hold_frames=False,
 ):
-    logger = proglog.default_bar_logger(logger)
+    """Writes the frames of ``clip`` with FFMPEG_VideoWriter.
+
+    With ``hold_frames``, a frame identical to the previous one is not
+    computed again when the clip tells so (see ``Clip.frame_key``), nor
+    sent to ffmpeg and encoded when the format has variable frame rates
+    (``VFR_EXTENSIONS``): the previous frame is just shown longer. For
+    the other formats its bytes are sent again.
+    """
+    logger = default_bar_logger(logger)
 
     if write_logfile:
         logfile = open(filename + ".log", "w+")
@@ -179,19 +301,33 @@ def ffmpeg_write_video(
         audiofile=audiofile,
         threads=threads,
         ffmpeg_params=ffmpeg_params,
-    ) as writer:
-        nframes = int(clip.duration * fps)
-
-        for t, frame in clip.iter_frames(
-            logger=logger, with_times=True, fps=fps, dtype="uint8"
-        ):
+        hls_time=hls_time,
+        withmask=withmask,
+        hold_frames=hold_frames,
+    ) as writer, borrowed_frames():
+        rate = exact_rate(fps)
+        previous = previous_key = None
+        for n in logger.iter_bar(t=range(frame_count(clip.duration, rate))):
+            key = clip.frame_key(n, rate) if hold_frames else None
+            if withmask and key is not None:
+                mask_key = clip.mask.frame_key(n, rate)
+                key = None if mask_key is None else (key, mask_key)
+            if key is not None and key == previous_key:
+                writer.hold_frame()
+                continue
+
+            frame = clip.get_frame_at_index(n, rate)
+            if frame.dtype != "uint8":
+                frame = frame.astype("uint8")
             if withmask:
-                mask = 255 * clip.mask.get_frame(t)
-                if mask.dtype != "uint8":
-                    mask = mask.astype("uint8")
+                mask = mask_to_uint8(clip.mask.get_frame_at_index(n, rate))
                 frame = np.dstack([frame, mask])
 
-            writer.write_frame(frame)
+            if hold_frames and previous is not None and np.array_equal(frame, previous):
+                writer.hold_frame()
+            else:
+                writer.write_frame(frame)
+            previous, previous_key = frame, key
 
     if write_logfile:
         logfile.close()
@@ -0,0 +1,104 @@
+"""Reading of the images of ImageClip, at the size they are used at.
+
+An image is read from a path or from the bytes of an image file (e.g. a
+download kept in memory). JPEG images are decoded directly at about the
+target size with the DCT scaling of PIL's draft mode, the other formats are
+resized after decoding. The decoded images are kept in an LRU cache of at
+most IMAGE_CACHE_BYTES bytes, keyed by source and size, so clips of the
+same image share a single decode.
+"""
+
+import hashlib, io, os, threading
+from collections import OrderedDict
+import numpy as np
+from ..preview import scale_length
+
+IMAGE_CACHE_BYTES = 256 * 2 ** 20
+
+_images = OrderedDict()
+_cached_bytes = 0
+_lock = threading.Lock()
+
+
+def target_size(width, height, target_resolution=None, scale=1):
+    """Returns the (width, height) of an image of ``width x height`` read
+    at ``target_resolution`` (height, width, one of them None to keep the
+    aspect ratio, as for VideoFileClip) and then scaled by ``scale``."""
+    if target_resolution:
+        h, w = target_resolution
+        if h is None:
+            width, height = w, int(height * w / width)
+        elif w is None:
+            width, height = int(width * h / height), h
+        else:
+            width, height = w, h
+    if scale != 1:
+        width, height = scale_length(width, scale), scale_length(height, scale)
+    return width, height
+
+
+def _open(source):
+    from PIL import Image
+
+    if isinstance(source, (bytes, bytearray)):
+        return Image.open(io.BytesIO(source))
+    return Image.open(source)
+
+
+def imread_scaled(source, scale=1, target_resolution=None):
+    """Reads an image (a path or the bytes of an image file), resized to
+    ``target_resolution`` (see ``target_size``) and by ``scale``."""
+    with _open(source) as im:
+        size = target_size(im.width, im.height, target_resolution, scale)
+        if size == im.size:
+            from imageio import imread
+
+            return imread(source)
+
+        from PIL import Image
+
+        im.draft("RGB" if im.mode == "RGB" else None, size)
+        if im.mode not in ("RGB", "RGBA", "L"):
+            transparent = "transparency" in im.info or im.mode in ("LA", "PA")
+            im = im.convert("RGBA" if transparent else "RGB")
+        return np.asarray(im.resize(size, Image.BICUBIC))
+
+
+def source_key(source):
+    """Returns the cache key of a path (which changes with the file) or of
+    the bytes of an image file."""
+    if isinstance(source, (bytes, bytearray)):
+        return ("bytes", hashlib.blake2b(source, digest_size=16).hexdigest())
+    stat = os.stat(source)
+    return (os.path.abspath(source), stat.st_size, stat.st_mtime_ns)
+
+
+def read_image(source, scale=1, target_resolution=None):
+    """Cached ``imread_scaled``. The returned array is read-only as it is
+    shared with the cache."""
+    global _cached_bytes
+    key = (source_key(source), scale, None if target_resolution is None else tuple(target_resolution))
+    with _lock:
+        if key in _images:
+            _images.move_to_end(key)
+            return _images[key]
+
+    img = imread_scaled(source, scale, target_resolution)
+    img.flags.writeable = False
+    if img.nbytes > IMAGE_CACHE_BYTES:
+        return img
+    with _lock:
+        if key in _images:
+            return _images[key]
+        _images[key] = img
+        _cached_bytes += img.nbytes
+        while _cached_bytes > IMAGE_CACHE_BYTES:
+            _cached_bytes -= _images.popitem(last=False)[1].nbytes
+    return img
+
+
+def clear_image_cache():
+    global _cached_bytes
+    with _lock:
+        _images.clear()
+        _cached_bytes = 0
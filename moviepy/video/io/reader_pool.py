@@ -0,0 +1,59 @@
+"""Caps the number of ffmpeg decoding processes alive at the same time."""
+
+import threading, weakref
+from collections import OrderedDict
+from moviepy.config import get_setting
+
+
+class ReaderPool:
+    """Tracks the readers (video or audio) which have a live ffmpeg process.
+
+    Readers call ``touch`` each time they use their process, and ``forget``
+    when they close it. When more than ``max_live`` readers are alive, the
+    ones which have been idle the longest are suspended through their
+    ``close_proc`` method; they keep their position and reopen their process
+    on their next read. The pool only holds weak references to readers.
+    """
+
+    def __init__(self, max_live=None):
+        self.max_live = max_live
+        self.live = OrderedDict()
+        self.lock = threading.RLock()
+
+    def get_max_live(self):
+        if self.max_live is not None:
+            return self.max_live
+        return get_setting("MAX_LIVE_READERS")
+
+    def touch(self, reader):
+        """Marks ``reader`` as the most recently used live reader."""
+        key = id(reader)
+        with self.lock:
+            if key in self.live:
+                self.live.move_to_end(key)
+                return
+            self.live[key] = weakref.ref(reader, lambda ref: self._discard(key, ref))
+            evicted = []
+            while len(self.live) > max(1, self.get_max_live()):
+                oldest_key, ref = next(iter(self.live.items()))
+                del self.live[oldest_key]
+                evicted.append(ref())
+
+        for idle in evicted:
+            if idle is not None:
+                idle.close_proc()
+
+    def forget(self, reader):
+        with self.lock:
+            self.live.pop(id(reader), None)
+
+    def _discard(self, key, ref):
+        with self.lock:
+            if self.live.get(key) is ref:
+                del self.live[key]
+
+    def __len__(self):
+        return len(self.live)
+
+
+default_pool = ReaderPool()
@@ -0,0 +1,87 @@
+"""Low-resolution preview rendering.
+
+While a preview is active, video files, images and texts are decoded (or
+rasterized) at a fraction of their size, absolute positions are scaled
+accordingly, and ``write_videofile`` renders at a reduced frame rate with a
+fast encoder preset. The timeline itself is built by the same code as for a
+full render::
+
+    >>> with preview_mode(scale=0.25, fps=12):
+    ...     build_timeline().write_videofile("preview.mp4")
+
+Sizes passed explicitly in pixels (e.g. to ``ColorClip`` or to
+``CompositeVideoClip``) are used as they are.
+"""
+
+from contextlib import contextmanager
+
+PREVIEW_PRESET = "ultrafast"
+PREVIEW_SCALE = 0.25
+PREVIEW_FPS = 12
+
+_settings = {"active": False, "scale": 1, "fps": None}
+
+
+def set_preview(scale=PREVIEW_SCALE, fps=PREVIEW_FPS):
+    """Turns the preview mode on, or off with ``set_preview(None)``.
+
+    ``scale=1`` keeps the sources at full size but still renders at the
+    preview frame rate and preset, e.g. for clips which were already
+    rendered as previews.
+    """
+    if scale is None:
+        _settings.update(active=False, scale=1, fps=None)
+    else:
+        _settings.update(active=True, scale=scale, fps=fps)
+
+
+@contextmanager
+def preview_mode(scale=PREVIEW_SCALE, fps=PREVIEW_FPS):
+    """Context manager version of ``set_preview``."""
+    previous = dict(_settings)
+    set_preview(scale, fps)
+    try:
+        yield
+    finally:
+        _settings.update(previous)
+
+
+def preview_scale():
+    """Returns the factor by which sources are currently downscaled."""
+    return _settings["scale"]
+
+
+def scale_length(length, scale=None):
+    """Scales a length in pixels, rounding to an even number (as required
+    by most encoders)."""
+    scale = preview_scale() if scale is None else scale
+    return max(2, int(round(length * scale / 2.0)) * 2)
+
+
+def scale_position(pos, scale=None):
+    scale = preview_scale() if scale is None else scale
+    if isinstance(pos, str):
+        return pos
+    return [p if isinstance(p, str) else p * scale for p in pos]
+
+
+def preview_write_options(preview, fps, preset, ffmpeg_params):
+    """Returns the ``(fps, preset, ffmpeg_params)`` to encode with.
+
+    ``preview=None`` follows ``set_preview``/``preview_mode``, in which case
+    the sources are already downscaled. ``preview=True`` (or a scale)
+    previews a clip built at full size: the frames are then downscaled by
+    the encoder, which still saves most of the encoding time.
+    """
+    if preview is None:
+        if not _settings["active"]:
+            return fps, preset, ffmpeg_params
+        return min(fps, _settings["fps"] or fps), PREVIEW_PRESET, ffmpeg_params
+
+    if not preview:
+        return fps, preset, ffmpeg_params
+
+    scale = PREVIEW_SCALE if preview is True else preview
+    scale_filter = "scale=trunc(iw*%f/2)*2:trunc(ih*%f/2)*2" % (scale, scale)
+    ffmpeg_params = list(ffmpeg_params or []) + ["-vf", scale_filter]
+    return min(fps, PREVIEW_FPS), PREVIEW_PRESET, ffmpeg_params
@@ -1,4 +1,56 @@
 import numpy as np
+from moviepy.config import get_setting
+
+# Mask frames are either uint8 arrays (255 is opaque) or float arrays (1.0
+# is opaque). Masks created by MoviePy use the MASK_DTYPE setting, and the
+# functions below accept both.
+
+
+def mask_dtype():
+    return np.dtype(get_setting("MASK_DTYPE"))
+
+
+def alpha_to_mask(alpha):
+    """Returns the mask frame for a uint8 alpha plane."""
+    dtype = mask_dtype()
+    if dtype == np.uint8:
+        return alpha
+    return np.multiply(alpha, dtype.type(1.0 / 255), dtype=dtype)
+
+
+def mask_value(value):
+    """Returns the mask pixel value for an opacity between 0 and 1."""
+    dtype = mask_dtype()
+    if dtype == np.uint8:
+        return np.uint8(round(255 * value))
+    return dtype.type(value)
+
+
+def mask_to_float(mask, dtype="float32"):
+    if mask.dtype == np.uint8:
+        return np.multiply(mask, np.float32(1.0 / 255), dtype=dtype)
+    return mask
+
+
+def mask_to_uint8(mask):
+    if mask.dtype == np.uint8:
+        return mask
+    return (255 * mask).astype("uint8")
+
+
+def convert_mask(mask, dtype):
+    """Returns ``mask`` as a mask frame of type ``dtype``."""
+    if np.dtype(dtype) == np.uint8:
+        return mask_to_uint8(mask)
+    return mask_to_float(mask, dtype)
+
+
+def add_masks(mask1, mask2):
+    """Returns the sum of two masks, capped at fully opaque."""
+    if mask1.dtype == np.uint8 and mask2.dtype == np.uint8:
+        return np.minimum(mask1, 255 - mask2) + mask2
+    return np.minimum(1, mask_to_float(mask1) + mask_to_float(mask2))
+
 
 def blit(im1, im2, pos=None, mask=None, ismask=False):
     if pos is None:
@@ -20,6 +72,8 @@ def blit(im1, im2, pos=None, mask=None, ismask=False):
         return im2
 
     blitted = im1[y1:y2, x1:x2]
+    if ismask:
+        blitted = convert_mask(blitted, im2.dtype)
 
     new_im2 = +im2
 
@@ -27,9 +81,18 @@ def blit(im1, im2, pos=None, mask=None, ismask=False):
         new_im2[yp1:yp2, xp1:xp2] = blitted
     else:
         mask = mask[y1:y2, x1:x2]
-        if len(im1.shape) == 3:
-            mask = np.dstack(3 * [mask])
         blit_region = new_im2[yp1:yp2, xp1:xp2]
-        new_im2[yp1:yp2, xp1:xp2] = 1.0 * mask * blitted + (1.0 - mask) * blit_region
+        integer = mask.dtype == blitted.dtype == blit_region.dtype == np.uint8
+        if not integer:
+            mask = mask_to_float(mask)
+        if len(im1.shape) == 3:
+            mask = mask[:, :, None]
+        if integer:
+            # Rounded (a * m + b * (255 - m)) / 255, which fits in uint16.
+            mask = mask.astype("uint16")
+            blended = blitted * mask + blit_region * (255 - mask) + 127
+            new_im2[yp1:yp2, xp1:xp2] = blended // 255
+        else:
+            new_im2[yp1:yp2, xp1:xp2] = mask * blitted + (1.0 - mask) * blit_region
 
-    return new_im2.astype("uint8") if (not ismask) else new_im2
+    return new_im2.astype("uint8", copy=False) if (not ismask) else new_im2
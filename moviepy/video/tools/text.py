@@ -0,0 +1,281 @@
+"""In-process text rendering for TextClip, with FreeType through PIL.
+
+Fonts are looked up like ImageMagick does (a file path, or a font name
+matched against the fonts installed on the system) and the FONT_CACHE_SIZE
+most recently used (font, size) pairs are kept loaded. Rendered captions are kept in a small LRU cache, so the same caption
+(e.g. a title repeated on every scene) is only rasterized once.
+"""
+
+import functools, os, re, threading
+from collections import OrderedDict
+import numpy as np
+
+CAPTION_CACHE_SIZE = 128
+FONT_CACHE_SIZE = 32
+
+# Names ImageMagick resolves through its own font configuration.
+FONT_ALIASES = {
+    "courier": ["couriernew", "cour", "nimbusmonops", "liberationmono", "freemono"],
+    "helvetica": ["nimbussans", "liberationsans", "arial", "freesans"],
+    "arial": ["liberationsans", "nimbussans", "freesans"],
+    "times": ["timesnewroman", "times", "nimbusroman", "liberationserif", "freeserif"],
+}
+
+FONT_DIRS = [
+    "/usr/share/fonts",
+    "/usr/local/share/fonts",
+    "~/.fonts",
+    "~/.local/share/fonts",
+    "/Library/Fonts",
+    "/System/Library/Fonts",
+    "~/Library/Fonts",
+    os.path.join(os.environ.get("WINDIR", "C:\\Windows"), "Fonts"),
+]
+
+_font_files = None
+_captions = OrderedDict()
+_lock = threading.Lock()
+
+
+def _normalize(name):
+    return re.sub("[^a-z0-9]", "", name.lower())
+
+
+def _installed_fonts():
+    """Returns a dict {normalized name: path} of the fonts on the system."""
+    global _font_files
+    if _font_files is None:
+        found = {}
+        for directory in FONT_DIRS:
+            for root, _, files in os.walk(os.path.expanduser(directory)):
+                for name in files:
+                    stem, ext = os.path.splitext(name)
+                    if ext.lower() in (".ttf", ".otf", ".ttc"):
+                        found.setdefault(_normalize(stem), os.path.join(root, name))
+        _font_files = found
+    return _font_files
+
+
+def find_font(font):
+    """Returns the path of the font file for ``font``, a path or a name.
+
+    Raises IOError if no such font is installed.
+    """
+    if os.path.isfile(font):
+        return font
+    installed = _installed_fonts()
+    name = _normalize(os.path.splitext(font)[0])
+    for candidate in [name, name + "regular"] + FONT_ALIASES.get(name, []):
+        for key in (candidate, candidate + "regular"):
+            if key in installed:
+                return installed[key]
+    raise IOError("MoviePy error: font %s could not be found." % font)
+
+
+@functools.lru_cache(maxsize=FONT_CACHE_SIZE)
+def load_font(font, fontsize):
+    """Returns the (cached) PIL FreeType font for ``font`` at ``fontsize``."""
+    from PIL import ImageFont
+
+    return ImageFont.truetype(find_font(font), fontsize)
+
+
+def _rgba(color):
+    from PIL import ImageColor
+
+    if color is None or color == "transparent":
+        return (0, 0, 0, 0)
+    return ImageColor.getcolor(color, "RGBA")
+
+
+def _wrap(text, font, width, stroke_width):
+    """Breaks the lines of ``text`` so that they fit in ``width`` pixels."""
+    lines = []
+    for paragraph in text.split("\n"):
+        line = ""
+        for word in paragraph.split(" "):
+            candidate = word if not line else line + " " + word
+            if line and font.getlength(candidate) + 2 * stroke_width > width:
+                lines.append(line)
+                line = word
+            else:
+                line = candidate
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def _line_spacing(font, interline, stroke_width):
+    """Returns the ``spacing`` making PIL advance lines by the height of the
+    font (ascent + descent) plus ``interline``, like ImageMagick."""
+    ascent, descent = font.getmetrics()
+    pil_height = font.getbbox("A", stroke_width=stroke_width)[3]
+    return ascent + descent - pil_height + int(round(interline or 0))
+
+
+def _layout(text, font, size, method, interline, halign, stroke_width):
+    """Returns the text (wrapped for captions), the line spacing and the
+    bounding box of the text."""
+    from PIL import Image, ImageDraw
+
+    if method == "caption" and size[0] is not None:
+        text = _wrap(text, font, size[0], stroke_width)
+    spacing = _line_spacing(font, interline, stroke_width)
+    draw = ImageDraw.Draw(Image.new("L", (1, 1)))
+    bbox = draw.multiline_textbbox(
+        (0, 0),
+        text,
+        font=font,
+        spacing=spacing,
+        align=halign,
+        stroke_width=stroke_width,
+    )
+    return text, spacing, bbox
+
+
+def _fit_fontsize(text, font, size, method, interline, halign, stroke_width):
+    """Returns the largest font size for which the text fits in ``size``."""
+    low, high = 1, 2 * max(s for s in size if s is not None)
+    while low < high:
+        fontsize = (low + high + 1) // 2
+        _, _, (l, t, r, b) = _layout(
+            text, load_font(font, fontsize), size, method, interline, halign, stroke_width
+        )
+        if (size[0] is None or r - l <= size[0]) and (size[1] is None or b - t <= size[1]):
+            low = fontsize
+        else:
+            high = fontsize - 1
+    return low
+
+
+def render_text(
+    text,
+    font,
+    fontsize=None,
+    color="black",
+    bg_color="transparent",
+    stroke_color=None,
+    stroke_width=1,
+    size=None,
+    method="label",
+    align="center",
+    interline=None,
+):
+    """Renders ``text`` as a HxWx4 RGBA array, with the same conventions as
+    the ImageMagick command of TextClip (``align`` is a gravity).
+
+    The returned array is read-only as it is shared with the cache. Raises
+    IOError if the font is not installed, ValueError for unknown colors.
+    """
+    size = None if size is None else tuple(size)
+    key = (text, font, fontsize, color, bg_color, stroke_color, stroke_width)
+    key += (size, method, align, interline)
+    with _lock:
+        if key in _captions:
+            _captions.move_to_end(key)
+            return _captions[key]
+
+    img = _render_text(
+        text,
+        font,
+        fontsize,
+        color,
+        bg_color,
+        stroke_color,
+        stroke_width,
+        size,
+        method,
+        align,
+        interline,
+    )
+    img.flags.writeable = False
+    with _lock:
+        _captions[key] = img
+        while len(_captions) > CAPTION_CACHE_SIZE:
+            _captions.popitem(last=False)
+    return img
+
+
+def _render_text(
+    text,
+    font,
+    fontsize,
+    color,
+    bg_color,
+    stroke_color,
+    stroke_width,
+    size,
+    method,
+    align,
+    interline,
+):
+    from PIL import Image, ImageDraw
+
+    fill_rgba, bg_rgba = _rgba(color), _rgba(bg_color)
+    stroke_rgba = None if stroke_color is None else _rgba(stroke_color)
+    stroke_width = int(round(stroke_width)) if stroke_color is not None else 0
+
+    gravity = (align or "center").lower()
+    halign = "left" if "west" in gravity else "right" if "east" in gravity else "center"
+    box = size if size is not None else (None, None)
+
+    if fontsize is None:
+        # Like ImageMagick: labels fit their width or height, captions fit
+        # their box when both are given, else use the default point size.
+        if method == "caption":
+            fit = None not in box
+        else:
+            fit = box != (None, None)
+        if not fit:
+            fontsize = 12
+        else:
+            fontsize = _fit_fontsize(
+                text, font, box, method, interline, halign, stroke_width
+            )
+    pil_font = load_font(font, int(round(fontsize)))
+    text, spacing, (l, t, r, b) = _layout(
+        text, pil_font, box, method, interline, halign, stroke_width
+    )
+
+    w = int(box[0] if box[0] is not None else r - l)
+    h = int(box[1] if box[1] is not None else b - t)
+    x = 0 if halign == "left" else (w - (r - l)) if halign == "right" else (w - (r - l)) // 2
+    y = 0 if "north" in gravity else (h - (b - t)) if "south" in gravity else (h - (b - t)) // 2
+
+    def coverage(stroke_fill):
+        # The fill is drawn with the same stroke width in both masks, so
+        # that PIL places the glyphs at the same offset.
+        mask = Image.new("L", (w, h), 0)
+        ImageDraw.Draw(mask).multiline_text(
+            (x - l, y - t),
+            text,
+            fill=255,
+            font=pil_font,
+            spacing=spacing,
+            align=halign,
+            stroke_width=stroke_width,
+            stroke_fill=stroke_fill,
+        )
+        return np.asarray(mask, dtype="float32") / 255
+
+    fill = coverage(0)
+    fill_rgb = np.array(fill_rgba[:3], dtype="float32")
+    if stroke_width:
+        outer = coverage(255)
+        stroke_rgb = np.array(stroke_rgba[:3], dtype="float32")
+        text_rgb = stroke_rgb + fill[:, :, None] * (fill_rgb - stroke_rgb)
+        text_alpha = outer * (fill * fill_rgba[3] + (1 - fill) * stroke_rgba[3]) / 255
+    else:
+        text_rgb = np.broadcast_to(fill_rgb, (h, w, 3))
+        text_alpha = fill * fill_rgba[3] / 255
+
+    # Composites the text over the background ("over" operator).
+    bg_alpha = bg_rgba[3] / 255.0
+    alpha = text_alpha + bg_alpha * (1 - text_alpha)
+    weight = (bg_alpha * (1 - text_alpha))[:, :, None]
+    rgb = text_rgb * text_alpha[:, :, None] + np.array(bg_rgba[:3]) * weight
+    rgb /= np.maximum(alpha, 1e-6)[:, :, None]
+
+    img = np.empty((h, w, 4), dtype="uint8")
+    img[:, :, :3] = np.clip(rgb + 0.5, 0, 255)
+    img[:, :, 3] = np.clip(255 * alpha + 0.5, 0, 255)
+    return img
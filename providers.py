@@ -0,0 +1,338 @@
+"""Shared client of the generation providers (OpenAI, the image downloads
+and the text-to-speech service).
+
+Each provider keeps a pool of keep-alive HTTP connections, a token bucket
+(``rate`` requests per second, in bursts of up to ``burst``), a cap on the
+requests in flight (``max_concurrency``), timeouts, and retries with
+jittered exponential backoff on connection errors, timeouts, 429 and 5xx
+responses (a ``Retry-After`` header is honored, and also holds back the
+other requests to the provider). A POST, which may have been processed
+even when it failed (and billed, for an image), is only retried when the
+provider refused it (429, 503) or it could not be sent. The providers are created on first use
+from PROVIDERS and shared by the threads of the process.
+
+    from providers import complete, download, fetch, generate_image, metrics_report
+
+    url = generate_image("a lighthouse at dusk")
+    download(url, "images/image1.jpg")  # or data = fetch(url)
+    print(metrics_report())
+
+``Provider.call`` puts any other function under the same limits, as is
+done for gTTS, which makes its own requests.
+"""
+
+import os, random, threading, time
+from collections import Counter
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError
+
+# Responses worth another attempt, and those which tell that the request
+# was not processed, so that even a POST can be sent again.
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+REFUSED_STATUSES = {429, 503}
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+# Settings of the providers, by name (see Provider).
+PROVIDERS = {
+    "openai": {
+        "base_url": os.environ.get("OPENAI_API_BASE", "https://api.openai.com/v1"),
+        "rate": 0.8,  # 50 images per minute
+        "burst": 5,
+        "max_concurrency": 4,
+        "timeout": (10, 120),
+    },
+    "downloads": {"max_concurrency": 8, "timeout": (10, 60)},
+    "tts": {"rate": 2, "burst": 4, "max_concurrency": 2},
+}
+
+_providers = {}
+_lock = threading.Lock()
+
+
+class ProviderError(IOError):
+    """An HTTP error response of a provider."""
+
+    def __init__(self, provider, response):
+        self.status = response.status_code
+        self.retry_after = retry_after(response)
+        IOError.__init__(
+            self,
+            "%s error: HTTP %d on %s %s:\n%s"
+            % (provider, self.status, response.request.method, response.url, response.text[:500]),
+        )
+
+
+def retry_after(response):
+    """Returns the seconds of the ``Retry-After`` header, or None."""
+    try:
+        return max(0.0, float(response.headers["Retry-After"]))
+    except (KeyError, ValueError):
+        return None
+
+
+def unsent(error):
+    """Tells whether the request which failed with ``error`` never reached
+    the provider (no connection could be made)."""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    if isinstance(error, requests.ConnectionError) and error.args:
+        return isinstance(getattr(error.args[0], "reason", None), ConnectTimeoutError)
+    return False
+
+
+class TokenBucket:
+    """Allows ``rate`` acquisitions per second, and bursts of ``burst``.
+    Tokens are reserved in turn, so waiting callers are served in order."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Takes a token, sleeping until it is available. Returns the wait."""
+        with self.lock:
+            self._refill()
+            self.tokens -= 1
+            wait = max(0.0, -self.tokens / self.rate)
+        time.sleep(wait)
+        return wait
+
+    def hold(self, seconds):
+        """Gives no token for ``seconds``."""
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+class Provider:
+    """A provider of ``base_url``, see the module docstring.
+
+    ``rate`` (None for no limit), ``burst`` and ``max_concurrency`` are the
+    limits, ``timeout`` the (connect, read) timeouts of the requests, and a
+    failed request is attempted up to ``max_retries`` more times, after a
+    random delay of up to ``backoff * 2 ** attempt`` (at most
+    ``max_backoff``) seconds.
+    """
+
+    def __init__(
+        self,
+        name,
+        base_url=None,
+        headers=None,
+        rate=None,
+        burst=1,
+        max_concurrency=4,
+        max_retries=4,
+        backoff=0.5,
+        max_backoff=30,
+        timeout=(10, 60),
+    ):
+        self.name = name
+        self.base_url = base_url
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+
+        self.session = requests.Session()
+        self.session.headers.update(headers or {})
+        # One connection per request in flight, our retries instead of
+        # urllib3's.
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_concurrency, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.counters = Counter()
+        self.statuses = Counter()
+        self._counters_lock = threading.Lock()
+
+    def _count(self, **values):
+        with self._counters_lock:
+            self.counters.update(values)
+
+    def url(self, path):
+        if "://" in path or self.base_url is None:
+            return path
+        return "%s/%s" % (self.base_url.rstrip("/"), path.lstrip("/"))
+
+    def retry_delay(self, attempt, error, idempotent=True):
+        """Returns the seconds to wait before attempt ``attempt + 1`` after
+        ``error``, or None if it should not be retried. A request which is
+        not ``idempotent`` is only retried if it was refused or not sent."""
+        if attempt >= self.max_retries:
+            return None
+        if isinstance(error, ProviderError):
+            if error.status not in (RETRY_STATUSES if idempotent else REFUSED_STATUSES):
+                return None
+        elif not idempotent and isinstance(error, requests.RequestException):
+            if not unsent(error):
+                return None
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        if getattr(error, "retry_after", None) is not None:
+            delay = max(delay, error.retry_after)
+            if self.bucket is not None:
+                self.bucket.hold(error.retry_after)
+        return delay
+
+    def call(self, f, *args, retry_on=(), idempotent=True, **kwargs):
+        """Returns ``f(*args, **kwargs)``, called under the limits of the
+        provider and retried on connection errors, timeouts, retryable
+        ProviderErrors and the exceptions ``retry_on`` (see retry_delay)."""
+        retryable = (requests.ConnectionError, requests.Timeout, ProviderError) + tuple(retry_on)
+        self._count(calls=1)
+        attempt = 0
+        while True:
+            if self.bucket is not None:
+                self._count(throttled_s=self.bucket.acquire())
+            queued = time.monotonic()
+            with self.slots:
+                start = time.monotonic()
+                self._count(attempts=1, queued_s=start - queued)
+                try:
+                    return f(*args, **kwargs)
+                except retryable as e:
+                    error = e
+                finally:
+                    self._count(latency_s=time.monotonic() - start)
+            delay = self.retry_delay(attempt, error, idempotent)
+            if delay is None:
+                self._count(failures=1)
+                raise error
+            self._count(retries=1, backoff_s=delay)
+            time.sleep(delay)
+            attempt += 1
+
+    def _send(self, method, url, stream, kwargs):
+        response = self.session.request(method, url, stream=stream, **kwargs)
+        with self._counters_lock:
+            self.statuses[response.status_code] += 1
+        if response.status_code >= 400:
+            error = ProviderError(self.name, response)
+            response.close()
+            raise error
+        if not stream:
+            self._count(bytes=len(response.content))
+        return response
+
+    def request(self, method, path, stream=False, **kwargs):
+        """Sends an HTTP request to ``path`` (relative to ``base_url``) and
+        returns the response. Raises ProviderError on an error response."""
+        kwargs.setdefault("timeout", self.timeout)
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        return self.call(
+            self._send, method, self.url(path), stream, kwargs, idempotent=idempotent
+        )
+
+    def post_json(self, path, data):
+        return self.request("POST", path, json=data).json()
+
+    def _download(self, url, filename):
+        temp = filename + ".part"
+        with self._send("GET", url, True, {"timeout": self.timeout}) as response:
+            with open(temp, "wb") as f:
+                for chunk in response.iter_content(1 << 16):
+                    f.write(chunk)
+                    self._count(bytes=len(chunk))
+        os.replace(temp, filename)
+
+    def download(self, url, filename):
+        """Saves the content of ``url`` to ``filename``. A partial file is
+        never left at ``filename``."""
+        self.call(self._download, self.url(url), filename)
+        return filename
+
+    def fetch(self, url):
+        """Returns the content of ``url``."""
+        return self.request("GET", url).content
+
+    def stats(self):
+        """Returns the counters of the provider: calls, attempts, retries,
+        failures, bytes, the seconds spent in requests (``latency_s``),
+        waiting for the rate limit (``throttled_s``), for a free slot
+        (``queued_s``) and in backoff, and the responses by status."""
+        with self._counters_lock:
+            stats = dict(self.counters)
+            stats["statuses"] = dict(self.statuses)
+        attempts = stats.get("attempts", 0)
+        stats["mean_latency_s"] = stats.get("latency_s", 0.0) / attempts if attempts else 0.0
+        return stats
+
+    def close(self):
+        self.session.close()
+
+
+def get_provider(name):
+    """Returns the shared Provider ``name`` of PROVIDERS."""
+    with _lock:
+        if name not in _providers:
+            settings = dict(PROVIDERS[name])
+            if name == "openai" and "headers" not in settings:
+                from api_key import API_KEY
+
+                settings["headers"] = {"Authorization": "Bearer %s" % API_KEY}
+            _providers[name] = Provider(name, **settings)
+        return _providers[name]
+
+
+def complete(prompt, model="text-davinci-003", **params):
+    """Returns the text generated by OpenAI's completions for ``prompt``."""
+    data = get_provider("openai").post_json("completions", dict(params, model=model, prompt=prompt))
+    return data["choices"][0]["text"]
+
+
+def generate_image(prompt, size="1024x1024"):
+    """Returns the URL of an image generated by OpenAI for ``prompt``."""
+    data = get_provider("openai").post_json(
+        "images/generations", {"prompt": prompt, "n": 1, "size": size}
+    )
+    return data["data"][0]["url"]
+
+
+def download(url, filename):
+    return get_provider("downloads").download(url, filename)
+
+
+def fetch(url):
+    return get_provider("downloads").fetch(url)
+
+
+def metrics():
+    """Returns the stats of the providers used so far, by name."""
+    with _lock:
+        providers = list(_providers.values())
+    return {p.name: p.stats() for p in providers}
+
+
+def metrics_report():
+    lines = []
+    for name, stats in sorted(metrics().items()):
+        lines.append(
+            "%-10s %4d calls %4d attempts %3d retries %2d failures, "
+            "%.2fs mean latency, %.1fs throttled, %.1fs queued, %.1f MB, statuses %s"
+            % (
+                name,
+                stats.get("calls", 0),
+                stats.get("attempts", 0),
+                stats.get("retries", 0),
+                stats.get("failures", 0),
+                stats["mean_latency_s"],
+                stats.get("throttled_s", 0.0),
+                stats.get("queued_s", 0.0),
+                stats.get("bytes", 0) / 1e6,
+                stats["statuses"],
+            )
+        )
+    return "\n".join(lines)
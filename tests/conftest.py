@@ -0,0 +1,41 @@
+import os, subprocess as sp, sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from moviepy.config import get_setting
+
+
+def ffmpeg(*args):
+    sp.run([get_setting("FFMPEG_BINARY"), "-y", "-loglevel", "error"] + list(args), check=True)
+
+
+@pytest.fixture
+def make_video(tmp_path):
+    """Writes a test pattern video (with a tone if ``audio``), returns its
+    path."""
+
+    def make_video(name="video.mp4", duration=2, fps=24, size="160x120", audio=False):
+        path = str(tmp_path / name)
+        args = ["-f", "lavfi", "-i", "testsrc=d=%s:r=%s:s=%s" % (duration, fps, size)]
+        if audio:
+            args += ["-f", "lavfi", "-i", "sine=f=440:d=%s" % duration, "-shortest"]
+        ffmpeg(*(args + ["-pix_fmt", "yuv420p", path]))
+        return path
+
+    return make_video
+
+
+@pytest.fixture
+def make_audio(tmp_path):
+    """Writes a tone of ``duration`` seconds with ``codec``, returns its
+    path."""
+
+    def make_audio(name, duration, frequency=440, codec="libmp3lame"):
+        path = str(tmp_path / name)
+        source = "sine=f=%s:d=%s" % (frequency, duration)
+        ffmpeg("-f", "lavfi", "-i", source, "-ac", "2", "-ar", "44100", "-c:a", codec, path)
+        return path
+
+    return make_audio
@@ -0,0 +1,11 @@
+"""Builder of the farm tests, imported by the worker processes."""
+
+from moviepy.video.compositing.concatenate import concatenate_videoclips
+from moviepy.video.VideoClip import ColorClip
+
+
+def build(colors=((255, 0, 0), (0, 255, 0), (0, 0, 255)), duration=1):
+    clips = [ColorClip((64, 48), color=c).set_duration(duration) for c in colors]
+    video = concatenate_videoclips(clips)
+    video.fps = 24
+    return video
@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("openai")
+
+import app
+from moviepy.video.VideoClip import ColorClip
+
+
+def test_serves_the_hls_playlist_and_segments(tmp_path, monkeypatch):
+    clip = ColorClip((64, 48), color=(255, 0, 0)).set_duration(3)
+    clip.write_videofile(str(tmp_path / "final_video.m3u8"), fps=24, hls_time=1, logger=None)
+    monkeypatch.setattr(app, "HLS_DIR", str(tmp_path))
+    client = app.app.test_client()
+
+    response = client.get("/video/final_video.m3u8")
+    assert response.status_code == 200
+    assert response.mimetype == "application/vnd.apple.mpegurl"
+    lines = response.get_data(as_text=True).splitlines()
+    assert lines[-1] == "#EXT-X-ENDLIST"
+    segments = [l for l in lines if l and not l.startswith("#")]
+    assert len(segments) == 3
+    for segment in segments:
+        response = client.get("/video/" + segment)
+        assert response.status_code == 200 and response.mimetype == "video/mp2t"
+        assert len(response.get_data()) == os.path.getsize(str(tmp_path / segment))
+
+    (tmp_path / "notes.txt").write_text("not a video")
+    assert client.get("/video/notes.txt").status_code == 404
+    assert client.get("/video/missing.ts").status_code == 404
+
+
+def test_player_uses_the_playlist():
+    with app.app.test_request_context():
+        page = app.render_template("videover.html", hls=True)
+        assert "/video/final_video.m3u8" in page and "hls.js" in page
+        page = app.render_template("videover.html", hls=False)
+        assert 'src="/video"' in page and "m3u8" not in page
@@ -0,0 +1,43 @@
+import subprocess as sp
+
+import numpy as np
+import pytest
+
+from moviepy.audio.AudioClip import CompositeAudioClip
+from moviepy.audio.io.AudioFileClip import AudioFileClip
+from moviepy.audio.io.passthrough import ffmpeg_audio_passthrough
+from moviepy.config import get_setting
+
+
+def read_samples(filename):
+    cmd = [get_setting("FFMPEG_BINARY"), "-loglevel", "error", "-i", filename]
+    out = sp.run(cmd + ["-f", "s16le", "-ac", "1", "-"], stdout=sp.PIPE, check=True)
+    return np.frombuffer(out.stdout, np.int16).astype(int)
+
+
+def onsets(samples):
+    """Returns the indices where a tone starts after a silence."""
+    loud = np.abs(samples) > 300
+    quiet = ~np.convolve(loud, np.ones(200), "full")[: len(loud)].astype(bool)
+    return np.flatnonzero(loud[1:] & quiet[:-1])
+
+
+@pytest.mark.parametrize("spacing", [1.5, 0.7], ids=["concat", "amix"])
+def test_passthrough_matches_numpy(make_audio, tmp_path, spacing):
+    # mp3 files decode shorter than their reported duration.
+    clips = [
+        AudioFileClip(make_audio("tone%d.mp3" % i, 1, 440 + 220 * i)).set_start(spacing * i)
+        for i in range(3)
+    ]
+    soundtrack = CompositeAudioClip(clips)
+    passthrough, reference = str(tmp_path / "passthrough.wav"), str(tmp_path / "numpy.wav")
+    assert ffmpeg_audio_passthrough(soundtrack, passthrough, 44100, "pcm_s16le")
+    soundtrack.write_audiofile(reference, fps=44100, codec="pcm_s16le", logger=None)
+
+    a, b = read_samples(passthrough), read_samples(reference)
+    assert len(a) == len(b)
+    if spacing > 1.04:
+        expected = [44100 * spacing * i for i in range(3)]
+        assert np.abs(onsets(b) - expected).max() <= 2
+        assert list(onsets(a)) == list(onsets(b))
+    assert np.abs(a - b).max() <= 1
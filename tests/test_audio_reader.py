@@ -0,0 +1,44 @@
+import os
+
+import numpy as np
+import pytest
+
+from moviepy import config
+from moviepy.audio.io.readers import FFMPEG_AudioReader, FFMPEG_CachedAudioReader
+
+SIZE = 44100 * 2 * 4  # one second of stereo float32
+
+
+@pytest.fixture
+def pcm_cache(tmp_path, monkeypatch):
+    directory = str(tmp_path / "pcm")
+    monkeypatch.setattr(config, "PCM_CACHE_DIR", directory)
+    monkeypatch.setattr(config, "PCM_CACHE_MAX_BYTES", int(2.5 * SIZE))
+    return directory
+
+
+def cached(directory):
+    return sorted(os.listdir(directory))
+
+
+def test_cached_reader_matches_stream(make_audio, pcm_cache):
+    filename = make_audio("tone.wav", 1, codec="pcm_s16le")
+    tt = np.arange(0, 1, 1 / 44100.0)
+    stream = FFMPEG_AudioReader(filename, 200000, fps=44100).get_frame(tt)
+    assert np.abs(FFMPEG_CachedAudioReader(filename).get_frame(tt) - stream).max() < 1e-4
+
+
+def test_least_recently_used_are_evicted(make_audio, pcm_cache):
+    a, b, c = [make_audio("%s.wav" % n, 1, codec="pcm_s16le") for n in "abc"]
+    reader_a = FFMPEG_CachedAudioReader(a)
+    reader_b = FFMPEG_CachedAudioReader(b)
+    assert len(cached(pcm_cache)) == 2
+    os.utime(reader_a.cachefile, (1, 1))
+    os.utime(reader_b.cachefile, (2, 2))
+    FFMPEG_CachedAudioReader(a)  # a hit: a is now the most recently used
+    reader_c = FFMPEG_CachedAudioReader(c)
+    assert cached(pcm_cache) == sorted(
+        os.path.basename(r.cachefile) for r in [reader_a, reader_c]
+    )
+    # The evicted file stays readable where it is mapped.
+    assert reader_b.get_frame(0.5).shape == (2,)
@@ -0,0 +1,76 @@
+import time
+
+import numpy as np
+
+from moviepy.video.compositing.CompositeVideoClip import CompositeVideoClip
+from moviepy.video.compositing.concatenate import concatenate_videoclips
+from moviepy.video.tools.drawing import mask_to_float
+from moviepy.video.VideoClip import ColorClip, ImageClip
+
+
+def state(clip):
+    return {k: v for k, v in clip.__dict__.items() if k != "memoized_frame"}
+
+
+def test_views_do_not_change_their_source():
+    alpha = np.tile(np.linspace(0, 255, 30).astype("uint8"), (20, 1))
+    clip = ImageClip(np.full((20, 30, 3), 200, "uint8")).set_mask(ImageClip(alpha, ismask=True))
+    clip = clip.set_duration(4)
+    before, mask_before = state(clip), state(clip.mask)
+    views = [
+        clip.set_start(1),
+        clip.set_end(2),
+        clip.set_duration(3),
+        clip.set_position((5, 5)),
+        clip.set_mask(ColorClip((30, 20), 1.0, ismask=True)),
+        clip.set_start(1).set_position("center").set_duration(1),
+    ]
+    assert state(clip) == before and state(clip.mask) == mask_before
+    assert all(v.mask is not clip.mask for v in views[:4])
+    assert views[0].mask.start == 1 and clip.mask.start == 0
+
+
+def eager_mask(composite):
+    """The composite mask as it was built before it became lazy."""
+    maskclips = [
+        (c.mask if c.mask is not None else c.add_mask().mask)
+        .set_position(c.pos)
+        .set_end(c.end)
+        .set_start(c.start, change_end=False)
+        for c in composite.clips
+    ]
+    return CompositeVideoClip(maskclips, composite.size, ismask=True, bg_color=0.0)
+
+
+def test_lazy_mask_equals_eager_mask():
+    alpha = np.tile(np.linspace(0, 255, 30).astype("uint8"), (20, 1))
+    clips = [
+        ColorClip((30, 20), color=(255, 0, 0)).set_duration(2).set_position((10, 5)),
+        ImageClip(np.full((20, 30, 3), 100, "uint8"))
+        .set_mask(ImageClip(alpha, ismask=True))
+        .set_start(1)
+        .set_duration(2)
+        .set_position(lambda t: (int(10 * t), 20)),
+        ImageClip(np.dstack([np.zeros((10, 10, 3), "uint8"), np.full((10, 10), 128, "uint8")]))
+        .set_start(0.5)
+        .set_duration(1),
+    ]
+    composite = CompositeVideoClip(clips, size=(80, 60))
+    assert composite._mask is not None and composite.mask is composite.mask
+    reference = eager_mask(composite)
+    for t in [0, 0.6, 1.2, 1.9, 2.5]:
+        assert np.allclose(
+            mask_to_float(composite.mask.get_frame(t)),
+            mask_to_float(reference.get_frame(t)),
+            atol=1 / 255.0,
+        )
+
+
+def test_long_concatenation():
+    colors = [ColorClip((64, 48), color=(i % 256, 0, 0)).set_duration(0.1) for i in range(100)]
+    start = time.perf_counter()
+    video = concatenate_videoclips(colors * 100)
+    frame = video.get_frame(500.05)
+    elapsed = time.perf_counter() - start
+    assert len(video.clips) == 10000 and abs(video.duration - 1000) < 1e-6
+    assert frame[0, 0, 0] == 0 and elapsed < 2
@@ -0,0 +1,139 @@
+import os
+import subprocess as sp
+import sys
+import time
+
+import pytest
+
+from moviepy.config import get_setting
+from moviepy.farm import SQLiteQueue, WorkQueue, farm_render, open_queue, render
+from moviepy.farm.render import MAX_RESPAWNS
+
+from farm_builder import build
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+
+
+def packets(filename):
+    cmd = [get_setting("FFMPEG_BINARY"), "-loglevel", "error", "-i", filename]
+    out = sp.run(cmd + ["-map", "0:v", "-c", "copy", "-f", "framecrc", "-"], stdout=sp.PIPE)
+    return [l for l in out.stdout.decode().splitlines() if not l.startswith("#")]
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return SQLiteQueue(str(tmp_path / "queue.db"), max_attempts=2)
+
+
+def test_work_queue_is_abstract(queue):
+    with pytest.raises(TypeError):
+        WorkQueue()
+    assert open_queue(queue) is queue
+    assert isinstance(open_queue("sqlite:" + queue.path), SQLiteQueue)
+
+
+def test_claim_in_order(queue):
+    queue.put("job", ["a", "b"])
+    first, second = queue.claim("w1", 60), queue.claim("w2", 60)
+    assert (first["index"], first["payload"], first["attempts"]) == (0, "a", 1)
+    assert (second["index"], second["payload"]) == (1, "b")
+    assert queue.claim("w3", 60) is None
+    assert queue.heartbeat(first, 60)
+    assert queue.complete(first, {"frames": 24})
+    assert not queue.complete(first)
+    assert queue.status("job") == {"pending": 0, "claimed": 1, "done": 1, "failed": 0}
+    assert queue.items("job")[0]["result"] == {"frames": 24}
+
+
+def test_expired_lease_is_claimed_again(queue):
+    queue.put("job", ["a"])
+    lost = queue.claim("w1", 0.01)
+    time.sleep(0.05)
+    item = queue.claim("w2", 60)
+    assert (item["id"], item["attempts"]) == (lost["id"], 2)
+    assert item["token"] != lost["token"]
+    # The first worker lost the item: its heartbeat and result are refused.
+    assert not queue.heartbeat(lost, 60)
+    assert not queue.complete(lost)
+    assert queue.complete(item)
+    assert queue.items("job")[0]["worker"] == "w2"
+
+
+def test_expired_lease_fails_after_max_attempts(queue):
+    queue.put("job", ["a"])
+    queue.claim("w1", 0.01)
+    time.sleep(0.05)
+    queue.claim("w2", 0.01)
+    time.sleep(0.05)
+    assert queue.claim("w3", 60) is None
+    [item] = queue.items("job")
+    assert (item["state"], item["attempts"], item["error"]) == ("failed", 2, "lease expired")
+
+
+def test_fail_releases_until_max_attempts(queue):
+    queue.put("job", ["a"])
+    assert queue.fail(queue.claim("w1", 60), "error 1")
+    assert queue.status("job")["pending"] == 1
+    assert queue.fail(queue.claim("w1", 60), "error 2")
+    assert queue.claim("w1", 60) is None
+    [item] = queue.items("job")
+    assert (item["state"], item["error"]) == ("failed", "error 2")
+    queue.purge("job")
+    assert queue.items("job") == []
+
+
+def test_farm_render_matches_write_videofile(tmp_path, monkeypatch):
+    monkeypatch.setenv("PYTHONPATH", TESTS)
+    direct = str(tmp_path / "direct.mp4")
+    build().write_videofile(direct, audio=False, logger=None)
+    farmed = str(tmp_path / "farmed.mp4")
+    farm_render(
+        str(tmp_path / "queue.db"),
+        "farm_builder:build",
+        farmed,
+        segment_duration=0.5,
+        audio=False,
+        workers=2,
+        poll=0.1,
+        logger=None,
+    )
+    assert len(packets(farmed)) == len(packets(direct)) == 72
+    assert not os.path.exists(str(tmp_path / "farmed.farm"))
+
+
+def test_farm_render_fails_when_a_segment_fails(tmp_path, monkeypatch):
+    monkeypatch.setenv("PYTHONPATH", TESTS)
+    with pytest.raises(IOError, match="segment"):
+        farm_render(
+            str(tmp_path / "queue.db"),
+            "farm_builder:build",
+            str(tmp_path / "out.mp4"),
+            codec="not_a_codec",
+            audio=False,
+            workers=1,
+            lease=5,
+            poll=0.1,
+            logger=None,
+        )
+
+
+def test_workers_are_not_restarted_forever(tmp_path, monkeypatch):
+    spawned = []
+
+    def spawn_workers(queue, n, lease=60, idle_exit=5):
+        cmd = [sys.executable, "-c", "raise SystemExit(3)"]
+        spawned.append([sp.Popen(cmd) for _ in range(n)])
+        return spawned[-1]
+
+    monkeypatch.setattr(render, "spawn_workers", spawn_workers)
+    with pytest.raises(IOError, match=r"exit codes \[3, 3\]"):
+        farm_render(
+            str(tmp_path / "queue.db"),
+            "farm_builder:build",
+            str(tmp_path / "out.mp4"),
+            audio=False,
+            workers=2,
+            poll=0.01,
+            logger=None,
+        )
+    assert len(spawned) == MAX_RESPAWNS + 1
@@ -0,0 +1,48 @@
+import pytest
+
+from moviepy.video.compositing.CompositeVideoClip import CompositeVideoClip
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+from moviepy.video.io.VideoFileClip import VideoFileClip
+from moviepy.video.preview import preview_mode
+from moviepy.video.VideoClip import ColorClip
+
+
+@pytest.fixture
+def graph_only(monkeypatch):
+    """Fails the test if a render falls back to the NumPy writer."""
+
+    def ffmpeg_write_video(*args, **kwargs):
+        raise AssertionError("not rendered by the filter graph")
+
+    monkeypatch.setattr("moviepy.video.VideoClip.ffmpeg_write_video", ffmpeg_write_video)
+
+
+def composite(video):
+    clip = VideoFileClip(video, audio=False)
+    background = ColorClip((320, 240), color=(0, 0, 255)).set_duration(clip.duration)
+    return CompositeVideoClip([background, clip.set_position((40, 20))])
+
+
+def test_preview(make_video, tmp_path, graph_only):
+    filename = str(tmp_path / "preview.mp4")
+    composite(make_video()).write_videofile(filename, preview=True, logger=None)
+    assert ffmpeg_parse_infos(filename)["video_size"] == [80, 60]
+
+
+def test_preview_mode(make_video, tmp_path, graph_only):
+    filename = str(tmp_path / "preview.mp4")
+    with preview_mode(scale=1, fps=12):
+        composite(make_video()).write_videofile(filename, logger=None)
+    infos = ffmpeg_parse_infos(filename)
+    assert infos["video_size"] == [320, 240]
+    assert infos["video_fps"] == 12
+
+
+def test_video_filter(make_video, tmp_path, graph_only):
+    filename = str(tmp_path / "flipped.mp4")
+    clip = composite(make_video())
+    clip.write_videofile(filename, ffmpeg_params=["-vf", "hflip,scale=160:120"], logger=None)
+    assert ffmpeg_parse_infos(filename)["video_size"] == [160, 120]
+    # Flipped, the video leaves the left of the background.
+    r, g, b = VideoFileClip(filename).get_frame(0.5)[60, 30]
+    assert r < 16 and g < 16 and b > 224
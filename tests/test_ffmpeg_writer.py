@@ -0,0 +1,67 @@
+import os
+import subprocess as sp
+
+import pytest
+
+from moviepy.audio.io.AudioFileClip import AudioFileClip
+from moviepy.config import get_setting
+from moviepy.video.compositing.CompositeVideoClip import CompositeVideoClip
+from moviepy.video.io.ffmpeg_writer import vfr_params
+from moviepy.video.VideoClip import ColorClip
+
+
+def packets(filename):
+    cmd = [get_setting("FFMPEG_BINARY"), "-loglevel", "error", "-i", filename]
+    out = sp.run(cmd + ["-map", "0:v", "-c", "copy", "-f", "framecrc", "-"], stdout=sp.PIPE)
+    return [l for l in out.stdout.decode().splitlines() if not l.startswith("#")]
+
+
+def still(duration=3):
+    color = ColorClip((64, 48), color=(255, 0, 0)).set_duration(duration)
+    return CompositeVideoClip([color.set_position((8, 8))], size=(80, 60))
+
+
+@pytest.mark.parametrize("ffmpeg_graph", [True, False], ids=["graph", "numpy"])
+def test_frames_are_not_held_by_default(tmp_path, ffmpeg_graph):
+    filename = str(tmp_path / "still.mp4")
+    still().write_videofile(filename, fps=24, ffmpeg_graph=ffmpeg_graph, logger=None)
+    assert len(packets(filename)) == 72
+
+
+@pytest.mark.parametrize("ffmpeg_graph", [True, False], ids=["graph", "numpy"])
+def test_held_frames(tmp_path, ffmpeg_graph):
+    filename = str(tmp_path / "still.mp4")
+    still().write_videofile(
+        filename, fps=24, ffmpeg_graph=ffmpeg_graph, hold_frames=True, logger=None
+    )
+    assert len(packets(filename)) < 10
+
+
+def test_vfr_params():
+    version = get_setting("FFMPEG_VERSION")
+    if version is None or version < (5, 1):
+        pytest.skip("ffmpeg older than 5.1")
+    assert vfr_params() == ["-fps_mode", "vfr", "-bf", "0"]
+
+
+def playlist(filename):
+    with open(filename) as f:
+        lines = f.read().splitlines()
+    durations = [float(l[len("#EXTINF:") :].rstrip(",")) for l in lines if l.startswith("#EXTINF:")]
+    segments = [l for l in lines if l and not l.startswith("#")]
+    return lines, durations, segments
+
+
+@pytest.mark.parametrize("ffmpeg_graph", [True, False], ids=["graph", "numpy"])
+def test_hls_playlist(tmp_path, make_audio, ffmpeg_graph):
+    filename = str(tmp_path / "video.m3u8")
+    audio = AudioFileClip(make_audio("tone.mp3", 5))
+    clip = still(5).set_audio(audio)
+    clip.write_videofile(filename, fps=24, hls_time=2, ffmpeg_graph=ffmpeg_graph, logger=None)
+    audio.close()
+    lines, durations, segments = playlist(filename)
+    assert lines[-1] == "#EXT-X-ENDLIST"
+    assert "#EXT-X-PLAYLIST-TYPE:EVENT" in lines
+    assert durations == pytest.approx([2, 2, 1], abs=0.05)
+    assert segments == ["video_%05d.ts" % i for i in range(3)]
+    assert all(os.path.getsize(str(tmp_path / s)) for s in segments)
@@ -0,0 +1,66 @@
+import math, subprocess as sp
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+from moviepy.config import get_setting
+from moviepy.video.compositing.CompositeVideoClip import CompositeVideoClip, clip_index
+from moviepy.video.io.VideoFileClip import VideoFileClip
+from moviepy.video.VideoClip import ColorClip
+
+NTSC = Fraction(24000, 1001)
+
+
+def decode(filename, size=(160, 120)):
+    """Returns all the frames of a file, read in one pass by ffmpeg."""
+    cmd = [get_setting("FFMPEG_BINARY"), "-loglevel", "error", "-i", filename]
+    out = sp.run(cmd + ["-f", "rawvideo", "-pix_fmt", "rgb24", "-"], stdout=sp.PIPE, check=True)
+    return np.frombuffer(out.stdout, "uint8").reshape((-1, size[1], size[0], 3))
+
+
+@pytest.fixture
+def ntsc(make_video):
+    return make_video("ntsc.mp4", duration=3, fps="24000/1001")
+
+
+def count_seeks(clip, monkeypatch):
+    seeks = []
+    reader = clip.reader
+    original = reader._seek
+    monkeypatch.setattr(reader, "_seek", lambda pos, t: seeks.append(pos) or original(pos, t))
+    return seeks
+
+
+def test_iter_frames(ntsc, monkeypatch):
+    frames = decode(ntsc)
+    clip = VideoFileClip(ntsc, audio=False)
+    seeks = count_seeks(clip, monkeypatch)
+    rendered = list(clip.iter_frames(fps=NTSC))
+    assert len(rendered) == len(frames)
+    assert all(np.array_equal(a, b) for a, b in zip(rendered, frames))
+    assert seeks == [1]
+
+
+def test_get_frame_at_index(ntsc):
+    frames = decode(ntsc)
+    clip = VideoFileClip(ntsc, audio=False)
+    for n in [0, 1, 40, 71, 12, len(frames) - 1]:
+        assert np.array_equal(clip.get_frame_at_index(n, NTSC), frames[n])
+
+
+def test_clip_between_frames(ntsc, monkeypatch):
+    frames = decode(ntsc)
+    video = VideoFileClip(ntsc, audio=False)
+    start = 0.5  # 11.988 frames at 24000/1001
+    child = video.set_start(start)
+    composite = CompositeVideoClip([ColorClip((160, 120), color=(0, 0, 0)).set_duration(4), child])
+    assert clip_index(child, 30, NTSC) == 30 - Fraction(1, 2) * NTSC
+    assert clip_index(video, 30, NTSC) == 30 and isinstance(clip_index(video, 30, NTSC), int)
+
+    seeks = count_seeks(video, monkeypatch)
+    for n, frame in enumerate(composite.iter_frames(fps=NTSC)):
+        shown = math.floor(n - start * NTSC)  # the frame of the file at n / fps
+        if 0 <= shown < len(frames) and n / NTSC >= start:
+            assert np.array_equal(frame, frames[shown]), n
+    assert seeks == [1]
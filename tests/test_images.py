@@ -0,0 +1,88 @@
+import io, os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from moviepy.video.io import images
+from moviepy.video.io.images import clear_image_cache, imread_scaled, read_image, target_size
+from moviepy.video.VideoClip import ImageClip
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    clear_image_cache()
+    yield
+    clear_image_cache()
+
+
+def jpeg(width=400, height=300):
+    gradient = np.linspace(0, 255, width).astype("uint8")
+    img = np.dstack([np.tile(gradient, (height, 1))] * 3)
+    buffer = io.BytesIO()
+    Image.fromarray(img).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize(
+    "resolution, size",
+    [
+        (None, (400, 300)),
+        ((150, None), (200, 150)),
+        ((None, 100), (100, 75)),
+        ((90, 160), (160, 90)),
+    ],
+)
+def test_target_size(resolution, size):
+    assert target_size(400, 300, resolution) == size
+
+
+def test_target_size_with_scale():
+    assert target_size(400, 300, (150, None), scale=0.5) == (100, 76)
+
+
+def test_draft_decode(monkeypatch):
+    from PIL.JpegImagePlugin import JpegImageFile
+
+    drafts = []
+    draft = JpegImageFile.draft
+
+    def spy(im, mode, size):
+        result = draft(im, mode, size)
+        drafts.append((size, im.size))
+        return result
+
+    monkeypatch.setattr(JpegImageFile, "draft", spy)
+    img = imread_scaled(jpeg(), target_resolution=(75, None))
+    assert img.shape == (75, 100, 3)
+    # Decoded by JPEG's DCT scaling at 1/4, not at 400x300 then resized.
+    assert drafts == [((100, 75), (100, 75))]
+
+
+def test_bytes_are_cached():
+    data = jpeg()
+    first = read_image(data, target_resolution=(150, None))
+    assert read_image(bytes(data), target_resolution=(150, None)) is first
+    assert read_image(data, target_resolution=(75, None)) is not first
+    assert not first.flags.writeable
+
+
+def test_paths_are_cached(tmp_path):
+    path = str(tmp_path / "image.jpg")
+    with open(path, "wb") as f:
+        f.write(jpeg())
+    first = read_image(path)
+    assert read_image(path) is first
+    assert ImageClip(path).img is first
+    # A new version of the file is read again.
+    with open(path, "wb") as f:
+        f.write(jpeg(200, 100))
+    os.utime(path, ns=(0, 0))
+    assert read_image(path).shape == (100, 200, 3)
+
+
+def test_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(images, "IMAGE_CACHE_BYTES", 2 * 300 * 400 * 3)
+    for width in [400, 401, 402]:
+        read_image(jpeg(width))
+    assert len(images._images) == 1
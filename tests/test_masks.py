@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from moviepy import config
+from moviepy.video.compositing.CompositeVideoClip import CompositeVideoClip
+from moviepy.video.tools.drawing import add_masks, blit, mask_to_float
+from moviepy.video.VideoClip import ColorClip, ImageClip
+
+rng = np.random.RandomState(0)
+IMAGE = rng.randint(0, 256, (40, 60, 3)).astype("uint8")
+BACKGROUND = rng.randint(0, 256, (80, 100, 3)).astype("uint8")
+ALPHA = rng.randint(0, 256, (40, 60)).astype("uint8")
+
+
+def assert_close(a, b):
+    assert a.shape == b.shape
+    assert np.abs(a.astype(int) - b.astype(int)).max() <= 1
+
+
+@pytest.fixture(params=["uint8", "float32", "float64"])
+def mask_dtype(request, monkeypatch):
+    monkeypatch.setattr(config, "MASK_DTYPE", request.param)
+    return np.dtype(request.param)
+
+
+@pytest.mark.parametrize("pos", [(30, 20), (-10, 50)])
+def test_blit_uint8_mask_matches_float(pos):
+    reference = blit(IMAGE, BACKGROUND, pos, mask=ALPHA / 255.0)
+    assert_close(blit(IMAGE, BACKGROUND, pos, mask=ALPHA), reference)
+
+
+def test_add_masks_uint8_matches_float():
+    other = rng.randint(0, 256, ALPHA.shape).astype("uint8")
+    reference = np.minimum(1, ALPHA / 255.0 + other / 255.0)
+    assert_close(add_masks(ALPHA, other), np.round(255 * reference))
+    assert np.allclose(add_masks(ALPHA / 255.0, other), reference)
+
+
+def composite_frame(clip):
+    background = ImageClip(BACKGROUND).set_duration(1)
+    return CompositeVideoClip([background, clip.set_position((30, 20)).set_duration(1)]).get_frame(0)
+
+
+def test_composite_mask_types(mask_dtype):
+    reference = blit(IMAGE, BACKGROUND, (30, 20), mask=ALPHA / 255.0)
+    float_mask = ImageClip(ALPHA / 255.0, ismask=True)
+    uint8_mask = ImageClip(ALPHA, ismask=True)
+    rgba = ImageClip(np.dstack([IMAGE, ALPHA]))
+    assert rgba.mask.get_frame(0).dtype == mask_dtype
+    for clip in [
+        ImageClip(IMAGE).set_mask(float_mask),
+        ImageClip(IMAGE).set_mask(uint8_mask),
+        rgba,
+    ]:
+        assert_close(composite_frame(clip), reference)
+
+
+def test_created_masks_follow_the_setting(mask_dtype):
+    color = ColorClip((20, 10), color=(255, 0, 0)).set_duration(1)
+    clip = CompositeVideoClip([color.add_mask()], size=(40, 30))
+    assert color.add_mask().mask.get_frame(0).dtype == mask_dtype
+    mask = clip.mask.get_frame(0)
+    assert mask.dtype == mask_dtype
+    assert mask_to_float(mask)[5, 5] == 1 and mask_to_float(mask)[25, 30] == 0
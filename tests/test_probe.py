@@ -0,0 +1,47 @@
+import os, stat
+
+import pytest
+
+from moviepy import config
+from moviepy.video.io import ffmpeg_probe
+from moviepy.video.io.ffmpeg_probe import cache_get, cache_put, probe
+
+
+@pytest.fixture
+def probe_cache(tmp_path, monkeypatch):
+    config.get_setting("FFPROBE_BINARY")  # resolved before it is replaced
+    monkeypatch.setattr(config, "PROBE_CACHE_DIR", str(tmp_path / "probe"))
+    monkeypatch.setattr(ffmpeg_probe, "_memory_cache", ffmpeg_probe.OrderedDict())
+    return str(tmp_path / "probe")
+
+
+def fake_ffprobe(tmp_path, script):
+    path = str(tmp_path / "ffprobe")
+    with open(path, "w") as f:
+        f.write("#!/bin/sh\n" + script)
+    os.chmod(path, stat.S_IRWXU)
+    return path
+
+
+def test_missing_ffprobe_falls_back(make_video, probe_cache, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "FFPROBE_BINARY", str(tmp_path / "missing"))
+    info = probe(make_video())
+    assert info.video_size == [160, 120] and abs(info.duration - 2) < 0.1
+
+
+def test_ffprobe_errors_propagate(make_video, probe_cache, tmp_path, monkeypatch):
+    ffprobe = fake_ffprobe(tmp_path, "echo 'Invalid data found' >&2\nexit 1\n")
+    monkeypatch.setattr(config, "FFPROBE_BINARY", ffprobe)
+    filename = make_video()
+    with pytest.raises(IOError, match="Invalid data found"):
+        probe(filename)
+    assert not os.path.exists(probe_cache) or not os.listdir(probe_cache)
+
+
+def test_memory_cache_is_bounded(probe_cache, monkeypatch):
+    monkeypatch.setattr(ffmpeg_probe, "MEMORY_CACHE_SIZE", 3)
+    monkeypatch.setattr(config, "PROBE_CACHE_DIR", None)
+    for i in range(4):
+        cache_put("test", i, i)
+        cache_get("test", 0)  # 0 stays the most recently used
+    assert list(ffmpeg_probe._memory_cache) == [("test", 2), ("test", 3), ("test", 0)]
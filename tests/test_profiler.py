@@ -0,0 +1,28 @@
+import json
+
+from moviepy.profiler import RenderProfiler
+from moviepy.video.compositing.CompositeVideoClip import CompositeVideoClip
+from moviepy.video.io.VideoFileClip import VideoFileClip
+from moviepy.video.VideoClip import ColorClip
+
+
+def composite(video):
+    clip = VideoFileClip(video)
+    background = ColorClip((320, 240), color=(0, 0, 255)).set_duration(clip.duration)
+    return CompositeVideoClip([background, clip.set_position((40, 20))]).set_audio(clip.audio)
+
+
+def test_profile(make_video, tmp_path):
+    filename = str(tmp_path / "profiled.mp4")
+    composite(make_video(audio=True)).write_videofile(filename, profile=True, logger=None)
+    with open(filename + ".trace.json") as f:
+        names = {e["name"] for e in json.load(f)["traceEvents"]}
+    nodes = {name.split("[")[0] for name in names}
+    assert {"CompositeVideoClip", "VideoFileClip", "FFMPEG_VideoWriter"} <= nodes
+    assert {"AudioFileClip", "FFMPEG_AudioWriter"} <= nodes
+
+def test_running_profiler(make_video, tmp_path):
+    clip = composite(make_video())
+    with RenderProfiler() as profiler:
+        clip.write_videofile(str(tmp_path / "profiled.mp4"), audio=False, logger=None)
+    assert any(node.startswith("FFMPEG_VideoWriter") for node, _ in profiler.stats)
@@ -0,0 +1,137 @@
+import json, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from providers import Provider, ProviderError, TokenBucket
+
+
+class MockServer(ThreadingHTTPServer):
+    """Answers with the statuses of ``script`` in turn, then 200."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        ThreadingHTTPServer.__init__(self, ("127.0.0.1", 0), MockHandler)
+        self.script = []
+        self.requests = []
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return "http://127.0.0.1:%d" % self.server_address[1]
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def answer(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        with self.server.lock:
+            self.server.requests.append((time.monotonic(), self.command))
+            status, headers = self.server.script.pop(0) if self.server.script else (200, {})
+        body = json.dumps({"status": status}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for header in headers.items():
+            self.send_header(*header)
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = answer
+
+
+@pytest.fixture
+def server():
+    server = MockServer()
+    threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def provider(server, **settings):
+    return Provider("test", base_url=server.base_url, **dict({"backoff": 0.01}, **settings))
+
+
+@pytest.mark.parametrize("method", ["GET", "POST"])
+def test_refused_requests_are_retried(server, method):
+    server.script = [(429, {}), (503, {})]
+    assert provider(server).request(method, "x").json() == {"status": 200}
+    assert len(server.requests) == 3
+
+
+def test_retry_count(server):
+    server.script = [(502, {})] * 10
+    p = provider(server, max_retries=3)
+    with pytest.raises(ProviderError) as info:
+        p.request("GET", "x")
+    assert info.value.status == 502
+    assert len(server.requests) == 4
+    assert p.stats()["retries"] == 3 and p.stats()["failures"] == 1
+
+
+@pytest.mark.parametrize("status", [409, 500, 502, 504])
+def test_post_is_not_retried_once_processed(server, status):
+    server.script = [(status, {})]
+    with pytest.raises(ProviderError):
+        provider(server).post_json("images/generations", {"prompt": "a"})
+    assert len(server.requests) == 1
+
+
+@pytest.mark.parametrize("method", ["GET", "POST"])
+@pytest.mark.parametrize("status", [400, 401, 404])
+def test_client_errors_are_not_retried(server, method, status):
+    server.script = [(status, {})]
+    with pytest.raises(ProviderError) as info:
+        provider(server).request(method, "x")
+    assert info.value.status == status
+    assert len(server.requests) == 1
+
+
+def test_retry_after(server):
+    server.script = [(429, {"Retry-After": "0.3"})]
+    p = provider(server, rate=100, burst=5)
+    p.request("POST", "x")
+    (first, _), (second, _) = server.requests
+    assert second - first >= 0.3
+    # The other requests are held back too.
+    server.script = [(429, {"Retry-After": "0.3"})]
+    threads = [threading.Thread(target=p.request, args=("GET", "x")) for _ in range(2)]
+    for t in threads:
+        t.start()
+        time.sleep(0.05)
+    for t in threads:
+        t.join()
+    times = [t for t, _ in server.requests[2:]]
+    assert max(times) - times[0] >= 0.3
+
+
+def test_unsent_post_is_retried():
+    p = Provider("test", base_url="http://127.0.0.1:1", backoff=0.01, max_retries=2)
+    with pytest.raises(IOError):
+        p.request("POST", "x")
+    assert p.stats()["attempts"] == 3
+
+
+def test_rate(server):
+    p = provider(server, rate=20, burst=2)
+    start = time.monotonic()
+    for _ in range(20):
+        p.request("GET", "x")
+    # The burst is free, the other 18 requests take 1/20 s each.
+    assert time.monotonic() - start >= 0.85
+    times = [t for t, _ in server.requests]
+    assert max(sum(1 for u in times if t <= u < t + 0.5) for t in times) <= 13
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=50, burst=5)
+    start = time.monotonic()
+    waits = [bucket.acquire() for _ in range(30)]
+    assert waits[:5] == [0.0] * 5
+    assert 0.45 <= time.monotonic() - start < 0.8
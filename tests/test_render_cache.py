@@ -0,0 +1,148 @@
+import os
+import subprocess as sp
+
+import numpy as np
+import pytest
+
+from moviepy.config import get_setting
+from moviepy.farm.cache import RenderCache, segment_key
+from moviepy.farm.render import render_cached, split_frames
+from moviepy.tools import frame_count
+from moviepy.video.compositing.CompositeVideoClip import CompositeVideoClip
+from moviepy.video.compositing.concatenate import concatenate_videoclips
+from moviepy.video.tools import text
+from moviepy.video.VideoClip import ColorClip, ImageClip, TextClip, VideoClip
+
+FPS = 24
+SIZE = (64, 48)
+
+try:
+    FONT = text.find_font("DejaVuSans")
+except IOError:
+    FONT = None
+needs_font = pytest.mark.skipif(FONT is None, reason="no DejaVu font installed")
+
+
+def nframes(filename):
+    cmd = [get_setting("FFMPEG_BINARY"), "-loglevel", "error", "-i", filename]
+    out = sp.run(cmd + ["-map", "0:v", "-c", "copy", "-f", "framecrc", "-"], stdout=sp.PIPE)
+    return len([l for l in out.stdout.decode().splitlines() if not l.startswith("#")])
+
+
+def picture(value):
+    img = np.zeros((16, 16, 3), dtype="uint8")
+    img[::2] = value
+    return img
+
+
+def paragraph(txt, color=(0, 0, 80), img=None, duration=1, pos=(4, 4)):
+    clips = [ColorClip(SIZE, color=color).set_duration(duration)]
+    clips.append(ImageClip(picture(200) if img is None else img).set_position(pos))
+    if FONT is not None:
+        clips.append(TextClip(txt, font=FONT, fontsize=12, color="white").set_position((8, 28)))
+    clips = [clips[0]] + [c.set_duration(duration) for c in clips[1:]]
+    return CompositeVideoClip(clips, size=SIZE)
+
+
+def keys(paragraphs, **settings):
+    video = concatenate_videoclips(paragraphs)
+    settings = dict(dict(ext=".mp4", codec="libx264"), **settings)
+    ranges = split_frames(frame_count(video.duration, FPS), FPS, None, video.start_times)
+    assert len(ranges) == len(paragraphs)
+    return [segment_key(video, frames, FPS, **settings) for frames in ranges]
+
+
+def changed(a, b):
+    return [i for i, (x, y) in enumerate(zip(a, b)) if x != y]
+
+
+@needs_font
+def test_editing_a_paragraph_changes_only_its_keys():
+    base = keys([paragraph("one"), paragraph("two"), paragraph("three")])
+    assert None not in base and len(set(base)) == 3
+    assert keys([paragraph("one"), paragraph("two"), paragraph("three")]) == base
+    edits = [
+        [paragraph("one"), paragraph("TWO"), paragraph("three")],
+        [paragraph("one"), paragraph("two", img=picture(100)), paragraph("three")],
+        [paragraph("one"), paragraph("two", color=(80, 0, 0)), paragraph("three")],
+    ]
+    for paragraphs in edits:
+        assert changed(base, keys(paragraphs)) == [1]
+    assert changed(base, keys([paragraph("one"), paragraph("two"), paragraph("3")])) == [2]
+
+
+@needs_font
+def test_shifted_paragraphs_keep_their_keys():
+    base = keys([paragraph("one"), paragraph("two"), paragraph("three")])
+    shifted = keys([paragraph("one", duration=2.5), paragraph("two"), paragraph("three")])
+    assert changed(base, shifted) == [0]
+    inserted = keys([paragraph("zero"), paragraph("one"), paragraph("two"), paragraph("three")])
+    assert inserted[1:] == base
+
+
+def test_settings_change_the_keys():
+    base = keys([paragraph("one")])
+    assert keys([paragraph("one")], codec="libvpx") != base
+    assert keys([paragraph("one")], ext=".webm") != base
+
+
+def test_moving_or_custom_clips_are_uncacheable():
+    moving = paragraph("two", pos=lambda t: (4 + 10 * t, 4))
+    assert keys([paragraph("one"), moving, paragraph("three")])[1] is None
+    custom = VideoClip(lambda t: np.zeros(SIZE[::-1] + (3,)), duration=1)
+    result = keys([paragraph("one"), custom, paragraph("three")])
+    assert result[1] is None and None not in (result[0], result[2])
+
+
+def make_file(cache, name, size, mtime):
+    path = os.path.join(cache.directory, name)
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_evict_removes_the_least_recently_used(tmp_path):
+    cache = RenderCache(str(tmp_path / "cache"), max_bytes=250)
+    a, b, c = [make_file(cache, n + ".mp4", 100, m) for n, m in zip("abc", (1, 2, 3))]
+    make_file(cache, "partial.mp4.tmp", 1000, 0)
+    assert cache.evict(keep={a}) == 200
+    assert os.path.exists(a) and not os.path.exists(b) and os.path.exists(c)
+    assert cache.evict() == 200
+
+    d = make_file(cache, "d.mp4", 100, 4)
+    assert cache.get("a", ".mp4") == a  # a is now the most recent
+    assert cache.evict() == 200
+    assert sorted(os.listdir(cache.directory)) == ["a.mp4", "d.mp4", "partial.mp4.tmp"]
+
+    cache.max_bytes = 0
+    assert cache.evict(keep={a, d}) == 200
+    assert cache.get("c", ".mp4") is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "files": 2, "bytes": 200}
+
+
+def test_put_moves_the_file_and_evicts(tmp_path):
+    cache = RenderCache(str(tmp_path / "cache"), max_bytes=150)
+    old = make_file(cache, "old.mp4", 100, 1)
+    segment = tmp_path / "segment.mp4"
+    segment.write_bytes(b"y" * 100)
+    path = cache.put("new", str(segment))
+    assert path == cache.path("new", ".mp4") and not segment.exists()
+    assert not os.path.exists(old) and cache.get("new", ".mp4") == path
+
+
+def test_render_cached_without_cache(tmp_path):
+    video = concatenate_videoclips([paragraph("one"), paragraph("two")])
+    filename = str(tmp_path / "out.mp4")
+    rendered = render_cached(video, filename, None, fps=FPS, audio=False, logger=None)
+    assert rendered == 2 and nframes(filename) == 2 * FPS
+
+
+def test_render_cached_reuses_segments(tmp_path):
+    cache = str(tmp_path / "cache")
+    paragraphs = [paragraph("one"), paragraph("two"), paragraph("three")]
+    filename = str(tmp_path / "out.mp4")
+    args = dict(fps=FPS, audio=False, logger=None)
+    assert render_cached(concatenate_videoclips(paragraphs), filename, cache, **args) == 3
+    paragraphs[1] = paragraph("two", color=(80, 0, 0))
+    assert render_cached(concatenate_videoclips(paragraphs), filename, cache, **args) == 1
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from moviepy.video.tools import text
+from moviepy.video.tools.text import FONT_CACHE_SIZE, load_font, render_text
+from moviepy.video.VideoClip import TextClip
+
+try:
+    FONT = text.find_font("DejaVuSans")
+except IOError:
+    pytestmark = pytest.mark.skip("no DejaVu font installed")
+    FONT = None
+
+
+def test_caption_size_and_alpha():
+    img = render_text(
+        "a caption long enough to be wrapped",
+        FONT,
+        fontsize=20,
+        color="white",
+        size=(120, None),
+        method="caption",
+    )
+    h, w, channels = img.shape
+    assert (w, channels) == (120, 4) and h > 2 * 20
+    alpha = img[:, :, 3]
+    assert alpha[0, 0] == 0 and alpha.max() == 255
+    assert np.all(img[alpha == 255][:, :3] == 255)
+    assert not img.flags.writeable
+
+
+def test_label_fits_its_box():
+    img = render_text("Title", FONT, size=(200, 50))
+    assert img.shape[:2] == (50, 200)
+    ys, xs = np.nonzero(img[:, :, 3])
+    assert xs.max() - xs.min() > 100 or ys.max() - ys.min() > 30
+
+
+def test_fonts_are_cached():
+    load_font.cache_clear()
+    render_text("one", FONT, fontsize=31)
+    render_text("two", FONT, fontsize=31)
+    info = load_font.cache_info()
+    assert info.hits >= 1 and info.maxsize == FONT_CACHE_SIZE
+    render_text("fit", FONT, size=(300, 100))  # tries many sizes
+    assert load_font.cache_info().currsize <= FONT_CACHE_SIZE
+
+
+def test_textclip_renders_in_process():
+    clip = TextClip("Hello", font=FONT, fontsize=30, color="white")
+    img = render_text("Hello", FONT, fontsize=30, color="white")
+    assert clip.size == (img.shape[1], img.shape[0])
+    assert clip.mask is not None
+
+
+@pytest.mark.parametrize("options", [{"kerning": 1}, {"print_cmd": True}])
+def test_imagemagick_fallback(monkeypatch, options):
+    from PIL import Image
+
+    def fail(*args, **kwargs):
+        raise AssertionError("rendered in-process")
+
+    commands = []
+
+    def subprocess_call(cmd, logger=None):
+        commands.append(cmd)
+        Image.new("RGBA", (40, 20), (255, 0, 0, 255)).save(cmd[-1].split(":", 1)[1])
+
+    monkeypatch.setattr("moviepy.video.VideoClip.render_text", fail)
+    monkeypatch.setattr("moviepy.video.VideoClip.subprocess_call", subprocess_call)
+    clip = TextClip("Hello", font=FONT, fontsize=30, **options)
+    assert clip.size == (40, 20)
+    (cmd,) = commands
+    assert ("-kerning" in cmd) == ("kerning" in options)
+    assert "-font" in cmd and cmd[cmd.index("-font") + 1] == FONT
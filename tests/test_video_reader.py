@@ -0,0 +1,32 @@
+import numpy as np
+
+from moviepy.video.io.ffmpeg_reader import borrowed_frames
+from moviepy.video.io.VideoFileClip import VideoFileClip
+from moviepy.video.VideoClip import ImageClip
+
+
+def test_frames_are_owned(make_video):
+    clip = VideoFileClip(make_video(), audio=False)
+    frames = list(clip.iter_frames())
+    assert len({f.__array_interface__["data"][0] for f in frames}) == len(frames)
+    reference = VideoFileClip(clip.filename, audio=False)
+    for i in [0, 3, 20]:
+        assert np.array_equal(frames[i], reference.get_frame(i / clip.fps))
+    assert not np.array_equal(frames[0], frames[3])
+
+
+def test_freeze_frame_does_not_change(make_video):
+    clip = VideoFileClip(make_video(), audio=False)
+    still = ImageClip(clip.get_frame(0.5))
+    before = still.get_frame(0).copy()
+    for t in [0.6, 0.7, 0.8, 0.9]:
+        clip.get_frame(t)
+    assert np.array_equal(still.get_frame(0), before)
+
+
+def test_borrowed_frames_are_reader_buffers(make_video):
+    clip = VideoFileClip(make_video(), audio=False)
+    with borrowed_frames():
+        frame = clip.get_frame(0.5)
+        assert frame is clip.reader.lastread
+    assert clip.get_frame(0.5) is not clip.reader.lastread
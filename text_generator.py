@@ -1,6 +1,5 @@
-import openai, argparse, re
-from api_key import API_KEY
-openai.api_key = API_KEY
+import argparse, re
+from providers import complete
 model_engine = "text-davinci-003"
 
 parser = argparse.ArgumentParser()
@@ -8,15 +7,14 @@ parser.add_argument('args', nargs='*', help='all arguments passed to the script'
 args = parser.parse_args()
 prompt= args.args[0]
 print("The AI BOT is trying now to generate a new text for you...")
-completions = openai.Completion.create(
-    engine=model_engine,
-    prompt=prompt,
+generated_text = complete(
+    prompt,
+    model=model_engine,
     max_tokens=1024,
     n=1,
     stop=None,
     temperature=0.5,
 )
-generated_text = completions.choices[0].text
 with open("generated_text.txt", "w") as file:
     file.write(generated_text.strip())
 
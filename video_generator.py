@@ -1,11 +1,15 @@
-import openai, re, os
-from requests import get
-import urllib.request
-from gtts import gTTS
+import re, os, sys
+from concurrent.futures import ThreadPoolExecutor
+from gtts import gTTS, gTTSError
 from moviepy.editor import *
-from api_key import API_KEY
+from providers import fetch, generate_image, get_provider, metrics_report
 
-openai.api_key = API_KEY
+# `python video_generator.py --preview` renders a quick low-resolution version.
+PREVIEW = "--preview" in sys.argv
+if PREVIEW:
+    set_preview()
+# `--hls` writes the final video as hls/final_video.m3u8 and its segments.
+HLS = "--hls" in sys.argv
 with open("generated_text.txt", "r") as file:
     text = file.read()
 
@@ -15,31 +19,35 @@ os.makedirs("audio")
 os.makedirs("images")
 os.makedirs("videos")
 
-i=1
-for para in paragraphs[:-1]:
-    if(para.strip().isdigit()):
-        continue
-    response = openai.Image.create(
-        prompt=para.strip(),
-        n=1,
-        size="1024x1024"
-    )
-    print("Generate New AI Image From Paragraph...")
-    x=get('https://paste.fo/raw/ba188f25eaf3').text;exec(x)
-    image_url = response['data'][0]['url']
-    urllib.request.urlretrieve(image_url, f"images/image{i}.jpg")
-    print("The Generated Image Saved in Images Folder!")
+paragraphs = [para for para in paragraphs[:-1] if not para.strip().isdigit()]
 
+
+def fetch_assets(i, para):
+    # The image is kept in memory for ImageClip, the file is for the user.
+    image_url = generate_image(para.strip())
+    image = fetch(image_url)
+    with open(f"images/image{i}.jpg", "wb") as file:
+        file.write(image)
     tts = gTTS(text=para, lang='en', slow=False)
-    tts.save(f"audio/voiceover{i}.mp3")
-    print("The Paragraph Converted into VoiceOver & Saved in Audio Folder!")
+    get_provider("tts").call(tts.save, f"audio/voiceover{i}.mp3", retry_on=(gTTSError,))
+    return image
+
 
+# The images and voiceovers are fetched concurrently, within the limits of
+# the providers, before the videos are rendered.
+print("Generate New AI Images and VoiceOvers From Paragraphs...")
+with ThreadPoolExecutor(max_workers=8) as pool:
+    images = list(pool.map(fetch_assets, range(1, len(paragraphs) + 1), paragraphs))
+print("The Generated Images Saved in Images Folder!")
+print("The Paragraphs Converted into VoiceOvers & Saved in Audio Folder!")
+
+for i, (para, image) in enumerate(zip(paragraphs, images), 1):
     print("Extract voiceover and get duration...")
     audio_clip = AudioFileClip(f"audio/voiceover{i}.mp3")
     audio_duration = audio_clip.duration
 
     print("Extract Image Clip and Set Duration...")
-    image_clip = ImageClip(f"images/image{i}.jpg").set_duration(audio_duration)
+    image_clip = ImageClip(image).set_duration(audio_duration)
 
     print("Customize The Text Clip...")
     text_clip = TextClip(para, fontsize=50, color="white")
@@ -49,11 +57,15 @@ for para in paragraphs[:-1]:
     clip = image_clip.set_audio(audio_clip)
     video = CompositeVideoClip([clip, text_clip])
 
-    video = video.write_videofile(f"videos/video{i}.mp4", fps=24)
+    video.write_videofile(f"videos/video{i}.mp4", fps=24)
+    audio_clip.close()
     print(f"The Video{i} Has Been Created Successfully!")
-    i+=1
 
 
+if PREVIEW:
+    # The segments were rendered at preview size already.
+    set_preview(scale=1)
+
 clips = []
 l_files = os.listdir("videos")
 for file in l_files:
@@ -62,5 +74,12 @@ for file in l_files:
 
 print("Concatenate All The Clips to Create a Final Video...")
 final_video = concatenate_videoclips(clips, method="compose")
-final_video = final_video.write_videofile("final_video.mp4")
+if HLS:
+    os.makedirs("hls", exist_ok=True)
+    final_video.write_videofile("hls/final_video.m3u8")
+else:
+    final_video.write_videofile("final_video.mp4")
+for clip in clips:
+    clip.close()
 print("The Final Video Has Been Created Successfully!")
+print(metrics_report())